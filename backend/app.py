@@ -1,7 +1,14 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, abort, stream_with_context, send_file
+from werkzeug.middleware.proxy_fix import ProxyFix
 import mysql.connector
 from mysql.connector import Error
+from concurrent.futures import TimeoutError as FuturoTimeout
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+import base64
+import binascii
+import hashlib
+import hmac
 import os
 import sys
 
@@ -12,7 +19,20 @@ sys.path.append(parent_dir)
 try:
     from config import Config
     from database.init_db import init_database
-    from database.db_connection import get_db_connection
+    from database.db_connection import get_db_connection, get_pool_stats, init_app as init_db_pool
+    from cache import crear_cache, TableVersions
+    from auth import LimitadorIntentos, SesionServidorInterface, verificar_password
+    from metricas import exportar_prometheus, init_app as init_metricas
+    from firmas import guardar_firma, obtener_firma, obtener_svg
+    from exportar import EXPORT_QUERY, iterar_filas, generar_csv, generar_xlsx
+    from busqueda import BUSQUEDAS, buscar, condicion_prestamos
+    from tickets_pdf import cargar_firmas, pdf_ticket, pdf_lote, abrir_archivo
+    from importar import IMPORT_TIPOS, ErrorImportacion, leer_filas, importar
+    from trabajos import (ParametrosInvalidos, encolar, cancelar, obtener, listar, registrar_invalidacion,
+                          registrar_tarea, init_app as init_trabajos)
+    from inventario import (StockInsuficiente, reservar_materiales, iniciar_devolucion,
+                            cerrar_devolucion, devolver_materiales)
+    from database.resumenes import build_resumen_filter, sumar_prestamos, registrar_devolucion
 except ImportError as e:
     print(f"Error de importación: {e}")
     sys.exit(1)
@@ -22,12 +42,97 @@ app = Flask(__name__,
             static_folder=os.path.join(parent_dir, 'frontend', 'static'))
 
 app.config['SECRET_KEY'] = Config.SECRET_KEY
+init_db_pool(app)
+init_metricas(app)
+init_trabajos(app)
+
+# Con CACHE_BACKEND=sqlite o redis la cache y las versiones se comparten entre workers
+catalog_cache = crear_cache(Config.CACHE_BACKEND, Config.CACHE_URL,
+                            maxsize=Config.CATALOG_CACHE_SIZE, ttl=Config.CATALOG_CACHE_TTL)
+
+table_versions = TableVersions(catalog_cache)
+
+# Fragmentos de tickets renderizados, acotados por TICKET_CACHE_SIZE
+ticket_cache = crear_cache(Config.TICKET_CACHE_BACKEND, Config.TICKET_CACHE_URL,
+                           maxsize=Config.TICKET_CACHE_SIZE, ttl=Config.TICKET_CACHE_TTL)
+
+# Sesiones, usuarios e intentos de login en un almacén compartido entre workers
+session_store = crear_cache(Config.SESSION_BACKEND, Config.SESSION_URL,
+                            maxsize=Config.SESSION_MAX, ttl=Config.SESSION_TTL)
+app.session_interface = SesionServidorInterface(session_store, Config.SESSION_TTL)
+app.config.update(SESSION_COOKIE_HTTPONLY=True, SESSION_COOKIE_SAMESITE='Lax',
+                  SESSION_COOKIE_SECURE=Config.SESSION_COOKIE_SECURE)
+limitador_login = LimitadorIntentos(session_store, Config.LOGIN_MAX_INTENTOS, Config.LOGIN_VENTANA,
+                                    max_intentos_ip=Config.LOGIN_MAX_INTENTOS_IP)
+
+# Detrás de nginx remote_addr sería la IP del proxy; se toma X-Forwarded-For de los proxies confiables
+if Config.PROXIES_CONFIABLES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.PROXIES_CONFIABLES, x_proto=Config.PROXIES_CONFIABLES)
+
+# Tablas de las que depende cada endpoint de catálogo
+CATALOG_TABLAS = {
+    'carreras': ('carreras',),
+    'asignaturas': ('asignaturas', 'carreras'),
+    'docentes': ('docentes', 'carreras'),
+    'practicas': ('practicas', 'asignaturas', 'carreras'),
+    'materiales': ('materiales',),
+    'practica_materiales': ('practica_materiales', 'materiales'),
+    'bootstrap': ('carreras', 'asignaturas', 'docentes', 'practicas', 'materiales',
+                  'practica_materiales'),
+    'cascada': ('carreras', 'asignaturas', 'docentes', 'practicas', 'materiales',
+                'practica_materiales'),
+    'dashboard': ('prestamos', 'materiales', 'carreras', 'asignaturas', 'docentes'),
+    'reportes_avanzados': ('prestamos', 'materiales', 'carreras', 'asignaturas', 'practicas')
+}
+
+# Tablas que modifica cada tipo de entidad
+TIPO_TABLAS = {
+    'carrera': ('carreras',),
+    'asignatura': ('asignaturas',),
+    'docente': ('docentes',),
+    'practica': ('practicas', 'practica_materiales'),
+    'material': ('materiales',),
+    'prestamo': ('prestamos', 'materiales')
+}
 
 # FUNCIONES AUXILIARES 
+def obtener_usuario(usuario_id):
+    """Usuario y rol desde la cache compartida; solo consulta MySQL al expirar AUTH_CACHE_TTL"""
+    usuario = session_store.get('usuarios', usuario_id)
+    if usuario is not None:
+        return usuario or None
+
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute('SELECT id, nombre, tipo, email FROM usuarios WHERE id = %s', (usuario_id,))
+        usuario = cursor.fetchone()
+    except Error:
+        return None
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+
+    # Los usuarios eliminados también se cachean ({}) para no repetir la consulta
+    session_store.set('usuarios', usuario_id, usuario or {}, ttl=Config.AUTH_CACHE_TTL)
+    return usuario
+
+def usuario_actual():
+    """Usuario de la sesión; la cierra si la cuenta ya no existe"""
+    if 'loggedin' not in session:
+        return None
+    usuario = obtener_usuario(session['id'])
+    if usuario is None:
+        session.clear()
+    return usuario
+
 def require_login(f):
     """Requiere sesion activa"""
     def wrapper(*args, **kwargs):
-        if 'loggedin' not in session:
+        if usuario_actual() is None:
             return redirect(url_for('login'))
         return f(*args, **kwargs)
     wrapper.__name__ = f.__name__
@@ -36,7 +141,10 @@ def require_login(f):
 def require_admin(f):
     """Requiere permisos de administrador"""
     def wrapper(*args, **kwargs):
-        if 'loggedin' not in session or session['tipo'] != 'administrador':
+        usuario = usuario_actual()
+        if usuario is None:
+            return redirect(url_for('login'))
+        if usuario['tipo'] != 'administrador':
             flash('No tienes permisos para acceder a esta sección', 'error')
             return redirect(url_for('dashboard'))
         return f(*args, **kwargs)
@@ -52,12 +160,14 @@ def build_filter_query(base_query, filters):
     fecha_fin = filters.get('fecha_fin')
     carrera_id = filters.get('carrera_id')
     estado = filters.get('estado')
+    texto = filters.get('q')
     
+    # Rangos semiabiertos sobre la columna para poder usar los índices de fecha_hora
     if fecha_inicio:
-        conditions.append('DATE(p.fecha_hora) >= %s')
+        conditions.append('p.fecha_hora >= %s')
         params.append(fecha_inicio)
     if fecha_fin:
-        conditions.append('DATE(p.fecha_hora) <= %s')
+        conditions.append('p.fecha_hora < %s + INTERVAL 1 DAY')
         params.append(fecha_fin)
     if carrera_id:
         conditions.append('p.carrera_id = %s')
@@ -65,6 +175,11 @@ def build_filter_query(base_query, filters):
     if estado:
         conditions.append('p.estado = %s')
         params.append(estado)
+    if texto:
+        condicion = condicion_prestamos(texto)
+        if condicion:
+            conditions.append(condicion[0])
+            params.extend(condicion[1])
     
     if conditions:
         base_query += ' AND ' + ' AND '.join(conditions)
@@ -76,6 +191,49 @@ def get_carreras_activas(cursor):
     cursor.execute('SELECT id, nombre FROM carreras WHERE activa = TRUE ORDER BY nombre')
     return cursor.fetchall()
 
+def cargar_detalles_prestamos(cursor, prestamos, incluir_firmas=False):
+    """Adjunta materiales e integrantes a los préstamos con dos consultas en lote"""
+    por_id = {}
+    for prestamo in prestamos:
+        prestamo['materiales'] = []
+        prestamo['integrantes'] = []
+        por_id[prestamo['id']] = prestamo
+    
+    if not por_id:
+        return prestamos
+    
+    ids = list(por_id)
+    placeholders = ', '.join(['%s'] * len(ids))
+    
+    cursor.execute(f'''
+        SELECT det.prestamo_id, m.nombre, det.cantidad
+        FROM detalles_prestamo det
+        JOIN materiales m ON det.material_id = m.id
+        WHERE det.prestamo_id IN ({placeholders})
+        ORDER BY det.id
+    ''', ids)
+    for material in cursor.fetchall():
+        por_id[material.pop('prestamo_id')]['materiales'].append(material)
+    
+    columnas = 'i.prestamo_id, i.nombre, i.no_control'
+    joins = ''
+    if incluir_firmas:
+        # firma_data solo se lee para firmas heredadas sin hash
+        columnas += (', i.firma_hash, f.formato AS firma_formato,'
+                     ' IF(i.firma_hash IS NULL, i.firma_data, NULL) AS firma_data')
+        joins = 'LEFT JOIN firmas f ON f.hash = i.firma_hash'
+    cursor.execute(f'''
+        SELECT {columnas}
+        FROM integrantes i
+        {joins}
+        WHERE i.prestamo_id IN ({placeholders})
+        ORDER BY i.id
+    ''', ids)
+    for integrante in cursor.fetchall():
+        por_id[integrante.pop('prestamo_id')]['integrantes'].append(integrante)
+    
+    return prestamos
+
 def handle_db_error(e, template=None, default_data=None):
     """Maneja errores de base de datos"""
     flash(f'Error de base de datos: {e}', 'error')
@@ -97,18 +255,41 @@ def login():
         password = request.form['password']
         tipo_usuario = request.form['tipo_usuario']
         
+        # Se rechaza antes de tocar la base de datos; el intento cuenta desde aquí
+        if not limitador_login.intentar(request.remote_addr, email):
+            flash('Demasiados intentos fallidos, espere unos minutos', 'error')
+            return render_template('login.html'), 429
+        
         conn = get_db_connection()
         if conn is None:
+            limitador_login.descontar(request.remote_addr, email)
             flash('Error de conexión a la base de datos', 'error')
             return render_template('login.html')
         
         try:
             cursor = conn.cursor(dictionary=True)
-            cursor.execute('SELECT * FROM usuarios WHERE email = %s AND tipo = %s', 
+            cursor.execute('SELECT id, nombre, tipo, email, password_hash FROM usuarios WHERE email = %s AND tipo = %s', 
                           (email, tipo_usuario))
             account = cursor.fetchone()
             
-            if account and account['password_hash'] == password:
+            # El hash se calcula fuera del hilo de la petición; sin cuenta se verifica contra un hash ficticio
+            try:
+                valido, nuevo_hash = verificar_password(password, account['password_hash'] if account else None)
+            except FuturoTimeout:
+                # Pool de hashes saturado: no cuenta como intento fallido
+                limitador_login.descontar(request.remote_addr, email)
+                flash('El servidor está ocupado, intente iniciar sesión de nuevo en unos segundos', 'error')
+                return render_template('login.html'), 503
+            
+            if valido:
+                if nuevo_hash:
+                    # Rehash transparente: texto plano heredado o factor de trabajo anterior
+                    cursor.execute('UPDATE usuarios SET password_hash = %s WHERE id = %s',
+                                   (nuevo_hash, account['id']))
+                    conn.commit()
+                limitador_login.exito(request.remote_addr, email)
+                session.clear()
+                session.regenerar()
                 session.update({
                     'loggedin': True,
                     'id': account['id'],
@@ -116,12 +297,15 @@ def login():
                     'tipo': account['tipo'],
                     'email': account['email']
                 })
+                del account['password_hash']
+                session_store.set('usuarios', account['id'], account, ttl=Config.AUTH_CACHE_TTL)
                 flash('Inicio de sesión exitoso', 'success')
                 return redirect(url_for('dashboard'))
             else:
                 flash('Credenciales incorrectas o tipo de usuario no coincide', 'error')
                 
         except Error as e:
+            limitador_login.descontar(request.remote_addr, email)
             flash(f'Error de base de datos: {e}', 'error')
         finally:
             if conn.is_connected():
@@ -137,9 +321,35 @@ def logout():
     return redirect(url_for('login'))
 
 # RUTAS PROTEGIDAS 
+DASHBOARD_QUERY = '''
+    SELECT COALESCE((SELECT valor FROM contadores WHERE nombre = 'prestamos_total'), 0) as total_prestamos,
+           (SELECT COUNT(*) FROM materiales WHERE cantidad_disponible > 0) as materiales_disponibles,
+           (SELECT COUNT(*) FROM prestamos 
+            WHERE estado = 'activo' AND fecha_hora >= CURDATE() AND fecha_hora < CURDATE() + INTERVAL 1 DAY) as prestamos_hoy;
+    SELECT p.*, u.nombre as solicitante, c.nombre as carrera_nombre,
+           a.nombre as asignatura_nombre, d.nombre as docente_nombre
+    FROM prestamos p 
+    LEFT JOIN usuarios u ON p.usuario_id = u.id 
+    LEFT JOIN carreras c ON p.carrera_id = c.id
+    LEFT JOIN asignaturas a ON p.asignatura_id = a.id
+    LEFT JOIN docentes d ON p.docente_id = d.id
+    ORDER BY p.fecha_hora DESC LIMIT 5
+'''
+
+def load_dashboard(cursor):
+    """Contadores y últimos préstamos en un solo viaje"""
+    contadores, ultimos_prestamos = [result.fetchall() for result in cursor.execute(DASHBOARD_QUERY, multi=True)
+                                     if result.with_rows]
+    return dict(contadores[0], ultimos_prestamos=ultimos_prestamos)
+
 @app.route('/dashboard')
 @require_login
 def dashboard():
+    # Se comparte entre usuarios por unos segundos; préstamos y devoluciones lo invalidan
+    datos = catalog_cache.get('dashboard', None)
+    if datos is not None:
+        return render_template('dashboard.html', **datos)
+    
     conn = get_db_connection()
     if conn is None:
         flash('Error de conexión a la base de datos', 'error')
@@ -147,35 +357,10 @@ def dashboard():
     
     try:
         cursor = conn.cursor(dictionary=True)
+        datos = load_dashboard(cursor)
+        catalog_cache.set('dashboard', None, datos, ttl=Config.DASHBOARD_CACHE_TTL)
         
-        # Estadísticas
-        cursor.execute('SELECT COUNT(*) as total FROM prestamos')
-        total_prestamos = cursor.fetchone()['total']
-        
-        cursor.execute('SELECT COUNT(*) as total FROM materiales WHERE cantidad_disponible > 0')
-        materiales_disponibles = cursor.fetchone()['total']
-        
-        cursor.execute('SELECT COUNT(*) as total FROM prestamos WHERE estado = "activo" AND DATE(fecha_hora) = CURDATE()')
-        prestamos_hoy = cursor.fetchone()['total']
-        
-        # Últimos préstamos
-        cursor.execute('''
-            SELECT p.*, u.nombre as solicitante, c.nombre as carrera_nombre,
-                   a.nombre as asignatura_nombre, d.nombre as docente_nombre
-            FROM prestamos p 
-            LEFT JOIN usuarios u ON p.usuario_id = u.id 
-            LEFT JOIN carreras c ON p.carrera_id = c.id
-            LEFT JOIN asignaturas a ON p.asignatura_id = a.id
-            LEFT JOIN docentes d ON p.docente_id = d.id
-            ORDER BY p.fecha_hora DESC LIMIT 5
-        ''')
-        ultimos_prestamos = cursor.fetchall()
-        
-        return render_template('dashboard.html', 
-                             total_prestamos=total_prestamos,
-                             materiales_disponibles=materiales_disponibles,
-                             prestamos_hoy=prestamos_hoy,
-                             ultimos_prestamos=ultimos_prestamos)
+        return render_template('dashboard.html', **datos)
                              
     except Error as e:
         return handle_db_error(e, 'dashboard.html')
@@ -191,166 +376,271 @@ def gestion_academica():
     return render_template('gestion_academica.html')
 
 # API 
-@app.route('/api/materiales')
-def obtener_materiales():
+def query_catalog(namespace, key, etag, query, params=()):
+    """Consulta de catálogo servida desde la cache; None si falla la BD"""
+    # El ETag se calcula antes de consultar y se guarda junto a los datos: si una escritura
+    # cambia las versiones mientras tanto, la entrada ya no coincide y se vuelve a consultar
+    entrada = catalog_cache.get(namespace, key)
+    if entrada is not None and entrada[0] == etag:
+        return entrada[1]
+    
     conn = get_db_connection()
     if conn is None:
-        return jsonify([])
+        return None
     
     try:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM materiales ORDER BY nombre')
-        return jsonify(cursor.fetchall())
-    except Error as e:
-        return jsonify([])
+        if callable(query):
+            data = query(cursor)
+        else:
+            cursor.execute(query, params)
+            data = cursor.fetchall()
+        catalog_cache.set(namespace, key, (etag, data))
+        return data
+    except Error:
+        return None
     finally:
         if conn.is_connected():
             cursor.close()
             conn.close()
 
+def catalog_response(namespace, key, query, params=()):
+    """Respuesta JSON de catálogo con ETag; responde 304 sin consultar la BD"""
+    tablas = CATALOG_TABLAS[namespace]
+    etag = table_versions.etag(tablas, f'{namespace}:{key}')
+    
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        data = query_catalog(namespace, key, etag, query, params)
+        if data is None:
+            # Sin ETag: el cliente no debe revalidar contra una respuesta de error
+            return jsonify({'success': False, 'message': 'Error de conexión a la base de datos'}), 503
+        response = jsonify(data)
+    
+    response.set_etag(etag)
+    response.last_modified = table_versions.last_modified(tablas)
+    response.cache_control.no_cache = True
+    return response
+
+def invalidate_catalog(tipo):
+    """Invalida cache y versiones de las tablas que modifica un tipo de entidad"""
+    tablas = set(TIPO_TABLAS.get(tipo, ()))
+    table_versions.bump(*tablas)
+    catalog_cache.invalidate(*[namespace for namespace, deps in CATALOG_TABLAS.items()
+                               if tablas.intersection(deps)])
+    if tipo != 'prestamo':
+        # Los tickets muestran los nombres de carreras, asignaturas, docentes, prácticas y materiales
+        ticket_cache.invalidate('tickets')
+
+@app.route('/api/materiales')
+def obtener_materiales():
+    return catalog_response('materiales', None, 'SELECT * FROM materiales ORDER BY nombre')
+
 @app.route('/api/carreras')
 def api_carreras():
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify([])
-    
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM carreras WHERE activa = TRUE ORDER BY nombre')
-        return jsonify(cursor.fetchall())
-    except Error:
-        return jsonify([])
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+    return catalog_response('carreras', None,
+                            'SELECT * FROM carreras WHERE activa = TRUE ORDER BY nombre')
 
 @app.route('/api/asignaturas')
 def api_asignaturas():
     carrera_id = request.args.get('carrera_id')
     
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify([])
-    
-    try:
-        cursor = conn.cursor(dictionary=True)
-        if carrera_id:
-            cursor.execute('''
-                SELECT a.*, c.nombre as carrera_nombre 
-                FROM asignaturas a 
-                JOIN carreras c ON a.carrera_id = c.id 
-                WHERE a.activa = TRUE AND a.carrera_id = %s 
-                ORDER BY a.nombre
-            ''', (carrera_id,))
-        else:
-            cursor.execute('''
-                SELECT a.*, c.nombre as carrera_nombre 
-                FROM asignaturas a 
-                JOIN carreras c ON a.carrera_id = c.id 
-                WHERE a.activa = TRUE 
-                ORDER BY c.nombre, a.nombre
-            ''')
-        return jsonify(cursor.fetchall())
-    except Error:
-        return jsonify([])
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+    if carrera_id:
+        return catalog_response('asignaturas', carrera_id, '''
+            SELECT a.*, c.nombre as carrera_nombre 
+            FROM asignaturas a 
+            JOIN carreras c ON a.carrera_id = c.id 
+            WHERE a.activa = TRUE AND a.carrera_id = %s 
+            ORDER BY a.nombre
+        ''', (carrera_id,))
+    return catalog_response('asignaturas', None, '''
+        SELECT a.*, c.nombre as carrera_nombre 
+        FROM asignaturas a 
+        JOIN carreras c ON a.carrera_id = c.id 
+        WHERE a.activa = TRUE 
+        ORDER BY c.nombre, a.nombre
+    ''')
 
 @app.route('/api/docentes')
 def api_docentes():
     carrera_id = request.args.get('carrera_id')
     
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify([])
-    
-    try:
-        cursor = conn.cursor(dictionary=True)
-        if carrera_id:
-            cursor.execute('''
-                SELECT d.*, c.nombre as carrera_nombre 
-                FROM docentes d 
-                JOIN carreras c ON d.carrera_id = c.id 
-                WHERE d.activo = TRUE AND d.carrera_id = %s 
-                ORDER BY d.nombre
-            ''', (carrera_id,))
-        else:
-            cursor.execute('''
-                SELECT d.*, c.nombre as carrera_nombre 
-                FROM docentes d 
-                JOIN carreras c ON d.carrera_id = c.id 
-                WHERE d.activo = TRUE 
-                ORDER BY c.nombre, d.nombre
-            ''')
-        return jsonify(cursor.fetchall())
-    except Error:
-        return jsonify([])
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+    if carrera_id:
+        return catalog_response('docentes', carrera_id, '''
+            SELECT d.*, c.nombre as carrera_nombre 
+            FROM docentes d 
+            JOIN carreras c ON d.carrera_id = c.id 
+            WHERE d.activo = TRUE AND d.carrera_id = %s 
+            ORDER BY d.nombre
+        ''', (carrera_id,))
+    return catalog_response('docentes', None, '''
+        SELECT d.*, c.nombre as carrera_nombre 
+        FROM docentes d 
+        JOIN carreras c ON d.carrera_id = c.id 
+        WHERE d.activo = TRUE 
+        ORDER BY c.nombre, d.nombre
+    ''')
 
 @app.route('/api/practicas')
 def api_practicas():
     asignatura_id = request.args.get('asignatura_id')
     
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify([])
-    
-    try:
-        cursor = conn.cursor(dictionary=True)
-        if asignatura_id:
-            cursor.execute('''
-                SELECT p.*, a.nombre as asignatura_nombre, c.nombre as carrera_nombre
-                FROM practicas p 
-                JOIN asignaturas a ON p.asignatura_id = a.id 
-                JOIN carreras c ON a.carrera_id = c.id
-                WHERE p.activa = TRUE AND p.asignatura_id = %s 
-                ORDER BY p.numero
-            ''', (asignatura_id,))
-        else:
-            cursor.execute('''
-                SELECT p.*, a.nombre as asignatura_nombre, c.nombre as carrera_nombre
-                FROM practicas p 
-                JOIN asignaturas a ON p.asignatura_id = a.id 
-                JOIN carreras c ON a.carrera_id = c.id
-                WHERE p.activa = TRUE 
-                ORDER BY c.nombre, a.nombre, p.numero
-            ''')
-        return jsonify(cursor.fetchall())
-    except Error:
-        return jsonify([])
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+    if asignatura_id:
+        return catalog_response('practicas', asignatura_id, '''
+            SELECT p.*, a.nombre as asignatura_nombre, c.nombre as carrera_nombre
+            FROM practicas p 
+            JOIN asignaturas a ON p.asignatura_id = a.id 
+            JOIN carreras c ON a.carrera_id = c.id
+            WHERE p.activa = TRUE AND p.asignatura_id = %s 
+            ORDER BY p.numero
+        ''', (asignatura_id,))
+    return catalog_response('practicas', None, '''
+        SELECT p.*, a.nombre as asignatura_nombre, c.nombre as carrera_nombre
+        FROM practicas p 
+        JOIN asignaturas a ON p.asignatura_id = a.id 
+        JOIN carreras c ON a.carrera_id = c.id
+        WHERE p.activa = TRUE 
+        ORDER BY c.nombre, a.nombre, p.numero
+    ''')
 
 @app.route('/api/practica/<int:practica_id>/materiales')
 def api_practica_materiales(practica_id):
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify([])
+    return catalog_response('practica_materiales', practica_id, '''
+        SELECT m.*, pm.cantidad_requerida
+        FROM practica_materiales pm
+        JOIN materiales m ON pm.material_id = m.id
+        WHERE pm.practica_id = %s AND m.cantidad_disponible > 0
+        ORDER BY m.nombre
+    ''', (practica_id,))
+
+BOOTSTRAP_QUERY = '''
+    SELECT * FROM carreras WHERE activa = TRUE ORDER BY nombre;
+    SELECT a.*, c.nombre as carrera_nombre 
+    FROM asignaturas a 
+    JOIN carreras c ON a.carrera_id = c.id 
+    WHERE a.activa = TRUE 
+    ORDER BY c.nombre, a.nombre;
+    SELECT d.*, c.nombre as carrera_nombre 
+    FROM docentes d 
+    JOIN carreras c ON d.carrera_id = c.id 
+    WHERE d.activo = TRUE 
+    ORDER BY c.nombre, d.nombre;
+    SELECT p.*, a.nombre as asignatura_nombre, c.nombre as carrera_nombre
+    FROM practicas p 
+    JOIN asignaturas a ON p.asignatura_id = a.id 
+    JOIN carreras c ON a.carrera_id = c.id
+    WHERE p.activa = TRUE 
+    ORDER BY c.nombre, a.nombre, p.numero;
+    SELECT * FROM materiales ORDER BY nombre;
+    SELECT practica_id, material_id, cantidad_requerida FROM practica_materiales
+'''
+
+def load_bootstrap(cursor):
+    """Carga todos los catálogos en un solo viaje con múltiples resultados"""
+    resultados = [result.fetchall() for result in cursor.execute(BOOTSTRAP_QUERY, multi=True)
+                  if result.with_rows]
+    carreras, asignaturas, docentes, practicas, materiales, relaciones = resultados
     
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('''
-            SELECT m.*, pm.cantidad_requerida
-            FROM practica_materiales pm
-            JOIN materiales m ON pm.material_id = m.id
-            WHERE pm.practica_id = %s AND m.cantidad_disponible > 0
-            ORDER BY m.nombre
-        ''', (practica_id,))
-        return jsonify(cursor.fetchall())
-    except Error:
-        return jsonify([])
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+    practica_materiales = {}
+    for relacion in relaciones:
+        practica_materiales.setdefault(relacion['practica_id'], []).append({
+            'material_id': relacion['material_id'],
+            'cantidad_requerida': relacion['cantidad_requerida']
+        })
+    
+    return {
+        'carreras': carreras,
+        'asignaturas': asignaturas,
+        'docentes': docentes,
+        'practicas': practicas,
+        'materiales': materiales,
+        'practica_materiales': practica_materiales
+    }
+
+@app.route('/api/bootstrap')
+def api_bootstrap():
+    return catalog_response('bootstrap', None, load_bootstrap)
+
+# Cada nivel de la cascada del formulario de préstamo y el parámetro que lo habilita
+CASCADA_CONSULTAS = [
+    ('carreras', None, 'SELECT * FROM carreras WHERE activa = TRUE ORDER BY nombre'),
+    ('asignaturas', 'carrera_id', '''
+        SELECT a.*, c.nombre as carrera_nombre 
+        FROM asignaturas a 
+        JOIN carreras c ON a.carrera_id = c.id 
+        WHERE a.activa = TRUE AND a.carrera_id = %s 
+        ORDER BY a.nombre'''),
+    ('docentes', 'carrera_id', '''
+        SELECT d.*, c.nombre as carrera_nombre 
+        FROM docentes d 
+        JOIN carreras c ON d.carrera_id = c.id 
+        WHERE d.activo = TRUE AND d.carrera_id = %s 
+        ORDER BY d.nombre'''),
+    ('practicas', 'asignatura_id', '''
+        SELECT p.*, a.nombre as asignatura_nombre, c.nombre as carrera_nombre
+        FROM practicas p 
+        JOIN asignaturas a ON p.asignatura_id = a.id 
+        JOIN carreras c ON a.carrera_id = c.id
+        WHERE p.activa = TRUE AND p.asignatura_id = %s 
+        ORDER BY p.numero'''),
+    ('materiales', 'practica_id', '''
+        SELECT m.*, pm.cantidad_requerida
+        FROM practica_materiales pm
+        JOIN materiales m ON pm.material_id = m.id
+        WHERE pm.practica_id = %s AND m.cantidad_disponible > 0
+        ORDER BY m.nombre''')
+]
+
+def load_cascada(ids):
+    """Resuelve los niveles de la cascada con ids en un solo viaje con múltiples resultados"""
+    def cargar(cursor):
+        niveles = [(nombre, consulta, ids[parametro]) for nombre, parametro, consulta in CASCADA_CONSULTAS
+                   if parametro is None or ids[parametro] is not None]
+        consulta = ';'.join(consulta for _, consulta, _ in niveles)
+        params = tuple(valor for _, _, valor in niveles if valor is not None)
+        resultados = [result.fetchall() for result in cursor.execute(consulta, params, multi=True)
+                      if result.with_rows]
+        return {nombre: filas for (nombre, _, _), filas in zip(niveles, resultados)}
+    return cargar
+
+@app.route('/api/cascada')
+def api_cascada():
+    ids = {parametro: request.args.get(parametro, type=int)
+           for parametro in ('carrera_id', 'asignatura_id', 'practica_id')}
+    key = tuple(ids.values())
+    return catalog_response('cascada', key, load_cascada(ids))
+
+BUSQUEDA_MAX_RESULTADOS = 50
+
+@app.route('/api/buscar')
+@require_login
+def api_buscar():
+    """Búsqueda por relevancia para autocompletado (docentes, prácticas, materiales, integrantes, préstamos)"""
+    texto = ' '.join(request.args.get('q', '').split())[:100]
+    tipos = [t for t in request.args.get('tipos', ','.join(BUSQUEDAS)).split(',') if t in BUSQUEDAS]
+    limite = max(1, min(request.args.get('limite', 10, type=int), BUSQUEDA_MAX_RESULTADOS))
+    
+    if not texto or not tipos:
+        response = jsonify({tipo: [] for tipo in tipos})
+    else:
+        # Sin cache: cada tecla es una clave distinta que solo desplazaría a los catálogos
+        conn = get_db_connection()
+        if conn is None:
+            return jsonify({'success': False, 'message': 'Error de conexión a la base de datos'}), 503
+        try:
+            cursor = conn.cursor(dictionary=True)
+            response = jsonify(buscar(cursor, texto, tipos, limite))
+        except Error as e:
+            return jsonify({'success': False, 'message': str(e)}), 500
+        finally:
+            if conn.is_connected():
+                cursor.close()
+                conn.close()
+    
+    # Incluye datos de alumnos y préstamos: ningún proxy ni el navegador deben guardarla
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
 
 # FORMULARIO DE NUEVO PRÉSTAMO
 @app.route('/nuevo-prestamo', methods=['GET', 'POST'])
@@ -366,6 +656,9 @@ def nuevo_prestamo():
             
             cursor = conn.cursor()
             
+            # Reservar stock antes de crear el préstamo (bloquea y descuenta en lote)
+            cantidades = reservar_materiales(cursor, data['materiales'])
+            
             # Insertar préstamo principal
             cursor.execute('''
                 INSERT INTO prestamos (fecha_hora, carrera_id, asignatura_id, docente_id, 
@@ -378,32 +671,33 @@ def nuevo_prestamo():
             prestamo_id = cursor.lastrowid
             
             # Procesar materiales
-            for material in data['materiales']:
-                cursor.execute('''
+            if cantidades:
+                cursor.executemany('''
                     INSERT INTO detalles_prestamo (prestamo_id, material_id, cantidad)
                     VALUES (%s, %s, %s)
-                ''', (prestamo_id, material['material_id'], material['cantidad']))
-                
-                # Actualizar stock
-                cursor.execute('''
-                    UPDATE materiales 
-                    SET cantidad_disponible = cantidad_disponible - %s 
-                    WHERE id = %s
-                ''', (material['cantidad'], material['material_id']))
+                ''', [(prestamo_id, material_id, cantidad) for material_id, cantidad in cantidades.items()])
             
             # Procesar integrantes con firmas
-            for integrante in data['integrantes']:
-                cursor.execute('''
-                    INSERT INTO integrantes (prestamo_id, nombre, no_control, firma_data)
+            integrantes = [(prestamo_id, integrante['nombre'], integrante['no_control'],
+                            guardar_firma(cursor, integrante.get('firma_data')))
+                           for integrante in data['integrantes']]
+            if integrantes:
+                cursor.executemany('''
+                    INSERT INTO integrantes (prestamo_id, nombre, no_control, firma_hash)
                     VALUES (%s, %s, %s, %s)
-                ''', (prestamo_id, integrante['nombre'], integrante['no_control'], 
-                      integrante.get('firma_data', '')))
+                ''', integrantes)
+            
+            sumar_prestamos(cursor, [prestamo_id])
             
             conn.commit()
+            invalidate_catalog('prestamo')
             
             return jsonify({'success': True, 'prestamo_id': prestamo_id, 
                            'message': 'Préstamo registrado exitosamente'})
             
+        except StockInsuficiente as e:
+            conn.rollback()
+            return jsonify({'success': False, 'message': str(e), 'faltantes': e.faltantes})
         except Exception as e:
             if 'conn' in locals() and conn.is_connected():
                 conn.rollback()
@@ -440,6 +734,35 @@ def nuevo_prestamo():
             conn.close()
 
 # CRUD OPERACIONES
+def sincronizar_materiales_practica(cursor, practica_id, materiales):
+    """Aplica solo las diferencias entre la lista actual de materiales y la nueva"""
+    nuevos = {int(m['material_id']): int(m['cantidad_requerida']) for m in materiales}
+    
+    cursor.execute('''
+        SELECT material_id, cantidad_requerida FROM practica_materiales
+        WHERE practica_id = %s FOR UPDATE
+    ''', (practica_id,))
+    actuales = dict(cursor.fetchall())
+    
+    agregados = [m for m in nuevos if m not in actuales]
+    actualizados = [m for m in nuevos if m in actuales and actuales[m] != nuevos[m]]
+    eliminados = [m for m in actuales if m not in nuevos]
+    
+    if agregados or actualizados:
+        cursor.executemany('''
+            INSERT INTO practica_materiales (practica_id, material_id, cantidad_requerida)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE cantidad_requerida = VALUES(cantidad_requerida)
+        ''', [(practica_id, m, nuevos[m]) for m in agregados + actualizados])
+    if eliminados:
+        placeholders = ', '.join(['%s'] * len(eliminados))
+        cursor.execute(f'''
+            DELETE FROM practica_materiales
+            WHERE practica_id = %s AND material_id IN ({placeholders})
+        ''', [practica_id] + eliminados)
+    
+    return {'agregados': agregados, 'actualizados': actualizados, 'eliminados': eliminados}
+
 def handle_crud_operation(tipo, id=None, data=None, action='create'):
     """Maneja operaciones CRUD genericas"""
     try:
@@ -448,6 +771,7 @@ def handle_crud_operation(tipo, id=None, data=None, action='create'):
             return jsonify({'success': False, 'message': 'Error de conexión'})
         
         cursor = conn.cursor()
+        cambios = None
         
         if action == 'create':
             if tipo == 'carrera':
@@ -467,11 +791,12 @@ def handle_crud_operation(tipo, id=None, data=None, action='create'):
                       data.get('asignatura_id')))
                 
                 practica_id = cursor.lastrowid
-                for material in data.get('materiales', []):
-                    cursor.execute('''
+                if data.get('materiales'):
+                    cursor.executemany('''
                         INSERT INTO practica_materiales (practica_id, material_id, cantidad_requerida)
                         VALUES (%s, %s, %s)
-                    ''', (practica_id, material['material_id'], material['cantidad_requerida']))
+                    ''', [(practica_id, material['material_id'], material['cantidad_requerida'])
+                          for material in data['materiales']])
             elif tipo == 'material':
                 cursor.execute('''
                     INSERT INTO materiales (nombre, descripcion, cantidad_disponible, categoria) 
@@ -504,12 +829,7 @@ def handle_crud_operation(tipo, id=None, data=None, action='create'):
                       data.get('asignatura_id'), id))
                 
                 if 'materiales' in data:
-                    cursor.execute('DELETE FROM practica_materiales WHERE practica_id = %s', (id,))
-                    for material in data['materiales']:
-                        cursor.execute('''
-                            INSERT INTO practica_materiales (practica_id, material_id, cantidad_requerida)
-                            VALUES (%s, %s, %s)
-                        ''', (id, material['material_id'], material['cantidad_requerida']))
+                    cambios = sincronizar_materiales_practica(cursor, id, data['materiales'])
             elif tipo == 'material':
                 cursor.execute('''
                     UPDATE materiales 
@@ -543,7 +863,11 @@ def handle_crud_operation(tipo, id=None, data=None, action='create'):
                 cursor.execute('UPDATE materiales SET cantidad_disponible = 1 WHERE id = %s', (id,))
         
         conn.commit()
-        return jsonify({'success': True, 'message': f'Operación realizada correctamente'})
+        invalidate_catalog(tipo)
+        respuesta = {'success': True, 'message': f'Operación realizada correctamente'}
+        if cambios is not None:
+            respuesta['cambios_materiales'] = cambios
+        return jsonify(respuesta)
         
     except Exception as e:
         if 'conn' in locals() and conn.is_connected():
@@ -618,7 +942,142 @@ def admin_obtener(tipo, id):
             cursor.close()
             conn.close()
 
+@app.route('/admin/importar/<tipo>', methods=['POST'])
+@require_admin
+def admin_importar(tipo):
+    """Importación masiva desde CSV o arreglo JSON con reporte de errores por fila"""
+    if tipo not in IMPORT_TIPOS:
+        return jsonify({'success': False, 'message': 'Tipo no válido'})
+    
+    archivo = request.files.get('archivo')
+    if archivo is not None:
+        contenido = archivo.read()
+        formato = 'json' if archivo.filename.lower().endswith('.json') else 'csv'
+    else:
+        contenido = request.get_data()
+        formato = 'json' if request.is_json else 'csv'
+    formato = request.args.get('formato', formato)
+    # parcial=1 importa las filas válidas aunque otras tengan errores
+    parcial = request.args.get('parcial') == '1'
+    
+    try:
+        filas = leer_filas(contenido, formato)
+    except ErrorImportacion as e:
+        return jsonify({'success': False, 'message': str(e)})
+    if not filas:
+        return jsonify({'success': False, 'message': 'El archivo no contiene filas'})
+    
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'success': False, 'message': 'Error de conexión'})
+    
+    try:
+        importadas, errores = importar(conn, tipo, filas, parcial=parcial)
+    except Error as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+    finally:
+        conn.close()
+    
+    if importadas:
+        invalidate_catalog(tipo)
+    if errores and not parcial:
+        message = f'{len(errores)} fila(s) con errores; no se importó ningún registro'
+    else:
+        message = f'{importadas} registro(s) importado(s)'
+    return jsonify({'success': not errores or parcial, 'message': message,
+                    'importados': importadas, 'errores': errores})
+
 # REPORTES 
+REPORTES_POR_PAGINA = 50
+REPORTES_MAX_POR_PAGINA = 200
+REPORTES_LIMITE_CONTEO = 10000
+
+def get_report_filters():
+    """Filtros de /reportes tomados de la query string"""
+    return {
+        'fecha_inicio': request.args.get('fecha_inicio', ''),
+        'fecha_fin': request.args.get('fecha_fin', ''),
+        'carrera_id': request.args.get('carrera_id', ''),
+        'estado': request.args.get('estado', ''),
+        'q': request.args.get('q', '').strip()
+    }
+
+def get_page_size():
+    """Tamaño de página solicitado, acotado al máximo permitido"""
+    try:
+        por_pagina = int(request.args.get('por_pagina', REPORTES_POR_PAGINA))
+    except ValueError:
+        por_pagina = REPORTES_POR_PAGINA
+    return max(1, min(por_pagina, REPORTES_MAX_POR_PAGINA))
+
+def encode_cursor(prestamo):
+    """Token opaco con la posición (fecha_hora, id) del último registro"""
+    raw = f"{prestamo['fecha_hora'].isoformat()}|{prestamo['id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Decodifica un token de paginación; ValueError si es inválido"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+        fecha_hora, prestamo_id = raw.split('|')
+        return datetime.fromisoformat(fecha_hora), int(prestamo_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Cursor de paginación inválido')
+
+def fetch_reportes_page(cursor, filters, token=None, por_pagina=REPORTES_POR_PAGINA):
+    """Página de préstamos con paginación keyset sobre (fecha_hora, id)"""
+    query = '''
+        SELECT p.*, u.nombre as solicitante, c.nombre as carrera_nombre,
+               a.nombre as asignatura_nombre, d.nombre as docente_nombre,
+               pr.numero as practica_numero, pr.nombre as practica_nombre
+        FROM prestamos p
+        LEFT JOIN usuarios u ON p.usuario_id = u.id
+        LEFT JOIN carreras c ON p.carrera_id = c.id
+        LEFT JOIN asignaturas a ON p.asignatura_id = a.id
+        LEFT JOIN docentes d ON p.docente_id = d.id
+        LEFT JOIN practicas pr ON p.practica_id = pr.id
+        WHERE 1=1
+    '''
+    query, params = build_filter_query(query, filters)
+    
+    pagina = {'total': None, 'total_es_estimado': False}
+    if token:
+        fecha_hora, prestamo_id = decode_cursor(token)
+        query += ' AND (p.fecha_hora < %s OR (p.fecha_hora = %s AND p.id < %s))'
+        params += [fecha_hora, fecha_hora, prestamo_id]
+    else:
+        # Conteo acotado: exacto hasta el límite, estimado a partir de ahí
+        count_query, count_params = build_filter_query('SELECT 1 FROM prestamos p WHERE 1=1', filters)
+        cursor.execute(f'SELECT COUNT(*) as total FROM ({count_query} LIMIT %s) t',
+                       count_params + [REPORTES_LIMITE_CONTEO + 1])
+        total = cursor.fetchone()['total']
+        pagina['total'] = min(total, REPORTES_LIMITE_CONTEO)
+        pagina['total_es_estimado'] = total > REPORTES_LIMITE_CONTEO
+    
+    query += ' ORDER BY p.fecha_hora DESC, p.id DESC LIMIT %s'
+    cursor.execute(query, params + [por_pagina + 1])
+    prestamos = cursor.fetchall()
+    
+    hay_mas = len(prestamos) > por_pagina
+    prestamos = prestamos[:por_pagina]
+    
+    if prestamos:
+        ids = [prestamo['id'] for prestamo in prestamos]
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'''
+            SELECT prestamo_id, COUNT(*) as num_materiales
+            FROM detalles_prestamo
+            WHERE prestamo_id IN ({placeholders})
+            GROUP BY prestamo_id
+        ''', ids)
+        conteos = {row['prestamo_id']: row['num_materiales'] for row in cursor.fetchall()}
+        for prestamo in prestamos:
+            prestamo['num_materiales'] = conteos.get(prestamo['id'], 0)
+    
+    pagina['prestamos'] = prestamos
+    pagina['siguiente_cursor'] = encode_cursor(prestamos[-1]) if hay_mas else None
+    return pagina
+
 @app.route('/reportes')
 @require_login
 def reportes():
@@ -630,37 +1089,18 @@ def reportes():
     try:
         cursor = conn.cursor(dictionary=True)
         
-        filters = {
-            'fecha_inicio': request.args.get('fecha_inicio', ''),
-            'fecha_fin': request.args.get('fecha_fin', ''),
-            'carrera_id': request.args.get('carrera_id', ''),
-            'estado': request.args.get('estado', '')
-        }
-        
-        query = '''
-            SELECT p.*, u.nombre as solicitante, c.nombre as carrera_nombre,
-                   a.nombre as asignatura_nombre, d.nombre as docente_nombre,
-                   pr.numero as practica_numero, pr.nombre as practica_nombre,
-                   COUNT(det.id) as num_materiales
-            FROM prestamos p
-            LEFT JOIN usuarios u ON p.usuario_id = u.id
-            LEFT JOIN carreras c ON p.carrera_id = c.id
-            LEFT JOIN asignaturas a ON p.asignatura_id = a.id
-            LEFT JOIN docentes d ON p.docente_id = d.id
-            LEFT JOIN practicas pr ON p.practica_id = pr.id
-            LEFT JOIN detalles_prestamo det ON p.id = det.prestamo_id
-            WHERE 1=1
-        '''
-        
-        query, params = build_filter_query(query, filters)
-        query += ' GROUP BY p.id ORDER BY p.fecha_hora DESC'
+        filters = get_report_filters()
+        por_pagina = get_page_size()
         
-        cursor.execute(query, params)
-        prestamos = cursor.fetchall()
+        try:
+            pagina = fetch_reportes_page(cursor, filters, request.args.get('cursor'), por_pagina)
+        except ValueError:
+            pagina = fetch_reportes_page(cursor, filters, None, por_pagina)
         
         carreras = get_carreras_activas(cursor)
         
-        return render_template('reportes.html', prestamos=prestamos, carreras=carreras, **filters)
+        return render_template('reportes.html', carreras=carreras, por_pagina=por_pagina,
+                               **pagina, **filters)
         
     except Error as e:
         return handle_db_error(e, 'reportes.html', {'prestamos': [], 'carreras': []})
@@ -669,9 +1109,90 @@ def reportes():
             cursor.close()
             conn.close()
 
+@app.route('/api/reportes')
+@require_login
+def api_reportes():
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'success': False, 'message': 'Error de conexión'})
+    
+    try:
+        cursor = conn.cursor(dictionary=True)
+        pagina = fetch_reportes_page(cursor, get_report_filters(),
+                                     request.args.get('cursor'), get_page_size())
+        for prestamo in pagina['prestamos']:
+            prestamo['fecha_hora_texto'] = prestamo['fecha_hora'].strftime('%d/%m/%Y %H:%M')
+        return jsonify({'success': True, **pagina})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Error as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+
+EXPORT_FORMATOS = {
+    'csv': (generar_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (generar_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+}
+
+@app.route('/reportes/export.<formato>')
+@require_login
+def exportar_reportes(formato):
+    if formato not in EXPORT_FORMATOS:
+        abort(404)
+    generador, mimetype = EXPORT_FORMATOS[formato]
+    
+    # Conexión propia: se libera cuando termina el stream, no en el teardown
+    conn = get_db_connection(request_scoped=False)
+    if conn is None:
+        flash('Error de conexión a la base de datos', 'error')
+        return redirect(url_for('reportes'))
+    
+    query, params = build_filter_query(EXPORT_QUERY, get_report_filters())
+    query += ' ORDER BY p.fecha_hora DESC, p.id DESC'
+    
+    try:
+        # Cursor sin buffer: las filas se leen del socket conforme se envían
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+    except Error as e:
+        conn.close()
+        flash(f'Error de base de datos: {e}', 'error')
+        return redirect(url_for('reportes'))
+    
+    def stream():
+        try:
+            yield from generador(iterar_filas(cursor))
+        finally:
+            try:
+                cursor.close()
+            except Error:
+                pass
+            conn.close()
+    
+    nombre = f"prestamos_{datetime.now().strftime('%Y%m%d_%H%M')}.{formato}"
+    response = app.response_class(stream_with_context(stream()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={nombre}'
+    return response
+
 @app.route('/reportes-avanzados')
 @require_login
 def reportes_avanzados():
+    filters = {
+        'fecha_inicio': request.args.get('fecha_inicio', ''),
+        'fecha_fin': request.args.get('fecha_fin', ''),
+        'carrera_id': request.args.get('carrera_id', '')
+    }
+    
+    cache_key = tuple(sorted(filters.items()))
+    # Como en query_catalog: la entrada solo vale mientras no cambien las versiones de sus tablas
+    version = table_versions.etag(CATALOG_TABLAS['reportes_avanzados'], cache_key)
+    entrada = catalog_cache.get('reportes_avanzados', cache_key)
+    if entrada is not None and entrada[0] == version:
+        return render_template('reportes_avanzados.html', **entrada[1], **filters)
+    
     conn = get_db_connection()
     if conn is None:
         flash('Error de conexión a la base de datos', 'error')
@@ -680,42 +1201,35 @@ def reportes_avanzados():
     try:
         cursor = conn.cursor(dictionary=True)
         
-        filters = {
-            'fecha_inicio': request.args.get('fecha_inicio', ''),
-            'fecha_fin': request.args.get('fecha_fin', ''),
-            'carrera_id': request.args.get('carrera_id', '')
-        }
-        
+        # Reportes 1-3 se responden desde los rollups diarios (database/resumenes.py)
         # Reporte 1: Estudiantes por asignatura
         query_estudiantes = '''
-            SELECT a.nombre as asignatura, COUNT(DISTINCT i.id) as num_estudiantes
-            FROM prestamos p
-            JOIN asignaturas a ON p.asignatura_id = a.id
-            JOIN integrantes i ON p.id = i.prestamo_id
-            WHERE p.activo = TRUE
+            SELECT a.nombre as asignatura, SUM(r.num_integrantes) as num_estudiantes
+            FROM resumen_diario r
+            JOIN asignaturas a ON r.asignatura_id = a.id
+            WHERE 1=1
         '''
-        query_estudiantes, params = build_filter_query(query_estudiantes, filters)
-        query_estudiantes += ' GROUP BY a.id, a.nombre ORDER BY num_estudiantes DESC'
+        query_estudiantes, params = build_resumen_filter(query_estudiantes, filters)
+        query_estudiantes += ' GROUP BY a.id, a.nombre HAVING num_estudiantes > 0 ORDER BY num_estudiantes DESC'
         cursor.execute(query_estudiantes, params)
         estudiantes_por_asignatura = cursor.fetchall()
         
         # Reporte 2: Asignaturas atendidas
-        query_asignaturas = 'SELECT COUNT(DISTINCT p.asignatura_id) as total_asignaturas FROM prestamos p WHERE p.activo = TRUE'
-        query_asignaturas, params_asignaturas = build_filter_query(query_asignaturas, filters)
+        query_asignaturas = 'SELECT COUNT(DISTINCT r.asignatura_id) as total_asignaturas FROM resumen_diario r WHERE r.num_prestamos > 0'
+        query_asignaturas, params_asignaturas = build_resumen_filter(query_asignaturas, filters)
         cursor.execute(query_asignaturas, params_asignaturas)
         total_asignaturas = cursor.fetchone()['total_asignaturas']
         
         # Reporte 3: Uso de materiales
         query_materiales = '''
-            SELECT m.nombre, COUNT(d.id) as veces_utilizado, 
-                   SUM(d.cantidad) as total_unidades
-            FROM detalles_prestamo d
-            JOIN materiales m ON d.material_id = m.id
-            JOIN prestamos p ON d.prestamo_id = p.id
-            WHERE p.activo = TRUE
+            SELECT m.nombre, SUM(r.veces_utilizado) as veces_utilizado, 
+                   SUM(r.total_unidades) as total_unidades
+            FROM resumen_diario_materiales r
+            JOIN materiales m ON r.material_id = m.id
+            WHERE 1=1
         '''
-        query_materiales, params_materiales = build_filter_query(query_materiales, filters)
-        query_materiales += ' GROUP BY m.id, m.nombre ORDER BY veces_utilizado DESC'
+        query_materiales, params_materiales = build_resumen_filter(query_materiales, filters)
+        query_materiales += ' GROUP BY m.id, m.nombre HAVING veces_utilizado > 0 ORDER BY veces_utilizado DESC'
         cursor.execute(query_materiales, params_materiales)
         uso_materiales = cursor.fetchall()
         
@@ -723,27 +1237,30 @@ def reportes_avanzados():
         query_observaciones = '''
             SELECT p.id, p.fecha_hora, c.nombre as carrera, a.nombre as asignatura,
                    pr.nombre as practica, p.observaciones, p.importancia_observacion,
-                   COUNT(d.id) as num_materiales
+                   (SELECT COUNT(*) FROM detalles_prestamo d WHERE d.prestamo_id = p.id) as num_materiales
             FROM prestamos p
             JOIN carreras c ON p.carrera_id = c.id
             JOIN asignaturas a ON p.asignatura_id = a.id
             JOIN practicas pr ON p.practica_id = pr.id
-            LEFT JOIN detalles_prestamo d ON p.id = d.prestamo_id
             WHERE p.observaciones IS NOT NULL AND p.observaciones != '' AND p.activo = TRUE
         '''
         query_observaciones, params_observaciones = build_filter_query(query_observaciones, filters)
-        query_observaciones += ' GROUP BY p.id ORDER BY p.importancia_observacion DESC, p.fecha_hora DESC'
+        query_observaciones += ' ORDER BY p.importancia_observacion DESC, p.fecha_hora DESC'
         cursor.execute(query_observaciones, params_observaciones)
         prestamos_con_observaciones = cursor.fetchall()
         
         carreras = get_carreras_activas(cursor)
         
-        return render_template('reportes_avanzados.html',
-                             estudiantes_por_asignatura=estudiantes_por_asignatura,
-                             total_asignaturas=total_asignaturas,
-                             uso_materiales=uso_materiales,
-                             prestamos_con_observaciones=prestamos_con_observaciones,
-                             carreras=carreras, **filters)
+        datos = {
+            'estudiantes_por_asignatura': estudiantes_por_asignatura,
+            'total_asignaturas': total_asignaturas,
+            'uso_materiales': uso_materiales,
+            'prestamos_con_observaciones': prestamos_con_observaciones,
+            'carreras': carreras
+        }
+        catalog_cache.set('reportes_avanzados', cache_key, (version, datos))
+        
+        return render_template('reportes_avanzados.html', **datos, **filters)
         
     except Error as e:
         return handle_db_error(e, 'reportes_avanzados.html')
@@ -782,34 +1299,14 @@ def detalle_observaciones(importancia):
             AND p.importancia_observacion = %s AND p.activo = TRUE
         '''
         
-        params = [importancia]
-        if filters['fecha_inicio']:
-            query += ' AND DATE(p.fecha_hora) >= %s'
-            params.append(filters['fecha_inicio'])
-        if filters['fecha_fin']:
-            query += ' AND DATE(p.fecha_hora) <= %s'
-            params.append(filters['fecha_fin'])
-            
+        query, params = build_filter_query(query, filters)
+        params = [importancia] + params
         query += ' ORDER BY p.fecha_hora DESC'
         
         cursor.execute(query, params)
         prestamos = cursor.fetchall()
         
-        for prestamo in prestamos:
-            cursor.execute('''
-                SELECT m.nombre, det.cantidad
-                FROM detalles_prestamo det
-                JOIN materiales m ON det.material_id = m.id
-                WHERE det.prestamo_id = %s
-            ''', (prestamo['id'],))
-            prestamo['materiales'] = cursor.fetchall()
-            
-            cursor.execute('''
-                SELECT nombre, no_control
-                FROM integrantes
-                WHERE prestamo_id = %s
-            ''', (prestamo['id'],))
-            prestamo['integrantes'] = cursor.fetchall()
+        cargar_detalles_prestamos(cursor, prestamos)
         
         return render_template('detalle_observaciones.html', 
                              prestamos=prestamos, 
@@ -822,124 +1319,382 @@ def detalle_observaciones(importancia):
             cursor.close()
             conn.close()
 
+TICKET_QUERY = '''
+    SELECT p.*, c.nombre as carrera_nombre, a.nombre as asignatura_nombre,
+           d.nombre as docente_nombre, pr.numero as practica_numero, 
+           pr.nombre as practica_nombre, u.nombre as solicitante
+    FROM prestamos p
+    JOIN carreras c ON p.carrera_id = c.id
+    JOIN asignaturas a ON p.asignatura_id = a.id
+    JOIN docentes d ON p.docente_id = d.id
+    JOIN practicas pr ON p.practica_id = pr.id
+    JOIN usuarios u ON p.usuario_id = u.id
+'''
+
+def ticket_response(prestamo_id, ticket):
+    """Página del ticket con ETag por fragmento y usuario; 304 sin consultar ni renderizar"""
+    etag = hashlib.sha1(f"{ticket['etag']}|{session['id']}|{session['nombre']}|{session['tipo']}"
+                        .encode('utf-8')).hexdigest()
+    
+    # Con mensajes flash pendientes se renderiza para mostrarlos
+    if request.if_none_match.contains(etag) and '_flashes' not in session:
+        response = app.response_class(status=304)
+    else:
+        response = app.make_response(render_template('ver_ticket.html', ticket=ticket['html'],
+                                                     prestamo_id=prestamo_id))
+    
+    response.set_etag(etag)
+    # Privada y siempre revalidada: en equipos compartidos no debe verse tras cerrar sesión
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
 @app.route('/ver-ticket/<int:prestamo_id>')
 @require_login
 def ver_ticket(prestamo_id):
+    ticket = ticket_cache.get('tickets', prestamo_id)
+    if ticket is not None:
+        return ticket_response(prestamo_id, ticket)
+    
     conn = get_db_connection()
     if conn is None:
         flash('Error de conexión a la base de datos', 'error')
-        return render_template('ver_ticket.html', prestamo=None)
+        return render_template('ver_ticket.html', ticket=None, prestamo_id=prestamo_id)
     
     try:
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute('''
-            SELECT p.*, c.nombre as carrera_nombre, a.nombre as asignatura_nombre,
-                   d.nombre as docente_nombre, pr.numero as practica_numero, 
-                   pr.nombre as practica_nombre, u.nombre as solicitante
-            FROM prestamos p
-            JOIN carreras c ON p.carrera_id = c.id
-            JOIN asignaturas a ON p.asignatura_id = a.id
-            JOIN docentes d ON p.docente_id = d.id
-            JOIN practicas pr ON p.practica_id = pr.id
-            JOIN usuarios u ON p.usuario_id = u.id
-            WHERE p.id = %s
-        ''', (prestamo_id,))
+        cursor.execute(TICKET_QUERY + ' WHERE p.id = %s', (prestamo_id,))
         prestamo = cursor.fetchone()
         
         if not prestamo:
             flash('Préstamo no encontrado', 'error')
             return redirect(url_for('reportes_avanzados'))
         
-        cursor.execute('''
-            SELECT m.nombre, det.cantidad
-            FROM detalles_prestamo det
-            JOIN materiales m ON det.material_id = m.id
-            WHERE det.prestamo_id = %s
-        ''', (prestamo_id,))
-        prestamo['materiales'] = cursor.fetchall()
+        cargar_detalles_prestamos(cursor, [prestamo], incluir_firmas=True)
         
-        cursor.execute('''
-            SELECT nombre, no_control, firma_data
-            FROM integrantes
-            WHERE prestamo_id = %s
-        ''', (prestamo_id,))
-        prestamo['integrantes'] = cursor.fetchall()
+        # El fragmento (con las firmas heredadas en base64 ya incrustadas) se guarda hasta que una
+        # devolución, una baja o un cambio de catálogo lo elimine
+        html = render_template('ticket.html', prestamo=prestamo)
+        ticket = {'html': html, 'etag': hashlib.sha1(html.encode('utf-8')).hexdigest()}
+        ticket_cache.set('tickets', prestamo_id, ticket)
         
-        return render_template('ver_ticket.html', prestamo=prestamo)
+        return ticket_response(prestamo_id, ticket)
         
     except Error as e:
-        return handle_db_error(e, 'ver_ticket.html', {'prestamo': None})
+        return handle_db_error(e, 'ver_ticket.html', {'ticket': None, 'prestamo_id': prestamo_id})
     finally:
         if conn.is_connected():
             cursor.close()
             conn.close()
 
-# PRESTAMOS 
-@app.route('/admin/eliminar-prestamos', methods=['DELETE'])
-@require_admin
-def admin_eliminar_prestamos():
+PDF_DETALLES_POR_CONSULTA = 500
+
+def pdf_response(archivo, clave, nombre):
+    """Envía un archivo abierto de la cache de PDF; el hash de contenido es el ETag"""
+    mimetype = 'application/zip' if nombre.endswith('.zip') else 'application/pdf'
+    response = send_file(archivo, mimetype=mimetype, download_name=nombre, etag=clave, conditional=True)
+    if response.status_code == 200:
+        # Con un archivo abierto werkzeug no conoce el tamaño
+        response.content_length = os.fstat(archivo.fileno()).st_size
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/ver-ticket/<int:prestamo_id>.pdf')
+@require_login
+def ver_ticket_pdf(prestamo_id):
+    conn = get_db_connection()
+    if conn is None:
+        flash('Error de conexión a la base de datos', 'error')
+        return redirect(url_for('ver_ticket', prestamo_id=prestamo_id))
+    
     try:
-        data = request.get_json()
-        fecha_inicio = data.get('fecha_inicio')
-        fecha_fin = data.get('fecha_fin')
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(TICKET_QUERY + ' WHERE p.id = %s', (prestamo_id,))
+        prestamo = cursor.fetchone()
         
-        if not fecha_inicio or not fecha_fin:
-            return jsonify({'success': False, 'message': 'Fechas requeridas'})
+        if not prestamo:
+            flash('Préstamo no encontrado', 'error')
+            return redirect(url_for('reportes_avanzados'))
         
+        cargar_detalles_prestamos(cursor, [prestamo], incluir_firmas=True)
+        cargar_firmas(cursor, [prestamo])
+    except Error as e:
+        flash(f'Error de base de datos: {e}', 'error')
+        return redirect(url_for('ver_ticket', prestamo_id=prestamo_id))
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+    
+    # La conexión ya se devolvió al pool; el PDF se genera en el pool de procesos
+    try:
+        archivo, clave = pdf_ticket(prestamo)
+    except (FuturoTimeout, BrokenProcessPool, OSError) as e:
+        flash(f'No se pudo generar el PDF: {e}', 'error')
+        return redirect(url_for('ver_ticket', prestamo_id=prestamo_id))
+    return pdf_response(archivo, clave, f'ticket_{prestamo_id}.pdf')
+
+@app.route('/admin/tickets.<formato>', methods=['POST'])
+@require_admin
+def admin_tickets_lote(formato):
+    """Tickets de un rango en un PDF o un ZIP, generados en segundo plano; se descargan de /admin/trabajos/<id>/descarga"""
+    if formato not in ('pdf', 'zip'):
+        abort(404)
+    datos = request.get_json(silent=True) or request.form
+    return encolar_trabajo('tickets_lote', {'fecha_inicio': datos.get('fecha_inicio'),
+                                            'fecha_fin': datos.get('fecha_fin'),
+                                            'formato': formato})
+
+def generar_tickets_lote(trabajo):
+    """Tarea tickets_lote: renderiza el rango y deja la clave del archivo en el resultado del trabajo"""
+    fecha_inicio = trabajo.parametros['fecha_inicio']
+    fecha_fin = trabajo.parametros['fecha_fin']
+    formato = trabajo.parametros['formato']
+    cursor = trabajo.conn.cursor(dictionary=True)
+    try:
+        cursor.execute(TICKET_QUERY + '''
+            WHERE p.activo = TRUE AND p.fecha_hora >= %s AND p.fecha_hora < %s + INTERVAL 1 DAY
+            ORDER BY p.fecha_hora, p.id
+            LIMIT %s
+        ''', (fecha_inicio, fecha_fin, Config.PDF_MAX_TICKETS + 1))
+        prestamos = cursor.fetchall()
+        if not prestamos:
+            return 'No hay préstamos en el rango indicado'
+        if len(prestamos) > Config.PDF_MAX_TICKETS:
+            raise ValueError(f'El rango excede {Config.PDF_MAX_TICKETS} tickets; reduzca las fechas')
+        
+        for i in range(0, len(prestamos), PDF_DETALLES_POR_CONSULTA):
+            cargar_detalles_prestamos(cursor, prestamos[i:i + PDF_DETALLES_POR_CONSULTA], incluir_firmas=True)
+        cargar_firmas(cursor, prestamos)
+        trabajo.conn.commit()
+    finally:
+        cursor.close()
+    
+    # Registra el total y detecta una cancelación antes de ocupar el pool de procesos
+    trabajo.avance(0, len(prestamos))
+    archivo, clave = pdf_lote(prestamos, formato)
+    archivo.close()
+    trabajo.resultado = {'clave': clave, 'formato': formato, 'nombre': f'tickets_{fecha_inicio}_{fecha_fin}.{formato}'}
+    return f'{len(prestamos)} tickets generados'
+
+registrar_tarea('tickets_lote', generar_tickets_lote)
+
+@app.route('/firma/<firma_hash>.png')
+@require_login
+def ver_firma(firma_hash):
+    # Las firmas son inmutables: el hash es el ETag
+    if request.if_none_match.contains(firma_hash):
+        response = app.response_class(status=304)
+    else:
         conn = get_db_connection()
         if conn is None:
-            return jsonify({'success': False, 'message': 'Error de conexión'})
+            return app.response_class(status=503)
         
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE prestamos 
-            SET activo = FALSE 
-            WHERE DATE(fecha_hora) BETWEEN %s AND %s
-        ''', (fecha_inicio, fecha_fin))
+        try:
+            cursor = conn.cursor()
+            firma = obtener_firma(cursor, firma_hash)
+        except Error:
+            return app.response_class(status=503)
+        finally:
+            if conn.is_connected():
+                cursor.close()
+                conn.close()
         
-        filas_afectadas = cursor.rowcount
-        conn.commit()
+        if firma is None or firma[0] != 'png':
+            return app.response_class(status=404)
+        response = app.response_class(bytes(firma[1]), mimetype='image/png')
+    
+    response.set_etag(firma_hash)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+@app.route('/firma/<firma_hash>.svg')
+@require_login
+def ver_firma_svg(firma_hash):
+    if request.if_none_match.contains(firma_hash):
+        response = app.response_class(status=304)
+    else:
+        conn = get_db_connection()
+        if conn is None:
+            return app.response_class(status=503)
         
-        return jsonify({
-            'success': True, 
-            'message': f'{filas_afectadas} préstamos eliminados correctamente'
-        })
+        try:
+            cursor = conn.cursor()
+            svg = obtener_svg(cursor, firma_hash)
+        except Error:
+            return app.response_class(status=503)
+        finally:
+            if conn.is_connected():
+                cursor.close()
+                conn.close()
         
-    except Exception as e:
-        if 'conn' in locals() and conn.is_connected():
-            conn.rollback()
+        if svg is None:
+            return app.response_class(status=404)
+        response = app.response_class(svg, mimetype='image/svg+xml')
+    
+    response.set_etag(firma_hash)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+# PRESTAMOS 
+def invalidar_trabajo(tipo):
+    """Los trabajos modifican préstamos y rollups: invalida sus catálogos y los tickets"""
+    invalidate_catalog('prestamo')
+    ticket_cache.invalidate('tickets')
+
+registrar_invalidacion(invalidar_trabajo)
+
+def encolar_trabajo(tipo, parametros):
+    """Registra un trabajo en segundo plano; responde 202 con la URL de su avance"""
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'success': False, 'message': 'Error de conexión'})
+    try:
+        trabajo_id = encolar(conn, tipo, parametros, session['id'])
+        return jsonify({
+            'success': True,
+            'trabajo_id': trabajo_id,
+            'url': url_for('admin_trabajo', trabajo_id=trabajo_id),
+            'message': 'Trabajo programado'
+        }), 202
+    except ParametrosInvalidos as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Error as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
     finally:
-        if 'conn' in locals() and conn.is_connected():
+        if conn.is_connected():
+            conn.close()
+
+@app.route('/admin/eliminar-prestamos', methods=['POST', 'DELETE'])
+@require_admin
+def admin_eliminar_prestamos():
+    """Eliminación lógica por lotes en segundo plano; el avance se consulta en /admin/trabajos/<id>"""
+    return encolar_trabajo('eliminar_prestamos', request.get_json(silent=True) or {})
+
+@app.route('/admin/trabajos', methods=['GET', 'POST'])
+@require_admin
+def admin_trabajos():
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        return encolar_trabajo(data.get('tipo'), data.get('parametros'))
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'success': False, 'message': 'Error de conexión'})
+    try:
+        cursor = conn.cursor(dictionary=True)
+        return jsonify({'success': True, 'trabajos': listar(cursor)})
+    except Error as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+    finally:
+        if conn.is_connected():
             cursor.close()
             conn.close()
 
-@app.route('/devolver-prestamo/<int:prestamo_id>', methods=['POST'])
-@require_login
-def devolver_prestamo(prestamo_id):
+@app.route('/admin/trabajos/<int:trabajo_id>')
+@require_admin
+def admin_trabajo(trabajo_id):
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'success': False, 'message': 'Error de conexión'})
+    try:
+        cursor = conn.cursor(dictionary=True)
+        trabajo = obtener(cursor, trabajo_id)
+        if trabajo is None:
+            return jsonify({'success': False, 'message': 'Trabajo no encontrado'}), 404
+        if trabajo['resultado'] and 'clave' in trabajo['resultado']:
+            trabajo['descarga'] = url_for('admin_trabajo_descarga', trabajo_id=trabajo_id)
+        return jsonify({'success': True, 'trabajo': trabajo})
+    except Error as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+
+@app.route('/admin/trabajos/<int:trabajo_id>/descarga')
+@require_admin
+def admin_trabajo_descarga(trabajo_id):
+    """Archivo generado por un trabajo completado (tickets_lote)"""
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'success': False, 'message': 'Error de conexión'})
+    try:
+        cursor = conn.cursor(dictionary=True)
+        trabajo = obtener(cursor, trabajo_id)
+    except Error as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+    
+    resultado = trabajo['resultado'] if trabajo and trabajo['estado'] == 'completado' else None
+    if not resultado or 'clave' not in resultado:
+        return jsonify({'success': False, 'message': 'El trabajo no tiene un archivo para descargar'}), 404
+    archivo = abrir_archivo(resultado['clave'], resultado['formato'])
+    if archivo is None:
+        return jsonify({'success': False, 'message': 'El archivo ya no está disponible; vuelva a generarlo'}), 410
+    return pdf_response(archivo, resultado['clave'], resultado['nombre'])
+
+@app.route('/admin/trabajos/<int:trabajo_id>/cancelar', methods=['POST'])
+@require_admin
+def admin_cancelar_trabajo(trabajo_id):
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'success': False, 'message': 'Error de conexión'})
+    try:
+        if not cancelar(conn, trabajo_id):
+            return jsonify({'success': False, 'message': 'El trabajo no existe o ya terminó'})
+        return jsonify({'success': True, 'message': 'Trabajo cancelado; se detiene al terminar el lote en curso'})
+    except Error as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+    finally:
+        if conn.is_connected():
+            conn.close()
+
+def procesar_devolucion(prestamo_ids, parciales=None):
+    """Devuelve uno o varios préstamos en una transacción, idempotente por Idempotency-Key"""
     conn = get_db_connection()
     if conn is None:
         return jsonify({'success': False, 'message': 'Error de conexión a la base de datos'})
     
+    clave = request.headers.get('Idempotency-Key') or None
     try:
         cursor = conn.cursor()
         
-        cursor.execute('SELECT material_id, cantidad FROM detalles_prestamo WHERE prestamo_id = %s', (prestamo_id,))
-        materiales = cursor.fetchall()
+        devolucion_id, respuesta_previa = iniciar_devolucion(cursor, session['id'], clave)
+        if respuesta_previa is not None:
+            conn.rollback()
+            return jsonify(respuesta_previa)
         
-        for material_id, cantidad in materiales:
-            cursor.execute('''
-                UPDATE materiales 
-                SET cantidad_disponible = cantidad_disponible + %s 
-                WHERE id = %s
-            ''', (cantidad, material_id))
+        resultado = devolver_materiales(cursor, devolucion_id, prestamo_ids, parciales)
+        registrar_devolucion(cursor, resultado['devueltos'])
+        
+        if resultado['devueltos'] or resultado['parciales']:
+            if len(prestamo_ids) == 1:
+                message = ('Préstamo devuelto correctamente' if resultado['devueltos']
+                           else 'Devolución parcial registrada')
+            else:
+                message = f"{len(resultado['devueltos'])} préstamo(s) devuelto(s)"
+            respuesta = {'success': True, 'message': message}
+        else:
+            respuesta = {'success': False, 'message': 'El préstamo ya había sido devuelto'}
+        respuesta.update(resultado)
         
-        cursor.execute('UPDATE prestamos SET estado = "devuelto" WHERE id = %s', (prestamo_id,))
+        cerrar_devolucion(cursor, devolucion_id, respuesta)
         conn.commit()
+        if resultado['devueltos'] or resultado['unidades']:
+            invalidate_catalog('prestamo')
+            for prestamo_id in prestamo_ids:
+                ticket_cache.delete('tickets', prestamo_id)
         
-        return jsonify({'success': True, 'message': 'Préstamo devuelto correctamente'})
+        return jsonify(respuesta)
         
+    except ValueError as e:
+        conn.rollback()
+        return jsonify({'success': False, 'message': str(e)})
     except Exception as e:
         if conn.is_connected():
             conn.rollback()
@@ -949,6 +1704,61 @@ def devolver_prestamo(prestamo_id):
             cursor.close()
             conn.close()
 
+@app.route('/devolver-prestamo/<int:prestamo_id>', methods=['POST'])
+@require_login
+def devolver_prestamo(prestamo_id):
+    # Sin cuerpo se devuelve todo; {'materiales': [...]} registra una devolución parcial
+    data = request.get_json(silent=True) or {}
+    return procesar_devolucion([prestamo_id], data.get('materiales'))
+
+@app.route('/devolver-prestamos', methods=['POST'])
+@require_login
+def devolver_prestamos():
+    data = request.get_json(silent=True) or {}
+    try:
+        prestamo_ids = [int(prestamo_id) for prestamo_id in data.get('prestamo_ids', [])]
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Lista de préstamos inválida'})
+    if not prestamo_ids:
+        return jsonify({'success': False, 'message': 'No se indicaron préstamos'})
+    return procesar_devolucion(prestamo_ids)
+
+@app.route('/admin/estadisticas-pool')
+@require_admin
+def admin_estadisticas_pool():
+    return jsonify({'success': True, 'data': get_pool_stats()})
+
+# Contadores del pool que solo crecen; el resto de get_pool_stats() son niveles actuales
+POOL_ACUMULADOS = ('creadas', 'recicladas', 'descartadas', 'checkouts', 'esperas', 'timeouts')
+
+@app.route('/metrics')
+def metrics():
+    # Sin sesión para que Prometheus pueda consultarlo; sin METRICS_TOKEN configurado no se expone
+    if not Config.METRICS_TOKEN:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'),
+                               f'Bearer {Config.METRICS_TOKEN}'.encode('utf-8')):
+        abort(401)
+    medidores = {}
+    for clave, valor in get_pool_stats().items():
+        if clave in POOL_ACUMULADOS:
+            medidores[f'db_pool_{clave}_total'] = ('Eventos acumulados del pool de conexiones', valor, 'counter')
+        else:
+            medidores[f'db_pool_{clave}'] = ('Estado del pool de conexiones', valor)
+    # Todas las series llevan la etiqueta cache para no mezclar catálogos y tickets
+    for nombre, cache in (('catalogo', catalog_cache), ('tickets', ticket_cache)):
+        stats = cache.get_stats()
+        if stats['entradas'] is not None:
+            medidores[f'cache_entradas{{cache="{nombre}"}}'] = ('Entradas en la cache', stats['entradas'])
+        medidores[f'cache_errores_total{{cache="{nombre}"}}'] = ('Errores del backend de cache', stats['errores'],
+                                                                 'counter')
+        for namespace, contadores in stats['namespaces'].items():
+            etiquetas = f'{{cache="{nombre}",namespace="{namespace}"}}'
+            medidores[f'cache_hits_total{etiquetas}'] = ('Aciertos de la cache', contadores['hits'], 'counter')
+            medidores[f'cache_misses_total{etiquetas}'] = ('Fallos de la cache', contadores['misses'], 'counter')
+    return app.response_class(exportar_prometheus(medidores),
+                              mimetype='text/plain; version=0.0.4')
+
 # MANEJO DE ERRORES
 @app.errorhandler(404)
 def not_found(error):
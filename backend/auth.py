@@ -0,0 +1,164 @@
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from config import Config
+
+# CONTRASEÑAS
+
+HASH_PREFIJOS = ('pbkdf2:', 'scrypt:')
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_hash_ficticio = None
+
+def _get_executor():
+    """Pool de hilos para hashes (se recrea tras un fork de gunicorn)"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=Config.AUTH_HILOS, thread_name_prefix='auth')
+                _executor_pid = os.getpid()
+    return _executor
+
+def hash_password(password):
+    """Hash con el método y factor de trabajo configurados (PASSWORD_HASH_METODO)"""
+    return generate_password_hash(password, method=Config.PASSWORD_HASH_METODO)
+
+def es_hash(valor):
+    return valor.startswith(HASH_PREFIJOS) and valor.count('$') == 2
+
+def requiere_rehash(valor):
+    """True si el hash es texto plano heredado o usa otro método o factor de trabajo"""
+    return not es_hash(valor) or valor.split('$', 1)[0] != Config.PASSWORD_HASH_METODO
+
+def _verificar(password, almacenado):
+    global _hash_ficticio
+    if almacenado is None:
+        # Usuario inexistente: se calcula un hash igual para no revelarlo por el tiempo de respuesta
+        if _hash_ficticio is None:
+            _hash_ficticio = hash_password(secrets.token_hex(16))
+        check_password_hash(_hash_ficticio, password)
+        return False, None
+
+    if es_hash(almacenado):
+        valido = check_password_hash(almacenado, password)
+    else:
+        # Contraseñas en texto plano de versiones anteriores
+        valido = hmac.compare_digest(almacenado.encode('utf-8'), password.encode('utf-8'))
+
+    nuevo_hash = hash_password(password) if valido and requiere_rehash(almacenado) else None
+    return valido, nuevo_hash
+
+def verificar_password(password, almacenado):
+    """Verifica en el pool de hilos; devuelve (valido, nuevo_hash o None)"""
+    return _get_executor().submit(_verificar, password, almacenado).result(timeout=Config.AUTH_TIMEOUT)
+
+# LIMITADOR DE INTENTOS
+
+class LimitadorIntentos:
+    """Ventana fija de intentos fallidos por IP y por cuenta, guardada en la cache compartida"""
+
+    def __init__(self, store, max_intentos, ventana, max_intentos_ip=None):
+        self.store = store
+        self.max_intentos = max_intentos
+        self.max_intentos_ip = max_intentos_ip or max_intentos
+        self.ventana = ventana
+
+    def _llaves(self, ip, email):
+        return [('ip', ip), ('email', (email or '').strip().lower())]
+
+    def _maximo(self, llave):
+        return self.max_intentos_ip if llave[0] == 'ip' else self.max_intentos
+
+    def intentar(self, ip, email):
+        """Cuenta el intento (incremento atómico) antes de verificarlo; False si alguna llave excede su máximo.
+        Contar primero evita que peticiones en paralelo pasen todas antes de registrarse el primer fallo"""
+        permitido = True
+        for llave in self._llaves(ip, email):
+            cuenta = self.store.incr_ventana('login_intentos', llave, self.ventana)
+            if cuenta is not None and cuenta > self._maximo(llave):
+                permitido = False
+        return permitido
+
+    def descontar(self, ip, email):
+        """Devuelve un intento que no falló (error del servidor)"""
+        for llave in self._llaves(ip, email):
+            self.store.incr_ventana('login_intentos', llave, self.ventana, -1)
+
+    def exito(self, ip, email):
+        """Acceso correcto: no cuenta para la IP y reinicia los fallos de la cuenta"""
+        self.store.incr_ventana('login_intentos', ('ip', ip), self.ventana, -1)
+        self.store.delete_ventana('login_intentos', ('email', (email or '').strip().lower()))
+
+# SESIONES EN EL SERVIDOR
+
+class SesionServidor(CallbackDict, SessionMixin):
+    """Sesión cuyo contenido vive en el servidor; la cookie solo lleva un id aleatorio"""
+
+    def __init__(self, initial=None, sid=None, nueva=False):
+        def on_update(sesion):
+            sesion.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = nueva
+        self.modified = False
+        self.sid_anterior = None
+
+    def regenerar(self):
+        """Nuevo id tras iniciar sesión (evita la fijación de sesión)"""
+        self.sid_anterior = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+class SesionServidorInterface(SessionInterface):
+    """Guarda las sesiones en el backend de cache (sqlite o redis para compartir entre workers)"""
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and len(sid) <= 64:
+            data = self.store.get('sesion', sid)
+            if data is not None:
+                return SesionServidor(data, sid=sid)
+        return SesionServidor(sid=secrets.token_urlsafe(32), nueva=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.sid_anterior:
+            self.store.delete('sesion', session.sid_anterior)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete('sesion', session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # Se reescribe solo si cambió o si pasó un cuarto del TTL (expiración deslizante)
+        ahora = int(time.time())
+        renovar = ahora - session.get('_renovada', 0) > self.ttl // 4
+        if not (session.modified or renovar):
+            return
+        dict.__setitem__(session, '_renovada', ahora)
+        self.store.set('sesion', session.sid, dict(session), ttl=self.ttl)
+
+        if session.new or session.sid_anterior or renovar:
+            response.set_cookie(name, session.sid, max_age=self.ttl, domain=domain, path=path,
+                                httponly=self.get_cookie_httponly(app),
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
@@ -0,0 +1,250 @@
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark.datos import BENCH_EMAIL, BENCH_PASSWORD
+
+ESCENARIOS = ['login', 'dashboard', 'nuevo_prestamo', 'reportes', 'reportes_avanzados', 'ver_ticket']
+
+class ClientePrueba:
+    """Cliente en proceso usando el test client de Flask"""
+
+    def __init__(self, app):
+        self._cliente = app.test_client()
+
+    def peticion(self, metodo, ruta, form=None, datos_json=None):
+        respuesta = self._cliente.open(ruta, method=metodo, data=form, json=datos_json)
+        return respuesta.status_code, respuesta.get_data()
+
+class ClienteHttp:
+    """Cliente HTTP contra un servidor en ejecución (gunicorn, flask run)"""
+
+    def __init__(self, url_base):
+        self.url_base = url_base.rstrip('/')
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _SinRedirecciones())
+
+    def peticion(self, metodo, ruta, form=None, datos_json=None):
+        cuerpo, cabeceras = None, {}
+        if form is not None:
+            cuerpo = urllib.parse.urlencode(form).encode('utf-8')
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif datos_json is not None:
+            cuerpo = json.dumps(datos_json).encode('utf-8')
+            cabeceras['Content-Type'] = 'application/json'
+        solicitud = urllib.request.Request(self.url_base + ruta, data=cuerpo, headers=cabeceras,
+                                           method=metodo)
+        try:
+            with self._opener.open(solicitud, timeout=60) as respuesta:
+                return respuesta.status, respuesta.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    # El login responde 302; se mide la respuesta propia, no la página destino
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+def iniciar_sesion(cliente, email, password):
+    status, _ = cliente.peticion('POST', '/login', form={
+        'email': email, 'password': password, 'tipo_usuario': 'administrador'})
+    return status == 302
+
+def _json_exitoso(status, cuerpo):
+    if status != 200:
+        return False
+    try:
+        return json.loads(cuerpo).get('success', False)
+    except ValueError:
+        return False
+
+class Contexto:
+    """Ids válidos para armar préstamos y tickets, obtenidos una sola vez"""
+
+    def __init__(self, cliente):
+        status, cuerpo = cliente.peticion('GET', '/api/bootstrap')
+        if status != 200:
+            raise SystemExit(f' No se pudo leer /api/bootstrap (HTTP {status})')
+        datos = json.loads(cuerpo)
+        carrera_de = {a['id']: a['carrera_id'] for a in datos['asignaturas']}
+        docentes = {}
+        for docente in datos['docentes']:
+            docentes.setdefault(docente['carrera_id'], []).append(docente['id'])
+        self.practicas = [p for p in datos['practicas']
+                          if str(p['id']) in datos['practica_materiales']
+                          and docentes.get(carrera_de.get(p['asignatura_id']))]
+        self.carrera_de = carrera_de
+        self.docentes = docentes
+        self.practica_materiales = datos['practica_materiales']
+
+        status, cuerpo = cliente.peticion('GET', '/api/reportes?por_pagina=200')
+        self.prestamos = [p['id'] for p in json.loads(cuerpo).get('prestamos', [])] if status == 200 else []
+        if not self.practicas or not self.prestamos:
+            raise SystemExit(' No hay datos suficientes; ejecute antes benchmark/datos.py')
+
+    def prestamo_aleatorio(self, rng):
+        practica = rng.choice(self.practicas)
+        carrera_id = self.carrera_de[practica['asignatura_id']]
+        return {
+            'fecha_hora': datetime.now().strftime('%Y-%m-%dT%H:%M'),
+            'carrera_id': carrera_id,
+            'asignatura_id': practica['asignatura_id'],
+            'docente_id': rng.choice(self.docentes[carrera_id]),
+            'practica_id': practica['id'],
+            'lugar_uso': 'Benchmark',
+            'observaciones': '',
+            'importancia_observacion': 'normal',
+            'materiales': [{'material_id': m['material_id'], 'cantidad': 1}
+                           for m in self.practica_materiales[str(practica['id'])]],
+            'integrantes': [{'nombre': 'Benchmark', 'no_control': '00000000', 'firma_data': None}]
+        }
+
+def ejecutar_escenario(nombre, cliente, contexto, rng, args):
+    """Ejecuta una petición del escenario y devuelve si fue exitosa"""
+    if nombre == 'login':
+        return iniciar_sesion(cliente, args.email, args.password)
+    if nombre == 'dashboard':
+        return cliente.peticion('GET', '/dashboard')[0] == 200
+    if nombre == 'nuevo_prestamo':
+        return _json_exitoso(*cliente.peticion('POST', '/nuevo-prestamo',
+                                               datos_json=contexto.prestamo_aleatorio(rng)))
+    if nombre == 'reportes':
+        return cliente.peticion('GET', '/reportes')[0] == 200
+    if nombre == 'reportes_avanzados':
+        return cliente.peticion('GET', '/reportes-avanzados')[0] == 200
+    if nombre == 'ver_ticket':
+        return cliente.peticion('GET', f'/ver-ticket/{rng.choice(contexto.prestamos)}')[0] == 200
+    raise ValueError(f'Escenario desconocido: {nombre}')
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+def resumir(tiempos, errores, duracion):
+    tiempos = sorted(t * 1000 for t in tiempos)
+    redondear = lambda v: None if v is None else round(v, 2)
+    return {
+        'peticiones': len(tiempos),
+        'errores': errores,
+        'p50_ms': redondear(percentil(tiempos, 50)),
+        'p95_ms': redondear(percentil(tiempos, 95)),
+        'p99_ms': redondear(percentil(tiempos, 99)),
+        'media_ms': redondear(sum(tiempos) / len(tiempos)) if tiempos else None,
+        'max_ms': redondear(tiempos[-1]) if tiempos else None,
+        'rps': round(len(tiempos) / duracion, 2) if duracion else None
+    }
+
+def medir(nombre, crear_cliente, contexto, args):
+    """Lanza args.concurrencia hilos, cada uno con su cliente y sesión"""
+    tiempos, errores = [], [0]
+    lock = threading.Lock()
+    por_hilo = max(1, args.peticiones // args.concurrencia)
+
+    def trabajador(n):
+        rng = random.Random(args.semilla * 1000 + n)
+        cliente = crear_cliente()
+        if nombre != 'login' and not iniciar_sesion(cliente, args.email, args.password):
+            with lock:
+                errores[0] += por_hilo
+            return
+        for _ in range(args.calentamiento):
+            ejecutar_escenario(nombre, cliente, contexto, rng, args)
+        propios, fallidos = [], 0
+        for _ in range(por_hilo):
+            inicio = time.perf_counter()
+            exito = ejecutar_escenario(nombre, cliente, contexto, rng, args)
+            propios.append(time.perf_counter() - inicio)
+            fallidos += not exito
+        with lock:
+            tiempos.extend(propios)
+            errores[0] += fallidos
+
+    hilos = [threading.Thread(target=trabajador, args=(n,)) for n in range(args.concurrencia)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resumir(tiempos, errores[0], time.perf_counter() - inicio)
+
+def _commit_actual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar(actual, anterior):
+    """Imprime la variación de p50/p95/p99 contra un resultado previo"""
+    print(f" Comparación contra {anterior.get('commit')}:")
+    for nombre, datos in actual['escenarios'].items():
+        previo = anterior.get('escenarios', {}).get(nombre)
+        if not previo:
+            continue
+        cambios = []
+        for clave in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if datos[clave] and previo.get(clave):
+                cambios.append(f'{clave[:3]} {(datos[clave] / previo[clave] - 1) * 100:+.1f}%')
+        print(f"   {nombre}: {', '.join(cambios)}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mide latencias de las rutas principales')
+    parser.add_argument('--url', help='Servidor a medir; sin --url se usa el test client de Flask')
+    parser.add_argument('--escenarios', default=','.join(ESCENARIOS))
+    parser.add_argument('--peticiones', type=int, default=200, help='Peticiones medidas por escenario')
+    parser.add_argument('--concurrencia', type=int, default=4)
+    parser.add_argument('--calentamiento', type=int, default=3, help='Peticiones sin medir por hilo')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--email', default=BENCH_EMAIL)
+    parser.add_argument('--password', default=BENCH_PASSWORD)
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto stdout)')
+    parser.add_argument('--comparar', help='Resultado JSON previo contra el cual comparar')
+    args = parser.parse_args()
+
+    if args.url:
+        crear_cliente = lambda: ClienteHttp(args.url)
+    else:
+        from app import app
+        crear_cliente = lambda: ClientePrueba(app)
+
+    cliente = crear_cliente()
+    if not iniciar_sesion(cliente, args.email, args.password):
+        raise SystemExit(' No se pudo iniciar sesión con el usuario de benchmark')
+    contexto = Contexto(cliente)
+
+    resultado = {
+        'commit': _commit_actual(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'modo': args.url or 'test_client',
+        'concurrencia': args.concurrencia,
+        'escenarios': {}
+    }
+    for nombre in args.escenarios.split(','):
+        resultado['escenarios'][nombre] = medir(nombre, crear_cliente, contexto, args)
+        print(f" {nombre}: p50 {resultado['escenarios'][nombre]['p50_ms']} ms", file=sys.stderr)
+
+    salida = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            archivo.write(salida + '\n')
+    else:
+        print(salida)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            comparar(resultado, json.load(archivo))
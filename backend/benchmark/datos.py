@@ -0,0 +1,236 @@
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mysql.connector
+from config import Config
+from auth import hash_password
+from database.init_db import init_database
+from database.resumenes import reconstruir_resumenes
+
+# Generador determinista: la misma semilla y los mismos parámetros producen los mismos datos
+
+BENCH_EMAIL = 'bench@laboratorio.local'
+BENCH_PASSWORD = 'bench123'
+PRESTAMOS_POR_LOTE = 5000
+
+LUGARES = ['Laboratorio A', 'Laboratorio B', 'Taller de máquinas', 'Aula 12', 'Sala de tableros']
+CATEGORIAS = ['Medición', 'Protección', 'Cableado', 'Fuentes', 'Motores', 'Herramientas']
+OBSERVACIONES = ['Material con desgaste', 'Falta una punta de prueba', 'Cable dañado',
+                 'Devolver antes de las 18:00', 'Equipo descalibrado']
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Carla', 'Jorge', 'Sofía', 'Diego', 'Elena', 'Raúl']
+APELLIDOS = ['García', 'Hernández', 'López', 'Martínez', 'Pérez', 'Sánchez', 'Ramírez', 'Cruz']
+
+def conectar(load_data=False):
+    return mysql.connector.connect(
+        host=Config.MYSQL_HOST,
+        user=Config.MYSQL_USER,
+        password=Config.MYSQL_PASSWORD,
+        database=Config.MYSQL_DB,
+        port=Config.MYSQL_PORT,
+        allow_local_infile=load_data
+    )
+
+def _tsv(valor):
+    if valor is None:
+        return '\\N'
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    return str(valor).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+def cargar(cursor, tabla, columnas, filas, load_data=False):
+    """Inserta un lote con executemany o, si se pide, con LOAD DATA LOCAL INFILE"""
+    if not filas:
+        return
+    if load_data:
+        with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf-8', delete=False) as archivo:
+            for fila in filas:
+                archivo.write('\t'.join(_tsv(v) for v in fila) + '\n')
+        try:
+            cursor.execute(f"LOAD DATA LOCAL INFILE %s INTO TABLE {tabla} CHARACTER SET utf8mb4 "
+                           f"FIELDS TERMINATED BY '\\t' ({', '.join(columnas)})", (archivo.name,))
+        finally:
+            os.unlink(archivo.name)
+    else:
+        cursor.executemany(
+            f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join(['%s'] * len(columnas))})",
+            filas
+        )
+
+def _siguiente_id(cursor, tabla):
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {tabla}')
+    return cursor.fetchone()[0]
+
+def _firma_vectorial(rng):
+    """Firma en el formato v1 de firma_digital.js: trazos con deltas enteros"""
+    trazos = []
+    for _ in range(rng.randint(1, 4)):
+        x, y = rng.randint(20, 300), rng.randint(20, 120)
+        puntos = [f'{x},{y}']
+        for _ in range(rng.randint(8, 40)):
+            puntos.append(f'{rng.randint(-12, 12)},{rng.randint(-8, 8)}')
+        trazos.append(','.join(puntos))
+    return ('v1;400x150;' + ';'.join(trazos)).encode('ascii')
+
+def generar(conn, args):
+    rng = random.Random(args.semilla)
+    cursor = conn.cursor()
+    inicio = time.perf_counter()
+
+    cursor.execute('SELECT COUNT(*) FROM carreras WHERE nombre = %s', (f'{args.prefijo} Carrera 1',))
+    if cursor.fetchone()[0]:
+        raise SystemExit(f" Ya existen datos con el prefijo '{args.prefijo}'; use otra base o --prefijo")
+
+    cursor.execute('SET unique_checks = 0')
+    cursor.execute('SET foreign_key_checks = 0')
+
+    cursor.execute('''
+        INSERT IGNORE INTO usuarios (nombre, email, tipo, password_hash) VALUES (%s, %s, %s, %s)
+    ''', ('Benchmark', BENCH_EMAIL, 'administrador', hash_password(BENCH_PASSWORD)))
+    cursor.execute('SELECT id FROM usuarios WHERE email = %s', (BENCH_EMAIL,))
+    usuario_id = cursor.fetchone()[0]
+
+    # Catálogos (asignaturas.carrera_id es UNIQUE: una asignatura por carrera)
+    base = _siguiente_id(cursor, 'carreras')
+    carreras = list(range(base, base + args.carreras))
+    cargar(cursor, 'carreras', ['id', 'nombre', 'abreviatura'],
+           [(c, f'{args.prefijo} Carrera {n}', f'BC{n}') for n, c in enumerate(carreras, 1)])
+
+    base = _siguiente_id(cursor, 'asignaturas')
+    asignaturas = {c: base + i for i, c in enumerate(carreras)}
+    cargar(cursor, 'asignaturas', ['id', 'nombre', 'clave', 'carrera_id'],
+           [(a, f'{args.prefijo} Asignatura {n}', f'BA{n}', c)
+            for n, (c, a) in enumerate(asignaturas.items(), 1)])
+
+    base = _siguiente_id(cursor, 'docentes')
+    docentes = {c: [] for c in carreras}
+    filas = []
+    for c in carreras:
+        for _ in range(args.docentes_por_carrera):
+            docente_id = base + len(filas)
+            docentes[c].append(docente_id)
+            filas.append((docente_id, f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}',
+                          f'docente{docente_id}@{args.prefijo.lower()}.local', c))
+    cargar(cursor, 'docentes', ['id', 'nombre', 'email', 'carrera_id'], filas)
+
+    base = _siguiente_id(cursor, 'materiales')
+    materiales = list(range(base, base + args.materiales))
+    cargar(cursor, 'materiales', ['id', 'nombre', 'descripcion', 'cantidad_disponible', 'categoria'],
+           [(m, f'{args.prefijo} Material {n}', None, 1000000, rng.choice(CATEGORIAS))
+            for n, m in enumerate(materiales, 1)])
+
+    base = _siguiente_id(cursor, 'practicas')
+    practicas = []
+    relaciones = []
+    for i in range(args.practicas):
+        practica_id = base + i
+        carrera_id = carreras[i % len(carreras)]
+        practicas.append((practica_id, carrera_id))
+        for material_id in rng.sample(materiales, min(len(materiales), rng.randint(2, 6))):
+            relaciones.append((practica_id, material_id, rng.randint(1, 3)))
+    cargar(cursor, 'practicas', ['id', 'numero', 'nombre', 'descripcion', 'asignatura_id'],
+           [(p, i // len(carreras) + 1, f'{args.prefijo} Práctica {i + 1}', None, asignaturas[c])
+            for i, (p, c) in enumerate(practicas)])
+    for i in range(0, len(relaciones), PRESTAMOS_POR_LOTE):
+        cargar(cursor, 'practica_materiales', ['practica_id', 'material_id', 'cantidad_requerida'],
+               relaciones[i:i + PRESTAMOS_POR_LOTE])
+    materiales_por_practica = {}
+    for practica_id, material_id, cantidad in relaciones:
+        materiales_por_practica.setdefault(practica_id, []).append((material_id, cantidad))
+
+    firmas = []
+    filas = []
+    for _ in range(args.firmas):
+        contenido = _firma_vectorial(rng)
+        firma_hash = hashlib.sha256(contenido).hexdigest()
+        firmas.append(firma_hash)
+        filas.append((firma_hash, 'vector', contenido, len(contenido)))
+    cursor.executemany('''
+        INSERT IGNORE INTO firmas (hash, formato, contenido, tamano) VALUES (%s, %s, %s, %s)
+    ''', filas)
+    conn.commit()
+    print(f"   Catálogos generados ({time.perf_counter() - inicio:.1f} s)")
+
+    # Préstamos, detalles e integrantes por lotes, un commit por lote
+    fin = datetime.combine(args.fecha_fin, datetime.min.time()) + timedelta(hours=20)
+    segundos = args.dias * 86400
+    prestamo_id = _siguiente_id(cursor, 'prestamos')
+    detalle_id = _siguiente_id(cursor, 'detalles_prestamo')
+    integrante_id = _siguiente_id(cursor, 'integrantes')
+    control = 20000000
+
+    for lote in range(0, args.prestamos, PRESTAMOS_POR_LOTE):
+        prestamos, detalles, integrantes = [], [], []
+        for _ in range(min(PRESTAMOS_POR_LOTE, args.prestamos - lote)):
+            practica_id, carrera_id = rng.choice(practicas)
+            fecha = fin - timedelta(seconds=rng.randrange(segundos))
+            devuelto = (fin - fecha).days > 7 and rng.random() < 0.95
+            observacion = rng.choice(OBSERVACIONES) if rng.random() < 0.15 else None
+            prestamos.append((prestamo_id, fecha, carrera_id, asignaturas[carrera_id],
+                              rng.choice(docentes[carrera_id]), practica_id, rng.choice(LUGARES),
+                              observacion, 'urgente' if observacion and rng.random() < 0.2 else 'normal',
+                              'devuelto' if devuelto else 'activo', usuario_id))
+            for material_id, cantidad in materiales_por_practica[practica_id]:
+                detalles.append((detalle_id, prestamo_id, material_id, cantidad,
+                                 cantidad if devuelto else 0))
+                detalle_id += 1
+            for _ in range(rng.randint(1, 4)):
+                control += 1
+                integrantes.append((integrante_id, prestamo_id,
+                                    f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}',
+                                    str(control), rng.choice(firmas) if firmas else None))
+                integrante_id += 1
+            prestamo_id += 1
+
+        cargar(cursor, 'prestamos', ['id', 'fecha_hora', 'carrera_id', 'asignatura_id', 'docente_id',
+                                     'practica_id', 'lugar_uso', 'observaciones',
+                                     'importancia_observacion', 'estado', 'usuario_id'],
+               prestamos, args.load_data)
+        cargar(cursor, 'detalles_prestamo', ['id', 'prestamo_id', 'material_id', 'cantidad',
+                                             'cantidad_devuelta'], detalles, args.load_data)
+        cargar(cursor, 'integrantes', ['id', 'prestamo_id', 'nombre', 'no_control', 'firma_hash'],
+               integrantes, args.load_data)
+        conn.commit()
+        hechos = lote + len(prestamos)
+        if hechos % (PRESTAMOS_POR_LOTE * 20) == 0 or hechos == args.prestamos:
+            print(f"   {hechos} préstamos ({time.perf_counter() - inicio:.1f} s)")
+
+    cursor.execute('SET unique_checks = 1')
+    cursor.execute('SET foreign_key_checks = 1')
+    cursor.close()
+
+    print(" Reconstruyendo resúmenes diarios...")
+    reconstruir_resumenes(conn, args.fecha_fin - timedelta(days=args.dias), args.fecha_fin)
+    print(f" Datos generados en {time.perf_counter() - inicio:.1f} s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Genera datos sintéticos para el benchmark')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--prefijo', default='Bench', help='Prefijo de los nombres generados')
+    parser.add_argument('--carreras', type=int, default=50)
+    parser.add_argument('--docentes-por-carrera', type=int, default=10)
+    parser.add_argument('--materiales', type=int, default=500)
+    parser.add_argument('--practicas', type=int, default=5000)
+    parser.add_argument('--prestamos', type=int, default=1000000)
+    parser.add_argument('--firmas', type=int, default=2000, help='Firmas distintas a reutilizar')
+    parser.add_argument('--dias', type=int, default=730, help='Días de historial')
+    parser.add_argument('--fecha-fin', type=date.fromisoformat, default=date.today(),
+                        help='Último día del historial (AAAA-MM-DD); fíjelo para datos idénticos')
+    parser.add_argument('--load-data', action='store_true',
+                        help='Usar LOAD DATA LOCAL INFILE (requiere local_infile=1 en el servidor)')
+    args = parser.parse_args()
+
+    if not init_database():
+        sys.exit(1)
+
+    conn = conectar(args.load_data)
+    try:
+        generar(conn, args)
+    finally:
+        conn.close()
@@ -0,0 +1,121 @@
+import re
+
+# Búsqueda de texto con índices FULLTEXT de InnoDB (modo booleano, cada palabra como prefijo)
+
+FT_MIN_TOKEN = 3  # innodb_ft_min_token_size por defecto
+MAX_PALABRAS = 8
+PALABRAS = re.compile(r'\w+', re.UNICODE)
+
+# tipo -> campos, origen, filtro, columnas FULLTEXT, columnas para prefijo corto, desempate
+BUSQUEDAS = {
+    'docentes': {
+        'campos': 'd.id, d.nombre, d.email, c.nombre as carrera_nombre',
+        'origen': 'docentes d JOIN carreras c ON d.carrera_id = c.id',
+        'filtro': 'd.activo = TRUE',
+        'fulltext': 'd.nombre',
+        'prefijo': ('d.nombre',),
+        'orden': 'd.nombre'
+    },
+    'practicas': {
+        'campos': 'pr.id, pr.numero, pr.nombre, a.nombre as asignatura_nombre',
+        'origen': 'practicas pr JOIN asignaturas a ON pr.asignatura_id = a.id',
+        'filtro': 'pr.activa = TRUE',
+        'fulltext': 'pr.nombre, pr.descripcion',
+        'prefijo': ('pr.nombre',),
+        'orden': 'pr.nombre'
+    },
+    'materiales': {
+        'campos': 'm.id, m.nombre, m.categoria, m.cantidad_disponible',
+        'origen': 'materiales m',
+        'filtro': '1=1',
+        'fulltext': 'm.nombre, m.descripcion, m.categoria',
+        'prefijo': ('m.nombre',),
+        'orden': 'm.nombre'
+    },
+    'integrantes': {
+        'campos': 'i.prestamo_id, i.nombre, i.no_control, p.fecha_hora, p.estado',
+        'origen': 'integrantes i JOIN prestamos p ON i.prestamo_id = p.id',
+        'filtro': 'p.activo = TRUE',
+        'fulltext': 'i.nombre, i.no_control',
+        'prefijo': ('i.no_control', 'i.nombre'),
+        'orden': 'p.fecha_hora DESC'
+    },
+    'prestamos': {
+        'campos': 'p.id, p.fecha_hora, p.estado, p.observaciones, p.importancia_observacion',
+        'origen': 'prestamos p',
+        'filtro': 'p.activo = TRUE AND p.observaciones IS NOT NULL',
+        'fulltext': 'p.observaciones',
+        'prefijo': (),
+        'orden': 'p.fecha_hora DESC'
+    }
+}
+
+def preparar_consulta(texto):
+    """Consulta booleana: todas las palabras requeridas y como prefijo; None si ninguna es indexable"""
+    palabras = [p for p in PALABRAS.findall(texto or '') if len(p) >= FT_MIN_TOKEN][:MAX_PALABRAS]
+    if not palabras:
+        return None
+    return ' '.join(f'+{palabra}*' for palabra in palabras)
+
+def _escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def consulta_busqueda(tipo, texto, limite):
+    """SQL y parámetros de un tipo; None si el texto no se puede buscar en ese tipo"""
+    spec = BUSQUEDAS[tipo]
+    booleana = preparar_consulta(texto)
+    if booleana:
+        sql = f'''
+            SELECT {spec['campos']}, MATCH({spec['fulltext']}) AGAINST (%s IN BOOLEAN MODE) as relevancia
+            FROM {spec['origen']}
+            WHERE {spec['filtro']} AND MATCH({spec['fulltext']}) AGAINST (%s IN BOOLEAN MODE)
+            ORDER BY relevancia DESC, {spec['orden']}
+            LIMIT %s'''
+        return sql, [booleana, booleana, limite]
+
+    # Texto más corto que el token mínimo: prefijo sobre columnas con índice B-tree o tablas pequeñas
+    texto = (texto or '').strip()
+    if not texto or not spec['prefijo']:
+        return None
+    condiciones = ' OR '.join(f'{columna} LIKE %s' for columna in spec['prefijo'])
+    sql = f'''
+        SELECT {spec['campos']}, 0 as relevancia
+        FROM {spec['origen']}
+        WHERE {spec['filtro']} AND ({condiciones})
+        ORDER BY {spec['orden']}
+        LIMIT %s'''
+    return sql, [_escapar_like(texto) + '%'] * len(spec['prefijo']) + [limite]
+
+def buscar(cursor, texto, tipos, limite=10):
+    """Resultados por tipo, ordenados por relevancia, en un solo viaje con múltiples resultados"""
+    consultas = []
+    for tipo in tipos:
+        consulta = consulta_busqueda(tipo, texto, limite)
+        if consulta:
+            consultas.append((tipo, consulta))
+
+    resultados = {tipo: [] for tipo in tipos}
+    if not consultas:
+        return resultados
+
+    sql = ';'.join(consulta[0] for _, consulta in consultas)
+    params = [param for _, consulta in consultas for param in consulta[1]]
+    filas = [result.fetchall() for result in cursor.execute(sql, params, multi=True) if result.with_rows]
+    for (tipo, _), rows in zip(consultas, filas):
+        resultados[tipo] = rows
+    return resultados
+
+def condicion_prestamos(texto):
+    """Condición para filtrar préstamos por observaciones o por nombre/no. de control de integrantes"""
+    booleana = preparar_consulta(texto)
+    if booleana:
+        return ('''(MATCH(p.observaciones) AGAINST (%s IN BOOLEAN MODE)
+                 OR p.id IN (SELECT i.prestamo_id FROM integrantes i
+                             WHERE MATCH(i.nombre, i.no_control) AGAINST (%s IN BOOLEAN MODE)))''',
+                [booleana, booleana])
+    texto = (texto or '').strip()
+    if not texto:
+        return None
+    prefijo = _escapar_like(texto) + '%'
+    return ('''p.id IN (SELECT i.prestamo_id FROM integrantes i
+                       WHERE i.no_control LIKE %s OR i.nombre LIKE %s)''', [prefijo, prefijo])
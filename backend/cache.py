@@ -0,0 +1,532 @@
+import hashlib
+import os
+import pickle
+import socket
+import sqlite3
+import stat
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+class CacheBase:
+    """Interfaz común de los backends: get/set/invalidate por namespace y contadores"""
+
+    nombre = 'base'
+    # Un backend compartido es visible para todos los workers del host o del cluster
+    compartido = False
+
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errores = 0
+        self._por_namespace = {}
+        self._stats_lock = threading.Lock()
+
+    def _registrar(self, namespace, acierto):
+        with self._stats_lock:
+            contadores = self._por_namespace.setdefault(namespace, [0, 0])
+            if acierto:
+                self.hits += 1
+                contadores[0] += 1
+            else:
+                self.misses += 1
+                contadores[1] += 1
+
+    def _error(self):
+        with self._stats_lock:
+            self.errores += 1
+
+    def _entradas(self):
+        return None
+
+    # Los backends implementan get, set, delete, invalidate, clear, incr, set_counter y
+    # get_counters; get_counters devuelve None (no una lista) si el backend falla. incr_ventana
+    # suma de forma atómica a un contador que expira `ttl` segundos después de crearse
+    # (None si el backend falla) y delete_ventana lo elimina
+
+    def get_stats(self):
+        entradas = self._entradas()
+        with self._stats_lock:
+            return {'backend': self.nombre, 'entradas': entradas, 'hits': self.hits,
+                    'misses': self.misses, 'errores': self.errores,
+                    'namespaces': {ns: {'hits': h, 'misses': m}
+                                   for ns, (h, m) in self._por_namespace.items()}}
+
+class TTLCache(CacheBase):
+    """Cache en memoria con expiracion (TTL) y desalojo LRU"""
+
+    nombre = 'memoria'
+
+    def __init__(self, maxsize=256, ttl=60):
+        super().__init__(maxsize, ttl)
+        self._data = OrderedDict()
+        self._counters = {}
+        self._ventanas = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key, default=None):
+        """Obtiene un valor vigente o default"""
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[(namespace, key)]
+                entry = None
+            else:
+                self._data.move_to_end((namespace, key))
+        self._registrar(namespace, entry is not None)
+        return default if entry is None else entry[1]
+
+    def set(self, namespace, key, value, ttl=None):
+        """Guarda un valor y desaloja el menos usado si se excede el tamaño"""
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[(namespace, key)] = (expires, value)
+            self._data.move_to_end((namespace, key))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def invalidate(self, *namespaces):
+        """Elimina todas las entradas de los namespaces indicados"""
+        with self._lock:
+            for cache_key in [k for k in self._data if k[0] in namespaces]:
+                del self._data[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            return self._counters[name]
+
+    def set_counter(self, name, value):
+        with self._lock:
+            self._counters[name] = value
+
+    def get_counters(self, names):
+        with self._lock:
+            return [self._counters.get(name) for name in names]
+
+    def incr_ventana(self, namespace, key, ttl, delta=1):
+        ahora = time.monotonic()
+        with self._lock:
+            if len(self._ventanas) > self.maxsize:
+                self._ventanas = {k: v for k, v in self._ventanas.items() if v[0] > ahora}
+            expira, valor = self._ventanas.get((namespace, key), (0, 0))
+            if expira <= ahora:
+                expira, valor = ahora + ttl, 0
+            self._ventanas[(namespace, key)] = (expira, valor + delta)
+            return valor + delta
+
+    def delete_ventana(self, namespace, key):
+        with self._lock:
+            self._ventanas.pop((namespace, key), None)
+
+    def _entradas(self):
+        with self._lock:
+            return len(self._data)
+
+def archivo_privado(path):
+    """Crea o valida un archivo 0600 del usuario del proceso; los valores se guardan con pickle, así que
+    un archivo ajeno o escribible por otros usuarios permitiría ejecutar código al leerlo"""
+    directorio = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directorio, mode=0o700, exist_ok=True)
+    modo = os.stat(directorio).st_mode
+    if modo & 0o022 and not modo & stat.S_ISVTX:
+        raise PermissionError(f'{directorio} es escribible por otros usuarios')
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    try:
+        estados = [os.fstat(fd)] + [os.lstat(path + sufijo) for sufijo in ('-wal', '-shm')
+                                    if os.path.lexists(path + sufijo)]
+        for estado in estados:
+            if hasattr(os, 'getuid') and estado.st_uid != os.getuid():
+                raise PermissionError(f'{path} pertenece a otro usuario')
+        if hasattr(os, 'fchmod') and estados[0].st_mode & 0o077:
+            os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+
+class SQLiteCache(CacheBase):
+    """Cache compartida entre los workers de un mismo host mediante un archivo SQLite (WAL) privado"""
+
+    nombre = 'sqlite'
+    compartido = True
+
+    def __init__(self, path, maxsize=256, ttl=60):
+        super().__init__(maxsize, ttl)
+        self.path = path
+        archivo_privado(path)
+        self._local = threading.local()
+        self._escrituras = 0
+        with self._conn() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    clave TEXT NOT NULL,
+                    valor BLOB NOT NULL,
+                    expira REAL NOT NULL,
+                    PRIMARY KEY (namespace, clave)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_expira ON cache (expira)')
+            conn.execute('CREATE TABLE IF NOT EXISTS contadores (nombre TEXT PRIMARY KEY, valor INTEGER NOT NULL)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ventanas (
+                    namespace TEXT NOT NULL,
+                    clave TEXT NOT NULL,
+                    valor INTEGER NOT NULL,
+                    expira REAL NOT NULL,
+                    PRIMARY KEY (namespace, clave)
+                )
+            ''')
+
+    def _conn(self):
+        # Una conexión por hilo y por proceso (las conexiones no sobreviven a un fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace, key, default=None):
+        try:
+            row = self._conn().execute(
+                'SELECT valor FROM cache WHERE namespace = ? AND clave = ? AND expira > ?',
+                (namespace, repr(key), time.time())).fetchone()
+        except sqlite3.Error:
+            self._error()
+            row = None
+        self._registrar(namespace, row is not None)
+        return default if row is None else pickle.loads(row[0])
+
+    def set(self, namespace, key, value, ttl=None):
+        expira = time.time() + (self.ttl if ttl is None else ttl)
+        try:
+            conn = self._conn()
+            conn.execute('INSERT OR REPLACE INTO cache (namespace, clave, valor, expira) VALUES (?, ?, ?, ?)',
+                         (namespace, repr(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expira))
+            self._escrituras += 1
+            if self._escrituras % 100 == 0:
+                self._podar(conn)
+        except sqlite3.Error:
+            self._error()
+
+    def _podar(self, conn):
+        """Elimina expirados y, si se excede maxsize, las entradas más próximas a expirar"""
+        conn.execute('DELETE FROM cache WHERE expira <= ?', (time.time(),))
+        conn.execute('DELETE FROM ventanas WHERE expira <= ?', (time.time(),))
+        conn.execute('''
+            DELETE FROM cache WHERE rowid IN (
+                SELECT rowid FROM cache ORDER BY expira LIMIT MAX(0, (SELECT COUNT(*) FROM cache) - ?)
+            )
+        ''', (self.maxsize,))
+
+    def delete(self, namespace, key):
+        try:
+            self._conn().execute('DELETE FROM cache WHERE namespace = ? AND clave = ?', (namespace, repr(key)))
+        except sqlite3.Error:
+            self._error()
+
+    def invalidate(self, *namespaces):
+        if not namespaces:
+            return
+        try:
+            self._conn().execute(f"DELETE FROM cache WHERE namespace IN ({', '.join('?' * len(namespaces))})",
+                                 namespaces)
+        except sqlite3.Error:
+            self._error()
+
+    def clear(self):
+        self._conn().execute('DELETE FROM cache')
+
+    def incr(self, name):
+        try:
+            conn = self._conn()
+            conn.execute('INSERT INTO contadores (nombre, valor) VALUES (?, 1) '
+                         'ON CONFLICT(nombre) DO UPDATE SET valor = valor + 1', (name,))
+            return conn.execute('SELECT valor FROM contadores WHERE nombre = ?', (name,)).fetchone()[0]
+        except sqlite3.Error:
+            self._error()
+            return None
+
+    def set_counter(self, name, value):
+        try:
+            self._conn().execute('INSERT OR REPLACE INTO contadores (nombre, valor) VALUES (?, ?)',
+                                 (name, value))
+        except sqlite3.Error:
+            self._error()
+
+    def get_counters(self, names):
+        try:
+            filas = dict(self._conn().execute(
+                f"SELECT nombre, valor FROM contadores WHERE nombre IN ({', '.join('?' * len(names))})",
+                names).fetchall()) if names else {}
+        except sqlite3.Error:
+            self._error()
+            return None
+        return [filas.get(name) for name in names]
+
+    def incr_ventana(self, namespace, key, ttl, delta=1):
+        ahora = time.time()
+        try:
+            conn = self._conn()
+            # BEGIN IMMEDIATE toma el bloqueo de escritura: la lectura del resultado es del mismo incremento
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('''
+                    INSERT INTO ventanas (namespace, clave, valor, expira) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(namespace, clave) DO UPDATE SET
+                        valor = CASE WHEN expira > ? THEN valor + excluded.valor ELSE excluded.valor END,
+                        expira = CASE WHEN expira > ? THEN expira ELSE excluded.expira END
+                ''', (namespace, repr(key), delta, ahora + ttl, ahora, ahora))
+                valor = conn.execute('SELECT valor FROM ventanas WHERE namespace = ? AND clave = ?',
+                                     (namespace, repr(key))).fetchone()[0]
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+            return valor
+        except sqlite3.Error:
+            self._error()
+            return None
+
+    def delete_ventana(self, namespace, key):
+        try:
+            self._conn().execute('DELETE FROM ventanas WHERE namespace = ? AND clave = ?', (namespace, repr(key)))
+        except sqlite3.Error:
+            self._error()
+
+    def _entradas(self):
+        try:
+            return self._conn().execute('SELECT COUNT(*) FROM cache WHERE expira > ?',
+                                        (time.time(),)).fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+class ErrorRedis(Exception):
+    """Error de protocolo o de conexión con el servidor Redis"""
+
+class _ConexionResp:
+    """Cliente mínimo del protocolo RESP2 (el usado por Redis)"""
+
+    def __init__(self, host, port, db, timeout):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._archivo = self._sock.makefile('rb')
+        if db:
+            self.comando('SELECT', db)
+
+    def _codificar(self, args):
+        partes = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            partes.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(partes)
+
+    def _leer(self):
+        linea = self._archivo.readline()
+        if not linea:
+            raise ErrorRedis('Conexión cerrada por el servidor')
+        tipo, resto = linea[:1], linea[1:-2]
+        if tipo == b'+':
+            return resto.decode('utf-8')
+        if tipo == b'-':
+            raise ErrorRedis(resto.decode('utf-8'))
+        if tipo == b':':
+            return int(resto)
+        if tipo == b'$':
+            largo = int(resto)
+            if largo < 0:
+                return None
+            data = self._archivo.read(largo + 2)
+            return data[:-2]
+        if tipo == b'*':
+            largo = int(resto)
+            return None if largo < 0 else [self._leer() for _ in range(largo)]
+        raise ErrorRedis(f'Respuesta RESP inválida: {linea!r}')
+
+    def comando(self, *args):
+        self._sock.sendall(self._codificar(args))
+        return self._leer()
+
+    def pipeline(self, *comandos):
+        self._sock.sendall(b''.join(self._codificar(args) for args in comandos))
+        return [self._leer() for _ in comandos]
+
+    def cerrar(self):
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+class RedisCache(CacheBase):
+    """Cache compartida entre hosts sobre el protocolo Redis
+
+    La invalidación incrementa la generación del namespace; las claves viejas
+    quedan inaccesibles y expiran solas por TTL.
+    """
+
+    nombre = 'redis'
+    compartido = True
+
+    def __init__(self, url, maxsize=256, ttl=60, prefijo='lab', timeout=1.0):
+        super().__init__(maxsize, ttl)
+        partes = urlparse(url)
+        self.host = partes.hostname or 'localhost'
+        self.port = partes.port or 6379
+        self.db = int(partes.path.lstrip('/') or 0)
+        self.prefijo = prefijo
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = _ConexionResp(self.host, self.port, self.db, self.timeout)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ejecutar(self, *comandos):
+        try:
+            return self._conn().pipeline(*comandos)
+        except (OSError, ErrorRedis):
+            # Se reconecta en la siguiente operación; la cache falla como un miss
+            conn = getattr(self._local, 'conn', None)
+            if conn is not None:
+                conn.cerrar()
+            self._local.conn = None
+            self._error()
+            return None
+
+    def _gen(self, namespace):
+        return f'{self.prefijo}:gen:{namespace}'
+
+    def _clave(self, namespace, generacion, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return f'{self.prefijo}:{namespace}:{int(generacion or 0)}:{digest}'
+
+    def get(self, namespace, key, default=None):
+        respuesta = self._ejecutar(('GET', self._gen(namespace)))
+        valor = None
+        if respuesta is not None:
+            respuesta = self._ejecutar(('GET', self._clave(namespace, respuesta[0], key)))
+            valor = respuesta[0] if respuesta else None
+        self._registrar(namespace, valor is not None)
+        return default if valor is None else pickle.loads(valor)
+
+    def set(self, namespace, key, value, ttl=None):
+        respuesta = self._ejecutar(('GET', self._gen(namespace)))
+        if respuesta is None:
+            return
+        ms = int((self.ttl if ttl is None else ttl) * 1000)
+        self._ejecutar(('SET', self._clave(namespace, respuesta[0], key),
+                        pickle.dumps(value, pickle.HIGHEST_PROTOCOL), 'PX', ms))
+
+    def delete(self, namespace, key):
+        respuesta = self._ejecutar(('GET', self._gen(namespace)))
+        if respuesta is not None:
+            self._ejecutar(('DEL', self._clave(namespace, respuesta[0], key)))
+
+    def invalidate(self, *namespaces):
+        if namespaces:
+            self._ejecutar(*[('INCR', self._gen(namespace)) for namespace in namespaces])
+
+    def clear(self):
+        self._ejecutar(('FLUSHDB',))
+
+    def incr(self, name):
+        respuesta = self._ejecutar(('INCR', f'{self.prefijo}:cnt:{name}'))
+        return respuesta[0] if respuesta else None
+
+    def set_counter(self, name, value):
+        self._ejecutar(('SET', f'{self.prefijo}:cnt:{name}', value))
+
+    def get_counters(self, names):
+        if not names:
+            return []
+        respuesta = self._ejecutar(('MGET',) + tuple(f'{self.prefijo}:cnt:{n}' for n in names))
+        if respuesta is None:
+            return None
+        return [None if v is None else int(v) for v in respuesta[0]]
+
+    def _ventana(self, namespace, key):
+        return f'{self.prefijo}:ventana:{namespace}:{hashlib.sha1(repr(key).encode("utf-8")).hexdigest()}'
+
+    def incr_ventana(self, namespace, key, ttl, delta=1):
+        clave = self._ventana(namespace, key)
+        respuesta = self._ejecutar(('INCRBY', clave, delta), ('PTTL', clave))
+        if respuesta is None:
+            return None
+        if respuesta[1] == -1:
+            # Recién creada por INCRBY (o sin expiración por una caída previa): inicia la ventana
+            self._ejecutar(('PEXPIRE', clave, int(ttl * 1000)))
+        return respuesta[0]
+
+    def delete_ventana(self, namespace, key):
+        self._ejecutar(('DEL', self._ventana(namespace, key)))
+
+def crear_cache(backend='memoria', url=None, maxsize=256, ttl=60):
+    """Construye el backend configurado (memoria, sqlite o redis)"""
+    if backend == 'sqlite':
+        if not url:
+            raise ValueError('El backend sqlite requiere la ruta del archivo')
+        return SQLiteCache(url, maxsize=maxsize, ttl=ttl)
+    if backend == 'redis':
+        return RedisCache(url or 'redis://localhost:6379/0', maxsize=maxsize, ttl=ttl)
+    if backend != 'memoria':
+        raise ValueError(f'Backend de cache desconocido: {backend}')
+    return TTLCache(maxsize=maxsize, ttl=ttl)
+
+class TableVersions:
+    """Contador de versión por tabla para respuestas condicionales (ETag)"""
+
+    def __init__(self, backend=None):
+        self._backend = backend if backend is not None else TTLCache()
+        # Con un backend local cada worker tiene sus propios contadores: el ETag
+        # incluye el id del proceso para no responder 304 con datos de otro worker
+        self.boot_id = 'compartido' if self._backend.compartido else uuid.uuid4().hex[:8]
+        self._boot_time = datetime.now(timezone.utc).replace(microsecond=0)
+        if self._backend.compartido:
+            inicio = (self._backend.get_counters(['inicio']) or [None])[0]
+            if inicio is None:
+                self._backend.set_counter('inicio', int(self._boot_time.timestamp()))
+            else:
+                self._boot_time = datetime.fromtimestamp(inicio, timezone.utc)
+
+    def bump(self, *tables):
+        """Incrementa la versión de las tablas modificadas"""
+        now = int(time.time())
+        for table in tables:
+            self._backend.incr(f'version:{table}')
+            self._backend.set_counter(f'modificada:{table}', now)
+
+    def etag(self, tables, key=None):
+        """ETag fuerte derivado de las versiones de las tablas y el filtro"""
+        versiones = self._backend.get_counters([f'version:{t}' for t in tables])
+        if versiones is None:
+            # Sin acceso a las versiones no se puede garantizar un 304 correcto
+            return uuid.uuid4().hex
+        versions = ','.join(f'{t}:{v or 0}' for t, v in zip(tables, versiones))
+        raw = f'{self.boot_id}|{versions}|{key}'
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def last_modified(self, tables):
+        marcas = [m for m in self._backend.get_counters([f'modificada:{t}' for t in tables]) or [] if m]
+        if not marcas:
+            return self._boot_time
+        return max(self._boot_time, datetime.fromtimestamp(max(marcas), timezone.utc))
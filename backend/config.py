@@ -11,6 +11,72 @@ class Config:
     MYSQL_DB = os.getenv('MYSQL_DB')
     MYSQL_PORT = int(os.getenv('MYSQL_PORT', 3306))
 
+    # Pool de conexiones (por proceso/worker de gunicorn)
+    MYSQL_POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', 5))
+    MYSQL_POOL_TIMEOUT = float(os.getenv('MYSQL_POOL_TIMEOUT', 10))
+    MYSQL_POOL_MAX_AGE = int(os.getenv('MYSQL_POOL_MAX_AGE', 1800))
+    MYSQL_POOL_PING_INTERVAL = int(os.getenv('MYSQL_POOL_PING_INTERVAL', 5))
+
+    # Cache de catalogos (/api/*): sqlite (archivo compartido por los workers del host), redis (varios hosts)
+    # o memoria (solo con un worker: la invalidación no llega a los demás procesos)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite')
+    # Archivos locales (caches sqlite, sesiones, PDF) en una carpeta privada (0700), nunca en /tmp compartido
+    DATA_DIR = os.getenv('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance'))
+    CACHE_URL = os.getenv('CACHE_URL', os.path.join(DATA_DIR, 'cache.sqlite3') if CACHE_BACKEND == 'sqlite' else None)
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 300))
+    CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 512))
+    DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 5))
+
+    # Tickets ya renderizados (archivo propio con sqlite para no desplazar a los catálogos); siempre
+    # compartidos: una devolución en un worker debe borrar el ticket de todos
+    TICKET_CACHE_BACKEND = os.getenv('TICKET_CACHE_BACKEND', 'sqlite' if CACHE_BACKEND == 'memoria' else CACHE_BACKEND)
+    TICKET_CACHE_URL = os.getenv('TICKET_CACHE_URL', os.path.join(DATA_DIR, 'tickets.sqlite3')
+                                 if TICKET_CACHE_BACKEND == 'sqlite' else CACHE_URL)
+    TICKET_CACHE_SIZE = int(os.getenv('TICKET_CACHE_SIZE', 2000))
+    TICKET_CACHE_TTL = int(os.getenv('TICKET_CACHE_TTL', 600))
+
+    # Tickets en PDF: procesos de renderizado por worker (0 = núcleos / WEB_CONCURRENCY) y cache en disco
+    # por hash de contenido. WEB_CONCURRENCY es también el número de workers que toma gunicorn
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+    PDF_PROCESOS = int(os.getenv('PDF_PROCESOS', 0))
+    PDF_TIMEOUT = float(os.getenv('PDF_TIMEOUT', 120))
+    PDF_MAX_TICKETS = int(os.getenv('PDF_MAX_TICKETS', 2000))
+    PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(DATA_DIR, 'pdf'))
+    PDF_CACHE_MAX_MB = int(os.getenv('PDF_CACHE_MAX_MB', 500))
+
+    # Trabajos administrativos en segundo plano (cada hilo ocupa una conexión del pool mientras trabaja)
+    TRABAJOS_HILOS = int(os.getenv('TRABAJOS_HILOS', 1))
+    TRABAJOS_LOTE = int(os.getenv('TRABAJOS_LOTE', 500))
+    TRABAJOS_PAUSA_MS = int(os.getenv('TRABAJOS_PAUSA_MS', 100))
+    TRABAJOS_DIAS_RESUMEN = int(os.getenv('TRABAJOS_DIAS_RESUMEN', 7))
+    TRABAJOS_ABANDONO = int(os.getenv('TRABAJOS_ABANDONO', 300))
+    TRABAJOS_LATIDO = int(os.getenv('TRABAJOS_LATIDO', 30))  # debe ser bastante menor que TRABAJOS_ABANDONO
+
+    # Sesiones en el servidor (la cookie solo lleva un id); sqlite por defecto para compartirlas entre workers
+    SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'sqlite' if CACHE_BACKEND == 'memoria' else CACHE_BACKEND)
+    SESSION_URL = os.getenv('SESSION_URL', os.path.join(DATA_DIR, 'sesiones.sqlite3')
+                            if SESSION_BACKEND == 'sqlite' else CACHE_URL)
+    SESSION_TTL = int(os.getenv('SESSION_TTL', 28800))
+    SESSION_MAX = int(os.getenv('SESSION_MAX', 20000))
+    SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', '0') == '1'
+    AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 60))
+
+    # Contraseñas: método y factor de trabajo de werkzeug; los hashes anteriores se actualizan al iniciar sesión
+    PASSWORD_HASH_METODO = os.getenv('PASSWORD_HASH_METODO', 'pbkdf2:sha256:600000')
+    AUTH_HILOS = int(os.getenv('AUTH_HILOS', 4))
+    AUTH_TIMEOUT = float(os.getenv('AUTH_TIMEOUT', 10))
+    LOGIN_MAX_INTENTOS = int(os.getenv('LOGIN_MAX_INTENTOS', 10))
+    # Por IP el límite es mayor: en la red del laboratorio (NAT) muchos usuarios comparten una IP
+    LOGIN_MAX_INTENTOS_IP = int(os.getenv('LOGIN_MAX_INTENTOS_IP', 100))
+    LOGIN_VENTANA = int(os.getenv('LOGIN_VENTANA', 300))
+    # Proxies inversos delante de la app (nginx = 1) cuyo X-Forwarded-For es confiable
+    PROXIES_CONFIABLES = int(os.getenv('PROXIES_CONFIABLES', 0))
+
+    # Instrumentación (/metrics y log de consultas lentas; 0 desactiva)
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 0))
+    SQL_ALERTA_CONSULTAS = int(os.getenv('SQL_ALERTA_CONSULTAS', 0))
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
      
     FLASK_HOST = os.getenv('FLASK_HOST', '0.0.0.0')  
     FLASK_PORT = int(os.getenv('FLASK_PORT', 5000))  
\ No newline at end of file
@@ -1,20 +1,205 @@
+import os
+import threading
+import time
+
 import mysql.connector
+from flask import g, has_app_context
 from config import Config
+from metricas import CursorInstrumentado
+
+class PoolTimeout(Exception):
+    """No se libero ninguna conexion dentro del tiempo de espera"""
+
+class PooledConnection:
+    """Conexion prestada por el pool; close() la devuelve en vez de cerrarla"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.request_bound = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return CursorInstrumentado(self._raw.cursor(*args, **kwargs))
+
+    def close(self):
+        # Las conexiones ligadas a la peticion se liberan en el teardown
+        if self.request_bound:
+            return
+        self._pool.release(self)
+
+    def discard(self):
+        try:
+            self._raw.close()
+        except mysql.connector.Error:
+            pass
+
+class ConnectionPool:
+    """Pool acotado de conexiones MySQL con verificacion y reciclaje"""
+
+    def __init__(self, size, timeout, max_age, ping_interval, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.ping_interval = ping_interval
+        self.connect_args = connect_args
+        self._idle = []
+        self._total = 0
+        self._cond = threading.Condition()
+        self.stats = {'creadas': 0, 'recicladas': 0, 'descartadas': 0,
+                      'checkouts': 0, 'esperas': 0, 'timeouts': 0}
+
+    def _expired(self, conn, now):
+        return self.max_age and now - conn.created_at > self.max_age
+
+    def _healthy(self, conn, now):
+        if now - conn.last_used < self.ping_interval:
+            return True
+        try:
+            conn._raw.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def _reservar(self, deadline, waited):
+        """Bajo el lock: saca una conexión libre o reserva un lugar para crear otra (None)"""
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop(), waited
+                if self._total < self.size:
+                    self._total += 1
+                    return None, waited
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(f'Pool agotado ({self.size} conexiones en uso)')
+                if not waited:
+                    self.stats['esperas'] += 1
+                    waited = True
+                self._cond.wait(remaining)
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            conn, waited = self._reservar(deadline, waited)
+            if conn is None:
+                break
+            # Fuera del lock: el ping es un viaje de red y una conexión lenta no debe frenar a las demás
+            now = time.monotonic()
+            if self._expired(conn, now):
+                motivo = 'recicladas'
+            elif self._healthy(conn, now):
+                with self._cond:
+                    self.stats['checkouts'] += 1
+                return conn
+            else:
+                motivo = 'descartadas'
+            conn.discard()
+            with self._cond:
+                self.stats[motivo] += 1
+                self._total -= 1
+                self._cond.notify()
+
+        # El handshake se hace fuera del lock para no bloquear a los demas
+        try:
+            raw = mysql.connector.connect(**self.connect_args)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        conn = PooledConnection(self, raw)
+        with self._cond:
+            self.stats['creadas'] += 1
+            self.stats['checkouts'] += 1
+        return conn
+
+    def release(self, conn):
+        conn.request_bound = False
+        try:
+            # Termina cualquier transaccion implicita para no heredar snapshots
+            conn._raw.rollback()
+            reusable = conn._raw.is_connected()
+        except mysql.connector.Error:
+            reusable = False
 
-def get_db_connection():
-    """Obtener conexión a la base de datos"""
+        reusable = reusable and not self._expired(conn, time.monotonic())
+        if not reusable:
+            conn.discard()
+        with self._cond:
+            if reusable:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+            else:
+                self._total -= 1
+                self.stats['descartadas'] += 1
+            self._cond.notify()
+
+    def get_stats(self):
+        with self._cond:
+            return dict(self.stats, tamano=self.size, abiertas=self._total,
+                        en_uso=self._total - len(self._idle), libres=len(self._idle))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Obtiene el pool del proceso actual (se recrea tras un fork de gunicorn)"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool(
+                    size=Config.MYSQL_POOL_SIZE,
+                    timeout=Config.MYSQL_POOL_TIMEOUT,
+                    max_age=Config.MYSQL_POOL_MAX_AGE,
+                    ping_interval=Config.MYSQL_POOL_PING_INTERVAL,
+                    host=Config.MYSQL_HOST,
+                    user=Config.MYSQL_USER,
+                    password=Config.MYSQL_PASSWORD,
+                    database=Config.MYSQL_DB,
+                    port=Config.MYSQL_PORT
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+def get_pool_stats():
+    """Estadisticas del pool: conexiones en uso, esperas y timeouts"""
+    return get_pool().get_stats()
+
+def get_db_connection(request_scoped=True):
+    """Obtener conexión a la base de datos (una por petición)"""
+    # request_scoped=False: close() la devuelve al pool (respuestas en streaming)
+    request_scoped = request_scoped and has_app_context()
+    if request_scoped and 'db_conn' in g:
+        return g.db_conn
     try:
-        connection = mysql.connector.connect(
-            host=Config.MYSQL_HOST,
-            user=Config.MYSQL_USER,
-            password=Config.MYSQL_PASSWORD,
-            database=Config.MYSQL_DB,
-            port=Config.MYSQL_PORT
-        )
-        return connection
-    except mysql.connector.Error as err:
+        connection = get_pool().acquire()
+    except (mysql.connector.Error, PoolTimeout) as err:
         print(f"Error de conexión: {err}")
         return None
+    if request_scoped:
+        connection.request_bound = True
+        g.db_conn = connection
+    return connection
+
+def release_db_connection(exception=None):
+    """Devuelve al pool la conexión de la petición actual"""
+    connection = g.pop('db_conn', None)
+    if connection is not None:
+        connection._pool.release(connection)
+
+def init_app(app):
+    """Registra la liberación de conexiones al terminar cada petición"""
+    app.teardown_appcontext(release_db_connection)
 
 def get_db_connection_without_db():
     """Obtener conexión sin especificar base de datos"""
@@ -28,4 +213,4 @@ def get_db_connection_without_db():
         return connection
     except mysql.connector.Error as err:
         print(f"Error de conexión: {err}")
-        return None
\ No newline at end of file
+        return None
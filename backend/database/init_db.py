@@ -4,6 +4,9 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
 from database.db_connection import get_db_connection, get_db_connection_without_db
+from database.resumenes import backfill_resumenes, recalcular_contadores
+from firmas import migrar_firmas
+from auth import hash_password
 
 def init_database():
     """Inicializar la base de datos y tablas"""
@@ -24,6 +27,9 @@ def init_database():
         print(" Creando tablas...")
         create_tables(cursor)
         
+        print(" Aplicando migraciones...")
+        run_migrations(cursor)
+        
         print(" Insertando datos de ejemplo...")
         insert_sample_data(cursor)
         
@@ -156,6 +162,7 @@ def create_tables(cursor):
             prestamo_id INT NOT NULL,
             material_id INT NOT NULL,
             cantidad INT NOT NULL CHECK (cantidad > 0),
+            cantidad_devuelta INT NOT NULL DEFAULT 0,
             FOREIGN KEY (prestamo_id) REFERENCES prestamos(id) ON DELETE CASCADE,
             FOREIGN KEY (material_id) REFERENCES materiales(id) ON DELETE CASCADE
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
@@ -167,9 +174,99 @@ def create_tables(cursor):
             prestamo_id INT NOT NULL,
             nombre VARCHAR(100) NOT NULL,
             no_control VARCHAR(20),
-            firma_data LONGTEXT,  -- Cambiar firma_path por firma_data para almacenar SVG
+            firma_data LONGTEXT,  -- Solo firmas heredadas; las nuevas van en firmas
+            firma_hash CHAR(64),
             FOREIGN KEY (prestamo_id) REFERENCES prestamos(id) ON DELETE CASCADE
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+        # Firmas (direccionadas por SHA-256 del PNG)
+        """
+        CREATE TABLE IF NOT EXISTS firmas (
+            hash CHAR(64) PRIMARY KEY,
+            formato ENUM('png', 'vector') NOT NULL DEFAULT 'png',
+            contenido MEDIUMBLOB NOT NULL,
+            tamano INT NOT NULL,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+        # Devoluciones (la clave hace idempotentes los reintentos)
+        """
+        CREATE TABLE IF NOT EXISTS devoluciones (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            usuario_id INT,
+            clave VARCHAR(64),
+            respuesta TEXT,
+            fecha_hora TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_devoluciones_clave (usuario_id, clave),
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE SET NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+        # Material repuesto en cada devolución
+        """
+        CREATE TABLE IF NOT EXISTS devolucion_detalles (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            devolucion_id INT NOT NULL,
+            detalle_id INT NOT NULL,
+            material_id INT NOT NULL,
+            cantidad INT NOT NULL CHECK (cantidad > 0),
+            KEY idx_devolucion_detalles_devolucion (devolucion_id),
+            FOREIGN KEY (devolucion_id) REFERENCES devoluciones(id) ON DELETE CASCADE,
+            FOREIGN KEY (detalle_id) REFERENCES detalles_prestamo(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+        # Contadores acumulados (total de préstamos para el dashboard)
+        """
+        CREATE TABLE IF NOT EXISTS contadores (
+            nombre VARCHAR(50) PRIMARY KEY,
+            valor BIGINT NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+        # Resumen diario de préstamos activos (rollup para reportes avanzados)
+        """
+        CREATE TABLE IF NOT EXISTS resumen_diario (
+            fecha DATE NOT NULL,
+            carrera_id INT NOT NULL,
+            asignatura_id INT NOT NULL,
+            num_prestamos INT NOT NULL DEFAULT 0,
+            num_integrantes INT NOT NULL DEFAULT 0,
+            num_devueltos INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (fecha, carrera_id, asignatura_id),
+            KEY idx_resumen_carrera_fecha (carrera_id, fecha)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+        # Resumen diario de uso de materiales
+        """
+        CREATE TABLE IF NOT EXISTS resumen_diario_materiales (
+            fecha DATE NOT NULL,
+            carrera_id INT NOT NULL,
+            asignatura_id INT NOT NULL,
+            material_id INT NOT NULL,
+            veces_utilizado INT NOT NULL DEFAULT 0,
+            total_unidades INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (fecha, carrera_id, asignatura_id, material_id),
+            KEY idx_resumen_mat_carrera_fecha (carrera_id, fecha)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+        # Trabajos administrativos en segundo plano (estado y avance)
+        """
+        CREATE TABLE IF NOT EXISTS trabajos (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            tipo VARCHAR(50) NOT NULL,
+            parametros TEXT,
+            estado ENUM('pendiente', 'en_proceso', 'completado', 'error', 'cancelado') NOT NULL DEFAULT 'pendiente',
+            propietario VARCHAR(100),
+            progreso INT NOT NULL DEFAULT 0,
+            total INT,
+            mensaje TEXT,
+            resultado TEXT,
+            usuario_id INT,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_inicio DATETIME,
+            fecha_fin DATETIME,
+            fecha_actualizacion DATETIME,
+            KEY idx_trabajos_estado (estado, fecha_actualizacion),
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE SET NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """
     ]
     
@@ -180,11 +277,118 @@ def create_tables(cursor):
         except Exception as e:
             print(f"   Error creando tabla {i}: {e}")
 
+def column_exists(cursor, table, column):
+    """Verifica si una columna existe en la base de datos actual"""
+    cursor.execute('''
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    ''', (table, column))
+    return cursor.fetchone()[0] > 0
+
+def table_exists(cursor, table):
+    """Verifica si una tabla existe en la base de datos actual"""
+    cursor.execute('''
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+    ''', (table,))
+    return cursor.fetchone()[0] > 0
+
+def index_exists(cursor, table, index):
+    """Verifica si un índice existe en la base de datos actual"""
+    cursor.execute('''
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    ''', (table, index))
+    return cursor.fetchone()[0] > 0
+
+# Tablas con su copia de archivo (mismas columnas, sin llaves foráneas)
+ARCHIVO_TABLAS = ['prestamos', 'detalles_prestamo', 'integrantes', 'devolucion_detalles']
+
+# Índices según los patrones de acceso reales (filtro + rango/orden por fecha_hora)
+INDEXES = [
+    ('prestamos', 'idx_prestamos_fecha', 'fecha_hora'),
+    ('prestamos', 'idx_prestamos_activo_fecha', 'activo, fecha_hora'),
+    ('prestamos', 'idx_prestamos_estado_fecha', 'estado, fecha_hora'),
+    ('prestamos', 'idx_prestamos_carrera_fecha', 'carrera_id, fecha_hora'),
+    ('prestamos', 'idx_prestamos_importancia_fecha', 'importancia_observacion, fecha_hora'),
+    ('integrantes', 'idx_integrantes_no_control', 'no_control'),
+    ('integrantes', 'idx_integrantes_nombre', 'nombre')
+]
+
+# Índices FULLTEXT de la búsqueda (busqueda.py); el primero de cada tabla la reconstruye
+FULLTEXT_INDEXES = [
+    ('docentes', 'ft_docentes', 'nombre'),
+    ('practicas', 'ft_practicas', 'nombre, descripcion'),
+    ('materiales', 'ft_materiales', 'nombre, descripcion, categoria'),
+    ('integrantes', 'ft_integrantes', 'nombre, no_control'),
+    ('prestamos', 'ft_prestamos_observaciones', 'observaciones')
+]
+
+def run_migrations(cursor):
+    """Actualiza esquemas existentes creados por versiones anteriores"""
+    
+    if not column_exists(cursor, 'integrantes', 'firma_hash'):
+        cursor.execute('ALTER TABLE integrantes ADD COLUMN firma_hash CHAR(64) AFTER firma_data')
+        print("   Columna integrantes.firma_hash agregada")
+    
+    if not column_exists(cursor, 'firmas', 'formato'):
+        cursor.execute("ALTER TABLE firmas ADD COLUMN formato ENUM('png', 'vector') NOT NULL DEFAULT 'png' AFTER hash")
+        print("   Columna firmas.formato agregada")
+    
+    if not column_exists(cursor, 'detalles_prestamo', 'cantidad_devuelta'):
+        cursor.execute('ALTER TABLE detalles_prestamo ADD COLUMN cantidad_devuelta INT NOT NULL DEFAULT 0 AFTER cantidad')
+        cursor.execute('''
+            UPDATE detalles_prestamo d
+            JOIN prestamos p ON d.prestamo_id = p.id
+            SET d.cantidad_devuelta = d.cantidad
+            WHERE p.estado = 'devuelto'
+        ''')
+        print("   Columna detalles_prestamo.cantidad_devuelta agregada")
+    
+    if not column_exists(cursor, 'trabajos', 'propietario'):
+        cursor.execute('ALTER TABLE trabajos ADD COLUMN propietario VARCHAR(100) AFTER estado')
+        print("   Columna trabajos.propietario agregada")
+    
+    if not column_exists(cursor, 'trabajos', 'resultado'):
+        cursor.execute('ALTER TABLE trabajos ADD COLUMN resultado TEXT AFTER mensaje')
+        print("   Columna trabajos.resultado agregada")
+    
+    # Después de las columnas y antes de los índices secundarios (FULLTEXT no se copia al archivo)
+    for table in ARCHIVO_TABLAS:
+        if not table_exists(cursor, f'{table}_archivo'):
+            cursor.execute(f'CREATE TABLE {table}_archivo LIKE {table}')
+            print(f"   Tabla {table}_archivo creada")
+    
+    for table, index, columns in INDEXES:
+        if not index_exists(cursor, table, index):
+            cursor.execute(f'CREATE INDEX {index} ON {table}({columns})')
+            print(f"   Índice {index} creado")
+    
+    for table, index, columns in FULLTEXT_INDEXES:
+        if not index_exists(cursor, table, index):
+            cursor.execute(f'CREATE FULLTEXT INDEX {index} ON {table}({columns})')
+            print(f"   Índice de texto {index} creado")
+    
+    cursor.execute('SELECT EXISTS(SELECT 1 FROM resumen_diario), EXISTS(SELECT 1 FROM prestamos)')
+    tiene_resumen, tiene_prestamos = cursor.fetchone()
+    if tiene_prestamos and not tiene_resumen:
+        backfill_resumenes(cursor)
+        print("   Resúmenes diarios generados")
+    
+    cursor.execute("SELECT COUNT(*) FROM contadores WHERE nombre = 'prestamos_total'")
+    if not cursor.fetchone()[0]:
+        recalcular_contadores(cursor)
+        print("   Contador de préstamos inicializado")
+    
+    migradas = migrar_firmas(cursor)
+    if migradas:
+        print(f"   {migradas} firmas movidas a la tabla firmas")
+
 # Inserts para pruebas
 def insert_sample_data(cursor):
     """Insertar datos de ejemplo"""
     
-    # Usuarios
+    # Usuarios (el hash es costoso: solo se calcula para los que aún no existen)
     usuarios_sql = """
     INSERT IGNORE INTO usuarios (nombre, email, tipo, password_hash) VALUES
     (%s, %s, %s, %s)
@@ -194,8 +398,13 @@ def insert_sample_data(cursor):
         ('Administrador', 'admin@itpachuca.edu.mx', 'administrador', 'admin123'),
         ('María García', 'maria.garcia@itpachuca.edu.mx', 'estudiante', 'estudiante123')
     ]
-
-    cursor.executemany(usuarios_sql, usuarios) 
+    
+    cursor.execute('SELECT email FROM usuarios WHERE email IN (%s, %s)', [u[1] for u in usuarios])
+    existentes = {fila[0] for fila in cursor.fetchall()}
+    nuevos = [(nombre, email, tipo, hash_password(password))
+              for nombre, email, tipo, password in usuarios if email not in existentes]
+    if nuevos:
+        cursor.executemany(usuarios_sql, nuevos)
 
     # Carreras 
     carreras_sql = """
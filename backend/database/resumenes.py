@@ -0,0 +1,170 @@
+import argparse
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_connection import get_db_connection
+
+# Rollups de préstamos activos (p.activo = TRUE) por día, carrera y asignatura.
+# Se mantienen en la misma transacción que crea, devuelve o elimina el préstamo.
+
+RESUMEN_PRESTAMOS_SQL = '''
+    INSERT INTO resumen_diario (fecha, carrera_id, asignatura_id, num_prestamos,
+                                num_integrantes, num_devueltos)
+    SELECT t.fecha, t.carrera_id, t.asignatura_id, %s * COUNT(*),
+           %s * COALESCE(SUM(t.num_integrantes), 0), %s * COALESCE(SUM(t.devuelto), 0)
+    FROM (
+        SELECT DATE(p.fecha_hora) as fecha, p.carrera_id, p.asignatura_id,
+               (SELECT COUNT(*) FROM integrantes i WHERE i.prestamo_id = p.id) as num_integrantes,
+               p.estado = 'devuelto' as devuelto
+        FROM prestamos p
+        WHERE p.activo = TRUE AND {where}
+    ) t
+    GROUP BY t.fecha, t.carrera_id, t.asignatura_id
+    ON DUPLICATE KEY UPDATE
+        num_prestamos = num_prestamos + VALUES(num_prestamos),
+        num_integrantes = num_integrantes + VALUES(num_integrantes),
+        num_devueltos = num_devueltos + VALUES(num_devueltos)
+'''
+
+RESUMEN_MATERIALES_SQL = '''
+    INSERT INTO resumen_diario_materiales (fecha, carrera_id, asignatura_id, material_id,
+                                           veces_utilizado, total_unidades)
+    SELECT DATE(p.fecha_hora), p.carrera_id, p.asignatura_id, d.material_id,
+           %s * COUNT(*), %s * SUM(d.cantidad)
+    FROM prestamos p
+    JOIN detalles_prestamo d ON d.prestamo_id = p.id
+    WHERE p.activo = TRUE AND {where}
+    GROUP BY DATE(p.fecha_hora), p.carrera_id, p.asignatura_id, d.material_id
+    ON DUPLICATE KEY UPDATE
+        veces_utilizado = veces_utilizado + VALUES(veces_utilizado),
+        total_unidades = total_unidades + VALUES(total_unidades)
+'''
+
+def _aplicar(cursor, where, params, signo):
+    cursor.execute(RESUMEN_PRESTAMOS_SQL.format(where=where), [signo, signo, signo] + list(params))
+    cursor.execute(RESUMEN_MATERIALES_SQL.format(where=where), [signo, signo] + list(params))
+
+def sumar_prestamos(cursor, prestamo_ids):
+    """Agrega préstamos recién creados a los rollups y al contador total"""
+    if prestamo_ids:
+        placeholders = ', '.join(['%s'] * len(prestamo_ids))
+        _aplicar(cursor, f'p.id IN ({placeholders})', prestamo_ids, 1)
+        cursor.execute("UPDATE contadores SET valor = valor + %s WHERE nombre = 'prestamos_total'",
+                       (len(prestamo_ids),))
+
+def recalcular_contadores(cursor):
+    """Recalcula los contadores del dashboard desde las tablas base (incluye los archivados)"""
+    cursor.execute('''
+        INSERT INTO contadores (nombre, valor)
+        SELECT 'prestamos_total', (SELECT COUNT(*) FROM prestamos) + (SELECT COUNT(*) FROM prestamos_archivo)
+        ON DUPLICATE KEY UPDATE valor = VALUES(valor)
+    ''')
+
+def restar_prestamos(cursor, prestamo_ids):
+    """Descuenta préstamos activos de los rollups antes de eliminarlos lógicamente"""
+    if prestamo_ids:
+        placeholders = ', '.join(['%s'] * len(prestamo_ids))
+        _aplicar(cursor, f'p.id IN ({placeholders})', prestamo_ids, -1)
+
+def registrar_devolucion(cursor, prestamo_ids):
+    """Cuenta los préstamos que acaban de pasar a 'devuelto'"""
+    if not prestamo_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(prestamo_ids))
+    cursor.execute(f'''
+        UPDATE resumen_diario r
+        JOIN (
+            SELECT DATE(fecha_hora) as fecha, carrera_id, asignatura_id, COUNT(*) as n
+            FROM prestamos
+            WHERE id IN ({placeholders}) AND activo = TRUE
+            GROUP BY DATE(fecha_hora), carrera_id, asignatura_id
+        ) p ON r.fecha = p.fecha AND r.carrera_id = p.carrera_id AND r.asignatura_id = p.asignatura_id
+        SET r.num_devueltos = r.num_devueltos + p.n
+    ''', list(prestamo_ids))
+
+def backfill_resumenes(cursor):
+    """Carga inicial de los rollups con todo el historial"""
+    _aplicar(cursor, 'TRUE', [], 1)
+
+def tramos(desde, hasta, dias=None):
+    """Divide un rango en meses naturales o en tramos de `dias` días"""
+    inicio = desde
+    while inicio <= hasta:
+        if dias:
+            fin = min(inicio + timedelta(days=dias - 1), hasta)
+        else:
+            siguiente = (inicio.replace(day=1) + timedelta(days=32)).replace(day=1)
+            fin = min(siguiente - timedelta(days=1), hasta)
+        yield inicio, fin
+        inicio = fin + timedelta(days=1)
+
+def reconstruir_resumenes(conn, desde, hasta, dias=None, al_avanzar=None):
+    """Recalcula los rollups de un rango de fechas, un tramo (por defecto un mes) por transacción"""
+    cursor = conn.cursor()
+    try:
+        for inicio, fin in tramos(desde, hasta, dias):
+            cursor.execute('DELETE FROM resumen_diario WHERE fecha BETWEEN %s AND %s', (inicio, fin))
+            cursor.execute('DELETE FROM resumen_diario_materiales WHERE fecha BETWEEN %s AND %s',
+                           (inicio, fin))
+            _aplicar(cursor, 'p.fecha_hora >= %s AND p.fecha_hora < %s + INTERVAL 1 DAY',
+                     [inicio, fin], 1)
+            conn.commit()
+            if al_avanzar:
+                al_avanzar(inicio, fin)
+            else:
+                print(f"   Resúmenes {inicio} a {fin} reconstruidos")
+        recalcular_contadores(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def rango_historico(cursor):
+    """Primer y último día con préstamos registrados"""
+    cursor.execute('SELECT DATE(MIN(fecha_hora)), DATE(MAX(fecha_hora)) FROM prestamos')
+    return cursor.fetchone()
+
+def build_resumen_filter(base_query, filters):
+    """Equivalente de build_filter_query sobre las tablas de rollup (alias r)"""
+    conditions = []
+    params = []
+
+    if filters.get('fecha_inicio'):
+        conditions.append('r.fecha >= %s')
+        params.append(filters['fecha_inicio'])
+    if filters.get('fecha_fin'):
+        conditions.append('r.fecha <= %s')
+        params.append(filters['fecha_fin'])
+    if filters.get('carrera_id'):
+        conditions.append('r.carrera_id = %s')
+        params.append(filters['carrera_id'])
+
+    if conditions:
+        base_query += ' AND ' + ' AND '.join(conditions)
+
+    return base_query, params
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reconstruye los resúmenes diarios de préstamos')
+    parser.add_argument('--desde', type=date.fromisoformat, help='Fecha inicial (AAAA-MM-DD)')
+    parser.add_argument('--hasta', type=date.fromisoformat, help='Fecha final (AAAA-MM-DD)')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if conn is None:
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+        primero, ultimo = rango_historico(cursor)
+        cursor.close()
+        if primero is None:
+            print(" No hay préstamos registrados")
+        else:
+            reconstruir_resumenes(conn, args.desde or primero, args.hasta or ultimo)
+    finally:
+        conn.close()
@@ -0,0 +1,172 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+EXPORT_COLUMNAS = [
+    ('id', 'ID'),
+    ('fecha_hora', 'Fecha/Hora'),
+    ('estado', 'Estado'),
+    ('carrera_nombre', 'Carrera'),
+    ('asignatura_nombre', 'Asignatura'),
+    ('docente_nombre', 'Docente'),
+    ('practica', 'Práctica'),
+    ('lugar_uso', 'Lugar de uso'),
+    ('solicitante', 'Solicitante'),
+    ('observaciones', 'Observaciones'),
+    ('importancia_observacion', 'Importancia'),
+    ('materiales', 'Materiales'),
+    ('integrantes', 'Integrantes')
+]
+
+# Materiales e integrantes se concatenan en la misma fila para no romper el streaming; SET_VAR
+# amplía group_concat_max_len solo durante la consulta (un SET SESSION pasaría a la siguiente
+# petición que tome la conexión del pool)
+EXPORT_QUERY = '''
+    SELECT /*+ SET_VAR(group_concat_max_len = 65536) */ p.id, p.fecha_hora, p.estado, p.lugar_uso, p.observaciones, p.importancia_observacion,
+           c.nombre as carrera_nombre, a.nombre as asignatura_nombre, d.nombre as docente_nombre,
+           CONCAT('#', pr.numero, ' - ', pr.nombre) as practica, u.nombre as solicitante,
+           (SELECT GROUP_CONCAT(CONCAT(m.nombre, ' x', det.cantidad) ORDER BY det.id SEPARATOR '; ')
+            FROM detalles_prestamo det JOIN materiales m ON det.material_id = m.id
+            WHERE det.prestamo_id = p.id) as materiales,
+           (SELECT GROUP_CONCAT(CONCAT(i.nombre, IF(i.no_control <> '', CONCAT(' (', i.no_control, ')'), ''))
+                                ORDER BY i.id SEPARATOR '; ')
+            FROM integrantes i WHERE i.prestamo_id = p.id) as integrantes
+    FROM prestamos p
+    LEFT JOIN usuarios u ON p.usuario_id = u.id
+    LEFT JOIN carreras c ON p.carrera_id = c.id
+    LEFT JOIN asignaturas a ON p.asignatura_id = a.id
+    LEFT JOIN docentes d ON p.docente_id = d.id
+    LEFT JOIN practicas pr ON p.practica_id = pr.id
+    WHERE 1=1
+'''
+
+FILAS_POR_LOTE = 500
+CARACTERES_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Excel interpreta como fórmula una celda de CSV que empieza con estos caracteres
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+def iterar_filas(cursor, lote=FILAS_POR_LOTE):
+    """Recorre un cursor sin buffer por lotes, en memoria constante"""
+    while True:
+        filas = cursor.fetchmany(lote)
+        if not filas:
+            return
+        yield from filas
+
+def _valores(fila):
+    valores = []
+    for clave, _ in EXPORT_COLUMNAS:
+        valor = fila.get(clave)
+        if isinstance(valor, datetime):
+            valor = valor.strftime('%d/%m/%Y %H:%M')
+        valores.append('' if valor is None else valor)
+    return valores
+
+def _celda_csv(valor):
+    """Texto capturado por usuarios con prefijo ' si Excel lo ejecutaría como fórmula"""
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+def generar_csv(filas, lote=FILAS_POR_LOTE):
+    """Genera el CSV por bloques de texto"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel detecte UTF-8
+    buffer.write('\ufeff')
+    writer.writerow([titulo for _, titulo in EXPORT_COLUMNAS])
+
+    for n, fila in enumerate(filas, 1):
+        writer.writerow([_celda_csv(valor) for valor in _valores(fila)])
+        if n % lote == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+class _StreamBuffer:
+    """Destino no posicionable para zipfile; acumula bytes hasta vaciarse"""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, data):
+        self._partes.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        data = b''.join(self._partes)
+        self._partes = []
+        return data
+
+XLSX_ARCHIVOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Prestamos" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    )
+}
+
+def _fila_xlsx(valores):
+    celdas = []
+    for valor in valores:
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            celdas.append(f'<c><v>{valor}</v></c>')
+        else:
+            texto = escape(CARACTERES_INVALIDOS_XML.sub('', str(valor)))
+            celdas.append(f'<c t="inlineStr"><is><t>{texto}</t></is></c>')
+    return '<row>' + ''.join(celdas) + '</row>'
+
+def generar_xlsx(filas, lote=FILAS_POR_LOTE):
+    """Genera un XLSX mínimo escribiendo el ZIP directamente sobre el stream"""
+    destino = _StreamBuffer()
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as libro:
+        for nombre, contenido in XLSX_ARCHIVOS.items():
+            libro.writestr(nombre, contenido)
+
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            hoja.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                       b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                       b'<sheetData>')
+            hoja.write(_fila_xlsx([titulo for _, titulo in EXPORT_COLUMNAS]).encode('utf-8'))
+            for n, fila in enumerate(filas, 1):
+                hoja.write(_fila_xlsx(_valores(fila)).encode('utf-8'))
+                if n % lote == 0:
+                    yield destino.vaciar()
+            hoja.write(b'</sheetData></worksheet>')
+    yield destino.vaciar()
@@ -0,0 +1,143 @@
+import base64
+import binascii
+import hashlib
+import re
+
+from cache import TTLCache
+
+PNG_PREFIX = 'data:image/png;base64,'
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+VECTOR_PREFIX = 'v1;'
+FIRMA_MAX_BYTES = 512 * 1024
+VECTOR_MAX_TRAZOS = 200
+VECTOR_MAX_PUNTOS = 5000
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+svg_cache = TTLCache(maxsize=512, ttl=24 * 3600)
+
+def decodificar_firma(data_url):
+    """Convierte un data URL PNG en bytes; None si no hay firma"""
+    if not data_url:
+        return None
+    if not data_url.startswith(PNG_PREFIX):
+        raise ValueError('Formato de firma no soportado')
+    try:
+        contenido = base64.b64decode(data_url[len(PNG_PREFIX):], validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError('Firma con codificación inválida')
+    if not contenido.startswith(PNG_MAGIC):
+        raise ValueError('La firma no es una imagen PNG')
+    if len(contenido) > FIRMA_MAX_BYTES:
+        raise ValueError('La firma excede el tamaño permitido')
+    return contenido
+
+def decodificar_vector(data):
+    """Valida una firma vectorial y devuelve (ancho, alto, trazos absolutos)"""
+    partes = data.split(';')
+    try:
+        ancho, alto = (int(v) for v in partes[1].split('x'))
+        trazos = []
+        total = 0
+        for bloque in partes[2:]:
+            valores = [int(v) for v in bloque.split(',')]
+            if len(valores) < 2 or len(valores) % 2:
+                raise ValueError
+            x = y = 0
+            puntos = []
+            for i in range(0, len(valores), 2):
+                x += valores[i]
+                y += valores[i + 1]
+                puntos.append((x, y))
+            total += len(puntos)
+            trazos.append(puntos)
+    except (IndexError, ValueError):
+        raise ValueError('Firma vectorial con formato inválido')
+    if not trazos or not (0 < ancho <= 2000 and 0 < alto <= 2000):
+        raise ValueError('Firma vectorial con formato inválido')
+    if len(trazos) > VECTOR_MAX_TRAZOS or total > VECTOR_MAX_PUNTOS:
+        raise ValueError('La firma excede el tamaño permitido')
+    return ancho, alto, trazos
+
+def guardar_firma(cursor, data_url):
+    """Guarda la firma (PNG o vectorial) deduplicada por SHA-256 y devuelve su hash"""
+    if data_url and data_url.startswith(VECTOR_PREFIX):
+        decodificar_vector(data_url)
+        contenido = data_url.encode('ascii')
+        formato = 'vector'
+    else:
+        contenido = decodificar_firma(data_url)
+        formato = 'png'
+    if contenido is None:
+        return None
+    firma_hash = hashlib.sha256(contenido).hexdigest()
+    cursor.execute('''
+        INSERT IGNORE INTO firmas (hash, formato, contenido, tamano)
+        VALUES (%s, %s, %s, %s)
+    ''', (firma_hash, formato, contenido, len(contenido)))
+    return firma_hash
+
+def obtener_firma(cursor, firma_hash):
+    """Obtiene (formato, contenido) de una firma o None"""
+    if not HASH_RE.match(firma_hash):
+        return None
+    cursor.execute('SELECT formato, contenido FROM firmas WHERE hash = %s', (firma_hash,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if isinstance(row, dict):
+        return row['formato'], row['contenido']
+    return row[0], row[1]
+
+def renderizar_svg(contenido):
+    """Genera el SVG de una firma vectorial"""
+    ancho, alto, trazos = decodificar_vector(contenido.decode('ascii'))
+    paths = []
+    for puntos in trazos:
+        x, y = puntos[0]
+        d = f'M{x} {y}' + ''.join(f'L{px} {py}' for px, py in puntos[1:])
+        if len(puntos) == 1:
+            d += 'l0 0'
+        paths.append(f'<path d="{d}"/>')
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{ancho}" height="{alto}" '
+        f'viewBox="0 0 {ancho} {alto}">'
+        '<rect width="100%" height="100%" fill="#fff"/>'
+        '<g fill="none" stroke="#000" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">'
+        + ''.join(paths) + '</g></svg>'
+    )
+
+def obtener_svg(cursor, firma_hash):
+    """SVG de una firma vectorial, servido desde la cache LRU de renderizado"""
+    svg = svg_cache.get('svg', firma_hash)
+    if svg is None:
+        firma = obtener_firma(cursor, firma_hash)
+        if firma is None or firma[0] != 'vector':
+            return None
+        svg = renderizar_svg(firma[1])
+        svg_cache.set('svg', firma_hash, svg)
+    return svg
+
+def migrar_firmas(cursor, lote=500):
+    """Mueve las firmas base64 heredadas de integrantes a la tabla firmas"""
+    migradas = 0
+    ultimo_id = 0
+    while True:
+        cursor.execute('''
+            SELECT id, firma_data FROM integrantes
+            WHERE id > %s AND firma_hash IS NULL AND firma_data LIKE %s
+            ORDER BY id LIMIT %s
+        ''', (ultimo_id, PNG_PREFIX + '%', lote))
+        filas = cursor.fetchall()
+        if not filas:
+            return migradas
+
+        for integrante_id, firma_data in filas:
+            ultimo_id = integrante_id
+            try:
+                firma_hash = guardar_firma(cursor, firma_data)
+            except ValueError:
+                continue
+            cursor.execute('''
+                UPDATE integrantes SET firma_hash = %s, firma_data = NULL WHERE id = %s
+            ''', (firma_hash, integrante_id))
+            migradas += 1
@@ -0,0 +1,266 @@
+import csv
+import io
+import json
+import unicodedata
+
+FILAS_POR_LOTE = 1000
+MAX_FILAS = 20000
+
+# Columnas de cada tabla en el orden del INSERT; 'referencia' se resuelve por nombre
+IMPORT_TIPOS = {
+    'carrera': {
+        'tabla': 'carreras',
+        'columnas': ['nombre', 'abreviatura'],
+        'requeridos': ['nombre'],
+        'longitudes': {'nombre': 100, 'abreviatura': 10},
+        'unicos': [('nombre',)]
+    },
+    'asignatura': {
+        'tabla': 'asignaturas',
+        'columnas': ['nombre', 'clave', 'carrera_id'],
+        'requeridos': ['nombre', 'carrera_id'],
+        'longitudes': {'nombre': 100, 'clave': 20},
+        'referencia': ('carrera', 'carrera_id', 'carreras'),
+        'unicos': [('nombre',), ('carrera_id',)]
+    },
+    'docente': {
+        'tabla': 'docentes',
+        'columnas': ['nombre', 'email', 'carrera_id'],
+        'requeridos': ['nombre', 'carrera_id'],
+        'longitudes': {'nombre': 100, 'email': 100},
+        'referencia': ('carrera', 'carrera_id', 'carreras'),
+        'unicos': [('email',)]
+    },
+    'practica': {
+        'tabla': 'practicas',
+        'columnas': ['numero', 'nombre', 'descripcion', 'asignatura_id'],
+        'requeridos': ['numero', 'nombre', 'asignatura_id'],
+        'enteros': ['numero'],
+        'longitudes': {'nombre': 200},
+        'referencia': ('asignatura', 'asignatura_id', 'asignaturas'),
+        'unicos': [('numero', 'asignatura_id')]
+    },
+    'material': {
+        'tabla': 'materiales',
+        'columnas': ['nombre', 'descripcion', 'cantidad_disponible', 'categoria'],
+        'requeridos': ['nombre'],
+        'enteros': ['cantidad_disponible'],
+        'predeterminados': {'cantidad_disponible': 0},
+        'longitudes': {'nombre': 100, 'categoria': 50},
+        'unicos': [('nombre',)]
+    }
+}
+
+CATALOGOS_QUERY = '''
+    SELECT id, nombre, abreviatura FROM carreras;
+    SELECT id, nombre, carrera_id FROM asignaturas;
+    SELECT id, nombre FROM materiales;
+    SELECT email FROM docentes WHERE email IS NOT NULL;
+    SELECT numero, asignatura_id FROM practicas
+'''
+
+class ErrorImportacion(ValueError):
+    """El archivo no se pudo leer como CSV o arreglo JSON"""
+
+def _clave(valor):
+    # Igual que la intercalación *_unicode_ci: sin distinguir mayúsculas ni acentos
+    texto = unicodedata.normalize('NFKD', str(valor).strip().casefold())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+def leer_filas(contenido, formato):
+    """Convierte el cuerpo CSV o JSON en una lista de diccionarios"""
+    if isinstance(contenido, bytes):
+        try:
+            contenido = contenido.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ErrorImportacion('El archivo debe estar codificado en UTF-8')
+
+    if formato == 'json':
+        try:
+            filas = json.loads(contenido)
+        except ValueError:
+            raise ErrorImportacion('JSON inválido')
+        if not isinstance(filas, list) or not all(isinstance(f, dict) for f in filas):
+            raise ErrorImportacion('Se esperaba un arreglo JSON de objetos')
+    else:
+        lector = csv.DictReader(io.StringIO(contenido))
+        filas = [{k.strip(): v for k, v in fila.items() if k} for fila in lector]
+
+    if len(filas) > MAX_FILAS:
+        raise ErrorImportacion(f'El archivo excede el máximo de {MAX_FILAS} filas')
+    return filas
+
+def cargar_catalogos(cursor):
+    """Precarga en un solo viaje los nombres e índices únicos necesarios para validar"""
+    carreras, asignaturas, materiales, docentes, practicas = [
+        result.fetchall() for result in cursor.execute(CATALOGOS_QUERY, multi=True) if result.with_rows
+    ]
+
+    referencias = {'carreras': {}, 'asignaturas': {}, 'materiales': {}}
+    for carrera_id, nombre, abreviatura in carreras:
+        referencias['carreras'][str(carrera_id)] = carrera_id
+        if abreviatura:
+            referencias['carreras'].setdefault(_clave(abreviatura), carrera_id)
+        referencias['carreras'][_clave(nombre)] = carrera_id
+    for asignatura_id, nombre, _ in asignaturas:
+        referencias['asignaturas'][str(asignatura_id)] = asignatura_id
+        referencias['asignaturas'][_clave(nombre)] = asignatura_id
+    for material_id, nombre in materiales:
+        referencias['materiales'][str(material_id)] = material_id
+        referencias['materiales'][_clave(nombre)] = material_id
+
+    existentes = {
+        'carrera': {('nombre',): {(_clave(c[1]),) for c in carreras}},
+        'asignatura': {('nombre',): {(_clave(a[1]),) for a in asignaturas},
+                       ('carrera_id',): {(a[2],) for a in asignaturas}},
+        'docente': {('email',): {(_clave(d[0]),) for d in docentes}},
+        'practica': {('numero', 'asignatura_id'): {(p[0], p[1]) for p in practicas}},
+        'material': {('nombre',): {(_clave(m[1]),) for m in materiales}}
+    }
+    return referencias, existentes
+
+def _materiales_practica(valor, referencias, errores):
+    """Acepta 'Multímetro:2; Cable:4' (CSV) o [{'material', 'cantidad_requerida'}] (JSON)"""
+    if isinstance(valor, str):
+        elementos = []
+        for parte in filter(None, (p.strip() for p in valor.split(';'))):
+            nombre, _, cantidad = parte.rpartition(':') if ':' in parte else (parte, '', '1')
+            elementos.append({'material': nombre, 'cantidad_requerida': cantidad})
+    elif isinstance(valor, list):
+        elementos = valor
+    else:
+        errores.append('materiales: formato inválido')
+        return []
+
+    materiales = {}
+    for elemento in elementos:
+        if not isinstance(elemento, dict):
+            errores.append('materiales: formato inválido')
+            continue
+        nombre = elemento.get('material', elemento.get('material_id'))
+        material_id = referencias['materiales'].get(_clave(nombre)) if nombre not in (None, '') else None
+        if material_id is None:
+            errores.append(f'materiales: "{nombre}" no existe')
+            continue
+        try:
+            cantidad = int(elemento.get('cantidad_requerida', 1))
+        except (TypeError, ValueError):
+            cantidad = 0
+        if cantidad <= 0:
+            errores.append(f'materiales: cantidad inválida para "{nombre}"')
+            continue
+        materiales[material_id] = materiales.get(material_id, 0) + cantidad
+    return list(materiales.items())
+
+def validar_filas(tipo, filas, referencias, existentes):
+    """Valida todas las filas; devuelve las válidas y un reporte de errores por fila"""
+    spec = IMPORT_TIPOS[tipo]
+    vistos = {unico: set(valores) for unico, valores in existentes[tipo].items()}
+    validas = []
+    reporte = []
+
+    for numero_fila, fila in enumerate(filas, 1):
+        errores = []
+        valores = {}
+        for columna in spec['columnas']:
+            valor = fila.get(columna)
+            valores[columna] = None if valor is None or str(valor).strip() == '' else str(valor).strip()
+
+        if 'referencia' in spec:
+            campo, columna, catalogo = spec['referencia']
+            nombre = fila.get(campo, fila.get(columna))
+            if nombre not in (None, ''):
+                valores[columna] = referencias[catalogo].get(_clave(nombre))
+                if valores[columna] is None:
+                    errores.append(f'{campo}: "{nombre}" no existe')
+                    valores[columna] = False
+
+        for columna in spec.get('enteros', []):
+            if valores[columna] is not None:
+                try:
+                    valores[columna] = int(valores[columna])
+                except ValueError:
+                    errores.append(f'{columna}: debe ser un número entero')
+                    continue
+                if valores[columna] < 0:
+                    errores.append(f'{columna}: no puede ser negativo')
+        for columna, valor in spec.get('predeterminados', {}).items():
+            if valores[columna] is None:
+                valores[columna] = valor
+        for columna in spec['requeridos']:
+            if valores[columna] is None:
+                errores.append(f'{columna.replace("_id", "")}: es obligatorio')
+        for columna, maximo in spec.get('longitudes', {}).items():
+            if isinstance(valores[columna], str) and len(valores[columna]) > maximo:
+                errores.append(f'{columna}: excede {maximo} caracteres')
+
+        materiales = []
+        if tipo == 'practica' and fila.get('materiales'):
+            materiales = _materiales_practica(fila['materiales'], referencias, errores)
+
+        if not errores:
+            for unico in spec['unicos']:
+                llave = tuple(_clave(valores[c]) if isinstance(valores[c], str) else valores[c]
+                              for c in unico)
+                if None in llave:
+                    continue
+                if llave in vistos[unico]:
+                    errores.append(f'{", ".join(unico)}: ya existe')
+                else:
+                    vistos[unico].add(llave)
+
+        if errores:
+            reporte.append({'fila': numero_fila, 'errores': errores})
+        else:
+            validas.append((tuple(valores[c] for c in spec['columnas']), materiales))
+
+    return validas, reporte
+
+def insertar_lote(cursor, tipo, lote):
+    """Inserta un lote de filas validadas con executemany"""
+    spec = IMPORT_TIPOS[tipo]
+    columnas = spec['columnas']
+    cursor.executemany(
+        f"INSERT INTO {spec['tabla']} ({', '.join(columnas)}) "
+        f"VALUES ({', '.join(['%s'] * len(columnas))})",
+        [valores for valores, _ in lote]
+    )
+
+    con_materiales = [(valores, materiales) for valores, materiales in lote if materiales]
+    if tipo != 'practica' or not con_materiales:
+        return
+
+    # Los ids se resuelven por la llave natural; no se asume que el autoincremento sea consecutivo
+    llaves = [(valores[0], valores[3]) for valores, _ in con_materiales]
+    cursor.execute(f'''
+        SELECT id, numero, asignatura_id FROM practicas
+        WHERE (numero, asignatura_id) IN ({', '.join(['(%s, %s)'] * len(llaves))})
+    ''', [v for llave in llaves for v in llave])
+    ids = {(numero, asignatura_id): practica_id for practica_id, numero, asignatura_id in cursor.fetchall()}
+
+    cursor.executemany('''
+        INSERT INTO practica_materiales (practica_id, material_id, cantidad_requerida)
+        VALUES (%s, %s, %s)
+    ''', [(ids[(valores[0], valores[3])], material_id, cantidad)
+          for valores, materiales in con_materiales
+          for material_id, cantidad in materiales])
+
+def importar(conn, tipo, filas, parcial=False, lote=FILAS_POR_LOTE):
+    """Valida todo el archivo y lo escribe en una sola transacción (los lotes solo acotan cada INSERT)"""
+    cursor = conn.cursor()
+    try:
+        referencias, existentes = cargar_catalogos(cursor)
+        validas, reporte = validar_filas(tipo, filas, referencias, existentes)
+        if reporte and not parcial:
+            return 0, reporte
+
+        # Si falla un lote se revierten también los anteriores: todo o nada
+        for inicio in range(0, len(validas), lote):
+            insertar_lote(cursor, tipo, validas[inicio:inicio + lote])
+        conn.commit()
+        return len(validas), reporte
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,183 @@
+import json
+
+class StockInsuficiente(Exception):
+    """Uno o más materiales no tienen existencias suficientes"""
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        detalle = '; '.join(
+            f"{f['nombre']} (solicitado {f['solicitado']}, disponible {f['disponible']})"
+            for f in faltantes
+        )
+        super().__init__(f'Stock insuficiente: {detalle}')
+
+def agrupar_cantidades(materiales):
+    """Suma las cantidades por material y valida que sean enteros positivos"""
+    cantidades = {}
+    for material in materiales:
+        try:
+            material_id = int(material['material_id'])
+            cantidad = int(material['cantidad'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Material con formato inválido')
+        if cantidad <= 0:
+            raise ValueError('La cantidad de cada material debe ser mayor a cero')
+        cantidades[material_id] = cantidades.get(material_id, 0) + cantidad
+    return cantidades
+
+def _case_cantidades(cantidades):
+    """Fragmento CASE id WHEN ... THEN ... END con sus parámetros"""
+    sql = 'CASE id ' + ' '.join(['WHEN %s THEN %s'] * len(cantidades)) + ' END'
+    params = [v for par in cantidades.items() for v in par]
+    return sql, params
+
+def reservar_materiales(cursor, materiales):
+    """Bloquea, valida y descuenta el stock de un préstamo dentro de la transacción actual"""
+    cantidades = agrupar_cantidades(materiales)
+    if not cantidades:
+        return cantidades
+
+    # Las filas se bloquean siempre en orden de id para evitar interbloqueos
+    ids = sorted(cantidades)
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f'''
+        SELECT id, nombre, cantidad_disponible FROM materiales
+        WHERE id IN ({placeholders})
+        ORDER BY id
+        FOR UPDATE
+    ''', ids)
+    existentes = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    faltantes = []
+    for material_id in ids:
+        nombre, disponible = existentes.get(material_id, (f'Material {material_id}', 0))
+        if cantidades[material_id] > disponible:
+            faltantes.append({'material_id': material_id, 'nombre': nombre,
+                              'solicitado': cantidades[material_id], 'disponible': disponible})
+    if faltantes:
+        raise StockInsuficiente(faltantes)
+
+    # Un solo UPDATE para todos los materiales; la condición protege contra stock negativo
+    case_sql, case_params = _case_cantidades(cantidades)
+    cursor.execute(f'''
+        UPDATE materiales
+        SET cantidad_disponible = cantidad_disponible - {case_sql}
+        WHERE id IN ({placeholders}) AND cantidad_disponible >= {case_sql}
+    ''', case_params + ids + case_params)
+    if cursor.rowcount != len(ids):
+        raise ValueError('El stock cambió durante la reserva, intente de nuevo')
+    return cantidades
+
+def _placeholders(valores):
+    return ', '.join(['%s'] * len(valores))
+
+def iniciar_devolucion(cursor, usuario_id, clave=None):
+    """Registra la operación de devolución; si la clave ya se usó devuelve la respuesta guardada"""
+    if clave is not None and not (0 < len(clave) <= 64):
+        raise ValueError('Clave de idempotencia inválida')
+    # Un reintento concurrente con la misma clave espera aquí hasta que el primero termine
+    cursor.execute('''
+        INSERT IGNORE INTO devoluciones (usuario_id, clave) VALUES (%s, %s)
+    ''', (usuario_id, clave))
+    if cursor.rowcount == 1:
+        return cursor.lastrowid, None
+
+    cursor.execute('''
+        SELECT respuesta FROM devoluciones WHERE usuario_id = %s AND clave = %s LOCK IN SHARE MODE
+    ''', (usuario_id, clave))
+    row = cursor.fetchone()
+    respuesta = row[0] if row else None
+    if respuesta is None:
+        raise ValueError('La devolución con esta clave sigue en proceso')
+    return None, json.loads(respuesta)
+
+def cerrar_devolucion(cursor, devolucion_id, respuesta):
+    """Guarda la respuesta para que los reintentos la repitan sin volver a aplicar cambios"""
+    cursor.execute('UPDATE devoluciones SET respuesta = %s WHERE id = %s',
+                   (json.dumps(respuesta), devolucion_id))
+
+def devolver_materiales(cursor, devolucion_id, prestamo_ids, parciales=None):
+    """Restaura el stock pendiente de los préstamos activos indicados en una sola transacción"""
+    ids = sorted({int(prestamo_id) for prestamo_id in prestamo_ids})
+    resultado = {'devueltos': [], 'parciales': [], 'omitidos': [], 'unidades': 0}
+    if not ids:
+        return resultado
+
+    # Solo los préstamos aún activos pasan a devuelto; un doble clic no repone dos veces
+    cursor.execute(f'''
+        SELECT id FROM prestamos WHERE id IN ({_placeholders(ids)}) AND estado = 'activo'
+        ORDER BY id FOR UPDATE
+    ''', ids)
+    activos = [row[0] for row in cursor.fetchall()]
+    resultado['omitidos'] = [prestamo_id for prestamo_id in ids if prestamo_id not in activos]
+    if not activos:
+        return resultado
+    if parciales is not None and len(activos) != 1:
+        raise ValueError('La devolución parcial solo aplica a un préstamo')
+
+    cursor.execute(f'''
+        SELECT id, prestamo_id, material_id, cantidad - cantidad_devuelta FROM detalles_prestamo
+        WHERE prestamo_id IN ({_placeholders(activos)})
+        ORDER BY id FOR UPDATE
+    ''', activos)
+    detalles = cursor.fetchall()
+
+    solicitadas = None if parciales is None else agrupar_cantidades(parciales)
+    pendientes = dict.fromkeys(activos, 0)
+    lineas = []
+    for detalle_id, prestamo_id, material_id, pendiente in detalles:
+        cantidad = pendiente
+        if solicitadas is not None:
+            cantidad = min(pendiente, solicitadas.get(material_id, 0))
+            if cantidad:
+                solicitadas[material_id] -= cantidad
+        if cantidad > 0:
+            lineas.append((devolucion_id, detalle_id, material_id, cantidad))
+        pendientes[prestamo_id] += pendiente - cantidad
+
+    if solicitadas:
+        excedidos = sorted(material_id for material_id, n in solicitadas.items() if n > 0)
+        if excedidos:
+            raise ValueError('Cantidad a devolver mayor a la pendiente para los materiales: '
+                             + ', '.join(str(material_id) for material_id in excedidos))
+
+    if lineas:
+        cursor.executemany('''
+            INSERT INTO devolucion_detalles (devolucion_id, detalle_id, material_id, cantidad)
+            VALUES (%s, %s, %s, %s)
+        ''', lineas)
+
+        # Mismo orden de bloqueo que reservar_materiales
+        material_ids = sorted({linea[2] for linea in lineas})
+        cursor.execute(f'''
+            SELECT id FROM materiales WHERE id IN ({_placeholders(material_ids)}) ORDER BY id FOR UPDATE
+        ''', material_ids)
+        cursor.fetchall()
+
+        cursor.execute('''
+            UPDATE materiales m
+            JOIN (
+                SELECT material_id, SUM(cantidad) as cantidad
+                FROM devolucion_detalles
+                WHERE devolucion_id = %s
+                GROUP BY material_id
+            ) dv ON m.id = dv.material_id
+            SET m.cantidad_disponible = m.cantidad_disponible + dv.cantidad
+        ''', (devolucion_id,))
+        cursor.execute('''
+            UPDATE detalles_prestamo d
+            JOIN devolucion_detalles dv ON dv.detalle_id = d.id
+            SET d.cantidad_devuelta = d.cantidad_devuelta + dv.cantidad
+            WHERE dv.devolucion_id = %s
+        ''', (devolucion_id,))
+        resultado['unidades'] = sum(linea[3] for linea in lineas)
+
+    completos = [prestamo_id for prestamo_id in activos if pendientes[prestamo_id] == 0]
+    if completos:
+        cursor.execute(f'''
+            UPDATE prestamos SET estado = 'devuelto'
+            WHERE id IN ({_placeholders(completos)}) AND estado = 'activo'
+        ''', completos)
+    resultado['devueltos'] = completos
+    resultado['parciales'] = [prestamo_id for prestamo_id in activos if pendientes[prestamo_id] > 0]
+    return resultado
@@ -0,0 +1,197 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_app_context, has_request_context, request
+from config import Config
+
+logger = logging.getLogger('laboratorio.sql')
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+SQL_CADENAS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+SQL_NUMEROS = re.compile(r'\b\d+(?:\.\d+)?\b')
+SQL_PARAMETROS = re.compile(r'%\(\w+\)s|%s')
+SQL_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*')
+SQL_ESPACIOS = re.compile(r'\s+')
+
+def normalizar_sql(sql):
+    """Reemplaza literales y listas de parámetros para agrupar consultas equivalentes"""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = SQL_CADENAS.sub('?', sql)
+    sql = SQL_PARAMETROS.sub('?', sql)
+    sql = SQL_NUMEROS.sub('?', sql)
+    sql = SQL_LISTAS.sub('(...)', sql)
+    return SQL_ESPACIOS.sub(' ', sql).strip()
+
+def _operacion(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    partes = sql.split(None, 1)
+    return partes[0].upper() if partes else 'OTRA'
+
+def _etiquetas(nombres, valores):
+    pares = ','.join(f'{n}="{str(v).replace(chr(34), "")}"' for n, v in zip(nombres, valores))
+    return '{' + pares + '}' if pares else ''
+
+class Histograma:
+    """Histograma acumulativo al estilo Prometheus, con series por etiquetas"""
+
+    def __init__(self, nombre, ayuda, etiquetas, buckets):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valores, valor):
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        with self._lock:
+            for valores, (conteos, suma, total) in sorted(self._series.items()):
+                for limite, conteo in zip(self.buckets, conteos):
+                    etiquetas = _etiquetas(self.etiquetas + ('le',), valores + (limite,))
+                    lineas.append(f'{self.nombre}_bucket{etiquetas} {conteo}')
+                etiquetas = _etiquetas(self.etiquetas + ('le',), valores + ('+Inf',))
+                lineas.append(f'{self.nombre}_bucket{etiquetas} {total}')
+                etiquetas = _etiquetas(self.etiquetas, valores)
+                lineas.append(f'{self.nombre}_sum{etiquetas} {suma}')
+                lineas.append(f'{self.nombre}_count{etiquetas} {total}')
+        return lineas
+
+class Contador:
+    """Contador monotónico con series por etiquetas"""
+
+    def __init__(self, nombre, ayuda, etiquetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valores, cantidad=1):
+        with self._lock:
+            self._series[valores] = self._series.get(valores, 0) + cantidad
+
+    def exportar(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} counter']
+        with self._lock:
+            for valores, total in sorted(self._series.items()):
+                lineas.append(f'{self.nombre}{_etiquetas(self.etiquetas, valores)} {total}')
+        return lineas
+
+peticiones = Histograma('http_request_duration_seconds', 'Duración de las peticiones HTTP',
+                        ('endpoint', 'method', 'status'), BUCKETS_SEGUNDOS)
+consultas_por_peticion = Histograma('db_queries_per_request', 'Consultas SQL por petición',
+                                    ('endpoint',), BUCKETS_CONSULTAS)
+consultas = Histograma('db_query_duration_seconds', 'Duración de las consultas SQL',
+                       ('operacion',), BUCKETS_SEGUNDOS)
+filas = Contador('db_rows_total', 'Filas afectadas o devueltas por las consultas', ('operacion',))
+consultas_lentas = Contador('db_slow_queries_total', 'Consultas que superaron SLOW_QUERY_MS', ('operacion',))
+
+def _registrar_consulta(sql, duracion, rowcount):
+    operacion = _operacion(sql)
+    consultas.observar((operacion,), duracion)
+    if rowcount and rowcount > 0:
+        filas.incrementar((operacion,), rowcount)
+
+    if Config.SLOW_QUERY_MS and duracion * 1000 >= Config.SLOW_QUERY_MS:
+        consultas_lentas.incrementar((operacion,))
+        ruta = request.path if has_request_context() else '-'
+        logger.warning('Consulta lenta (%.1f ms, %s): %s', duracion * 1000, ruta, normalizar_sql(sql))
+
+    if has_app_context() and 'sql_consultas' in g:
+        g.sql_consultas += 1
+        g.sql_tiempo += duracion
+        if Config.SQL_ALERTA_CONSULTAS:
+            g.sql_repetidas[normalizar_sql(sql)] += 1
+
+class CursorInstrumentado:
+    """Envuelve un cursor de mysql-connector y mide cada execute/executemany"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, operation, params=None, multi=False):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, multi=multi)
+        finally:
+            # Con multi=True solo se mide el envío; los resultados se leen después
+            _registrar_consulta(operation, time.perf_counter() - inicio,
+                                None if multi else self._cursor.rowcount)
+
+    def executemany(self, operation, seq_params):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params)
+        finally:
+            _registrar_consulta(operation, time.perf_counter() - inicio, self._cursor.rowcount)
+
+def _antes_de_peticion():
+    g.inicio_peticion = time.perf_counter()
+    g.sql_consultas = 0
+    g.sql_tiempo = 0.0
+    g.sql_repetidas = Counter()
+
+def _despues_de_peticion(response):
+    if 'inicio_peticion' not in g:
+        return response
+    duracion = time.perf_counter() - g.inicio_peticion
+    endpoint = request.url_rule.rule if request.url_rule else 'sin_ruta'
+
+    peticiones.observar((endpoint, request.method, str(response.status_code)), duracion)
+    consultas_por_peticion.observar((endpoint,), g.sql_consultas)
+    response.headers.add('Server-Timing',
+                         f'db;dur={g.sql_tiempo * 1000:.1f};desc="{g.sql_consultas} consultas", '
+                         f'total;dur={duracion * 1000:.1f}')
+
+    if Config.SQL_ALERTA_CONSULTAS and g.sql_consultas >= Config.SQL_ALERTA_CONSULTAS:
+        repetidas = '; '.join(f'{n}x {sql}' for sql, n in g.sql_repetidas.most_common(3))
+        logger.warning('%s %s ejecutó %d consultas (posible N+1): %s',
+                       request.method, request.path, g.sql_consultas, repetidas)
+    return response
+
+def exportar_prometheus(medidores=None):
+    """Texto de exposición de Prometheus; medidores es un dict nombre -> (ayuda, valor[, tipo]),
+    con tipo gauge por omisión o counter para los acumulados (su nombre termina en _total)"""
+    lineas = []
+    for metrica in (peticiones, consultas_por_peticion, consultas, filas, consultas_lentas):
+        lineas.extend(metrica.exportar())
+    declarados = set()
+    for nombre, medidor in (medidores or {}).items():
+        ayuda, valor = medidor[:2]
+        tipo = medidor[2] if len(medidor) > 2 else 'gauge'
+        # El nombre puede incluir etiquetas: cache_hits_total{cache="catalogo",namespace="carreras"}
+        base = nombre.split('{', 1)[0]
+        if base not in declarados:
+            declarados.add(base)
+            lineas.extend([f'# HELP {base} {ayuda}', f'# TYPE {base} {tipo}'])
+        lineas.append(f'{nombre} {valor}')
+    return '\n'.join(lineas) + '\n'
+
+def init_app(app):
+    """Registra los hooks de medición de peticiones"""
+    app.before_request(_antes_de_peticion)
+    app.after_request(_despues_de_peticion)
@@ -0,0 +1,249 @@
+import struct
+import unicodedata
+import zlib
+from collections import namedtuple
+
+# Escritor PDF mínimo: texto con las fuentes estándar, líneas, trazos e imágenes PNG
+
+ANCHO_CARTA, ALTO_CARTA = 612, 792
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+FUENTES = {False: ('F1', 'Helvetica'), True: ('F2', 'Helvetica-Bold')}
+
+# Anchos de Helvetica (AFM) para los caracteres 32-126, en milésimas del tamaño de fuente
+ANCHOS_HELVETICA = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584
+]
+
+# Imagen lista para incrustar; mascara es otra Imagen (canal alfa) o None
+Imagen = namedtuple('Imagen', 'ancho alto espacio_color datos parametros mascara')
+
+def ancho_texto(texto, tam, negrita=False):
+    """Ancho aproximado en puntos (los acentos cuentan como la letra base)"""
+    total = 0
+    for caracter in texto:
+        codigo = ord(unicodedata.normalize('NFD', caracter)[0])
+        total += ANCHOS_HELVETICA[codigo - 32] if 32 <= codigo <= 126 else 556
+    return total * tam / 1000 * (1.05 if negrita else 1)
+
+def partir_texto(texto, ancho, tam, negrita=False):
+    """Divide el texto en líneas que caben en el ancho dado"""
+    lineas = []
+    for parrafo in str(texto).splitlines() or ['']:
+        actual = ''
+        for palabra in parrafo.split():
+            propuesta = f'{actual} {palabra}' if actual else palabra
+            if actual and ancho_texto(propuesta, tam, negrita) > ancho:
+                lineas.append(actual)
+                actual = palabra
+            else:
+                actual = propuesta
+        lineas.append(actual)
+    return lineas
+
+def recortar_texto(texto, ancho, tam, negrita=False):
+    """Recorta con puntos suspensivos si el texto no cabe en una línea"""
+    texto = ' '.join(str(texto).split())
+    if ancho_texto(texto, tam, negrita) <= ancho:
+        return texto
+    while texto and ancho_texto(texto + '…', tam, negrita) > ancho:
+        texto = texto[:-1]
+    return texto + '…'
+
+def _cadena(texto):
+    datos = str(texto).encode('cp1252', 'replace')
+    return b'(' + datos.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+def _num(valor):
+    return f'{valor:.2f}'.rstrip('0').rstrip('.')
+
+class Pagina:
+    """Contenido de una página; se puede enviar entre procesos y ensamblar después"""
+
+    def __init__(self, ancho=ANCHO_CARTA, alto=ALTO_CARTA):
+        self.ancho = ancho
+        self.alto = alto
+        self.operaciones = []
+        self.imagenes = []
+
+    def texto(self, x, y, texto, tam=10, negrita=False, alinear='izquierda'):
+        if alinear != 'izquierda':
+            ancho = ancho_texto(texto, tam, negrita)
+            x -= ancho / 2 if alinear == 'centro' else ancho
+        fuente = FUENTES[negrita][0]
+        self.operaciones.append(b'BT /%s %s Tf %s %s Td %s Tj ET' % (
+            fuente.encode(), _num(tam).encode(), _num(x).encode(), _num(y).encode(), _cadena(texto)))
+
+    def linea(self, x1, y1, x2, y2, grosor=0.5):
+        self.operaciones.append(
+            f'{_num(grosor)} w {_num(x1)} {_num(y1)} m {_num(x2)} {_num(y2)} l S'.encode())
+
+    def rectangulo(self, x, y, ancho, alto, grosor=0.5, gris=None):
+        if gris is not None:
+            self.operaciones.append(
+                f'q {_num(gris)} g {_num(x)} {_num(y)} {_num(ancho)} {_num(alto)} re f Q'.encode())
+        self.operaciones.append(
+            f'{_num(grosor)} w {_num(x)} {_num(y)} {_num(ancho)} {_num(alto)} re S'.encode())
+
+    def imagen(self, imagen, x, y, ancho, alto):
+        nombre = f'Im{len(self.imagenes)}'
+        self.imagenes.append(imagen)
+        self.operaciones.append(
+            f'q {_num(ancho)} 0 0 {_num(alto)} {_num(x)} {_num(y)} cm /{nombre} Do Q'.encode())
+
+    def trazos(self, trazos, ancho_origen, alto_origen, x, y, ancho, alto, grosor=2):
+        """Dibuja trazos en coordenadas de origen (y hacia abajo) escalados a la caja dada"""
+        escala = min(ancho / ancho_origen, alto / alto_origen)
+        partes = [f'q {_num(escala)} 0 0 {_num(-escala)} {_num(x)} {_num(y + alto)} cm '
+                  f'{_num(grosor)} w 1 J 1 j']
+        for puntos in trazos:
+            px, py = puntos[0]
+            partes.append(f'{px} {py} m')
+            partes.extend(f'{px} {py} l' for px, py in (puntos[1:] or puntos))
+            partes.append('S')
+        partes.append('Q')
+        self.operaciones.append(' '.join(partes).encode())
+
+    def contenido(self):
+        return b'\n'.join(self.operaciones)
+
+def _desfiltrar(datos, ancho, alto, bpp):
+    """Revierte los filtros de línea de PNG (None, Sub, Up, Average, Paeth)"""
+    stride = ancho * bpp
+    salida = bytearray(stride * alto)
+    previa = bytearray(stride)
+    pos = 0
+    for fila in range(alto):
+        filtro = datos[pos]
+        linea = bytearray(datos[pos + 1:pos + 1 + stride])
+        pos += stride + 1
+        if filtro == 1:
+            for i in range(bpp, stride):
+                linea[i] = (linea[i] + linea[i - bpp]) & 0xFF
+        elif filtro == 2:
+            for i in range(stride):
+                linea[i] = (linea[i] + previa[i]) & 0xFF
+        elif filtro == 3:
+            for i in range(stride):
+                izquierda = linea[i - bpp] if i >= bpp else 0
+                linea[i] = (linea[i] + ((izquierda + previa[i]) >> 1)) & 0xFF
+        elif filtro == 4:
+            for i in range(stride):
+                a = linea[i - bpp] if i >= bpp else 0
+                b = previa[i]
+                c = previa[i - bpp] if i >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                predictor = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+                linea[i] = (linea[i] + predictor) & 0xFF
+        salida[fila * stride:(fila + 1) * stride] = linea
+        previa = linea
+    return bytes(salida)
+
+def imagen_png(contenido):
+    """Prepara un PNG de 8 bits para incrustarlo; ValueError si el formato no se soporta"""
+    if not contenido.startswith(PNG_MAGIC):
+        raise ValueError('La firma no es una imagen PNG')
+    pos = 8
+    cabecera = paleta = None
+    idat = []
+    while pos + 8 <= len(contenido):
+        longitud, tipo = struct.unpack('>I4s', contenido[pos:pos + 8])
+        datos = contenido[pos + 8:pos + 8 + longitud]
+        pos += 12 + longitud
+        if tipo == b'IHDR':
+            cabecera = struct.unpack('>IIBBBBB', datos)
+        elif tipo == b'PLTE':
+            paleta = datos
+        elif tipo == b'IDAT':
+            idat.append(datos)
+        elif tipo == b'IEND':
+            break
+    if cabecera is None or not idat:
+        raise ValueError('PNG incompleto')
+
+    ancho, alto, bits, color, _, _, entrelazado = cabecera
+    if bits != 8 or entrelazado or color not in (0, 2, 3, 4, 6):
+        raise ValueError('PNG no soportado')
+    comprimido = b''.join(idat)
+
+    if color in (0, 2, 3):
+        # Sin alfa: los datos comprimidos de PNG se incrustan tal cual con el predictor PNG
+        colores = 3 if color == 2 else 1
+        parametros = f'/DecodeParms << /Predictor 15 /Colors {colores} /BitsPerComponent 8 /Columns {ancho} >>'
+        if color == 3:
+            if not paleta:
+                raise ValueError('PNG sin paleta')
+            espacio = f'[/Indexed /DeviceRGB {len(paleta) // 3 - 1} <{paleta.hex()}>]'
+        else:
+            espacio = '/DeviceRGB' if color == 2 else '/DeviceGray'
+        return Imagen(ancho, alto, espacio, comprimido, parametros, None)
+
+    # Con alfa (el canvas de las firmas): se separa el canal alfa en una máscara suave
+    canales = 4 if color == 6 else 2
+    pixeles = _desfiltrar(zlib.decompress(comprimido), ancho, alto, canales)
+    alfa = pixeles[canales - 1::canales]
+    if canales == 4:
+        rgb = bytearray(ancho * alto * 3)
+        rgb[0::3] = pixeles[0::4]
+        rgb[1::3] = pixeles[1::4]
+        rgb[2::3] = pixeles[2::4]
+        datos, espacio = bytes(rgb), '/DeviceRGB'
+    else:
+        datos, espacio = pixeles[0::2], '/DeviceGray'
+    mascara = Imagen(ancho, alto, '/DeviceGray', zlib.compress(alfa), '', None)
+    return Imagen(ancho, alto, espacio, zlib.compress(datos), '', mascara)
+
+def _stream(diccionario, datos):
+    return b'<< %s /Length %d >>\nstream\n%s\nendstream' % (diccionario, len(datos), datos)
+
+def ensamblar(paginas):
+    """Une las páginas en un documento PDF; las imágenes repetidas se incrustan una vez"""
+    objetos = [None, None]
+    fuentes = {}
+    for negrita, (nombre, base) in FUENTES.items():
+        objetos.append(f'<< /Type /Font /Subtype /Type1 /BaseFont /{base} '
+                       f'/Encoding /WinAnsiEncoding >>'.encode())
+        fuentes[nombre] = len(objetos)
+    recursos_fuentes = ' '.join(f'/{nombre} {ref} 0 R' for nombre, ref in fuentes.items())
+    incrustadas = {}
+
+    def agregar_imagen(imagen):
+        clave = (imagen.datos, imagen.parametros)
+        if clave not in incrustadas:
+            mascara = f' /SMask {agregar_imagen(imagen.mascara)} 0 R' if imagen.mascara else ''
+            diccionario = (f'/Type /XObject /Subtype /Image /Width {imagen.ancho} /Height {imagen.alto} '
+                           f'/ColorSpace {imagen.espacio_color} /BitsPerComponent 8 '
+                           f'/Filter /FlateDecode {imagen.parametros}{mascara}')
+            objetos.append(_stream(diccionario.encode(), imagen.datos))
+            incrustadas[clave] = len(objetos)
+        return incrustadas[clave]
+
+    hojas = []
+    for pagina in paginas:
+        xobjects = ' '.join(f'/Im{n} {agregar_imagen(imagen)} 0 R' for n, imagen in enumerate(pagina.imagenes))
+        objetos.append(_stream(b'/Filter /FlateDecode', zlib.compress(pagina.contenido())))
+        contenido = len(objetos)
+        objetos.append((f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {pagina.ancho} {pagina.alto}] '
+                        f'/Resources << /Font << {recursos_fuentes} >> /XObject << {xobjects} >> >> '
+                        f'/Contents {contenido} 0 R >>').encode())
+        hojas.append(len(objetos))
+
+    objetos[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objetos[1] = (f"<< /Type /Pages /Kids [{' '.join(f'{n} 0 R' for n in hojas)}] "
+                  f"/Count {len(hojas)} >>").encode()
+
+    salida = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    posiciones = []
+    for numero, objeto in enumerate(objetos, 1):
+        posiciones.append(len(salida))
+        salida += b'%d 0 obj\n%s\nendobj\n' % (numero, objeto)
+    inicio_xref = len(salida)
+    salida += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1)
+    salida += b''.join(b'%010d 00000 n \n' % posicion for posicion in posiciones)
+    salida += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objetos) + 1, inicio_xref)
+    return bytes(salida)
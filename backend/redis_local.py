@@ -0,0 +1,134 @@
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+
+# Servidor mínimo compatible con el protocolo Redis para desarrollo y pruebas
+# (implementa solo los comandos que usa cache.RedisCache)
+
+class _Almacen:
+    def __init__(self):
+        self.datos = {}
+        self.lock = threading.Lock()
+
+    def _vigente(self, clave):
+        entrada = self.datos.get(clave)
+        if entrada is not None and entrada[1] is not None and entrada[1] <= time.monotonic():
+            del self.datos[clave]
+            return None
+        return entrada
+
+    def ejecutar(self, args):
+        comando = args[0].upper().decode('utf-8')
+        with self.lock:
+            if comando == 'PING':
+                return 'PONG'
+            if comando == 'SELECT':
+                return 'OK'
+            if comando == 'GET':
+                entrada = self._vigente(args[1])
+                return None if entrada is None else entrada[0]
+            if comando == 'MGET':
+                return [None if e is None else e[0] for e in map(self._vigente, args[1:])]
+            if comando == 'SET':
+                expira = None
+                opciones = [a.upper() for a in args[3:]]
+                if b'PX' in opciones:
+                    expira = time.monotonic() + int(args[3 + opciones.index(b'PX') + 1]) / 1000
+                elif b'EX' in opciones:
+                    expira = time.monotonic() + int(args[3 + opciones.index(b'EX') + 1])
+                self.datos[args[1]] = (args[2], expira)
+                return 'OK'
+            if comando in ('INCR', 'INCRBY'):
+                entrada = self._vigente(args[1])
+                delta = int(args[2]) if comando == 'INCRBY' else 1
+                valor = int(entrada[0]) + delta if entrada else delta
+                self.datos[args[1]] = (str(valor).encode('ascii'), entrada[1] if entrada else None)
+                return valor
+            if comando == 'PEXPIRE':
+                entrada = self._vigente(args[1])
+                if entrada is None:
+                    return 0
+                self.datos[args[1]] = (entrada[0], time.monotonic() + int(args[2]) / 1000)
+                return 1
+            if comando == 'PTTL':
+                entrada = self._vigente(args[1])
+                if entrada is None:
+                    return -2
+                return -1 if entrada[1] is None else int((entrada[1] - time.monotonic()) * 1000)
+            if comando == 'DEL':
+                return sum(self.datos.pop(clave, None) is not None for clave in args[1:])
+            if comando == 'KEYS':
+                patron = args[1].decode('utf-8')
+                return [c for c in list(self.datos) if self._vigente(c)
+                        and fnmatch.fnmatchcase(c.decode('utf-8', 'replace'), patron)]
+            if comando in ('FLUSHDB', 'FLUSHALL'):
+                self.datos.clear()
+                return 'OK'
+            if comando == 'DBSIZE':
+                return len(self.datos)
+        raise ValueError(f"ERR unknown command '{comando}'")
+
+def _codificar(valor):
+    if valor is None:
+        return b'$-1\r\n'
+    if isinstance(valor, str):
+        return b'+%s\r\n' % valor.encode('utf-8')
+    if isinstance(valor, int):
+        return b':%d\r\n' % valor
+    if isinstance(valor, list):
+        return b'*%d\r\n' % len(valor) + b''.join(_codificar(v) for v in valor)
+    return b'$%d\r\n%s\r\n' % (len(valor), valor)
+
+class _Manejador(socketserver.StreamRequestHandler):
+    def _leer_comando(self):
+        linea = self.rfile.readline()
+        if not linea:
+            return None
+        if not linea.startswith(b'*'):
+            return linea.split()
+        args = []
+        for _ in range(int(linea[1:-2])):
+            largo = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(largo + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self._leer_comando()
+            if args is None:
+                return
+            if not args:
+                continue
+            try:
+                respuesta = _codificar(self.server.almacen.ejecutar(args))
+            except (ValueError, IndexError) as e:
+                respuesta = b'-%s\r\n' % str(e).encode('utf-8')
+            self.wfile.write(respuesta)
+
+class ServidorRedisLocal(socketserver.ThreadingTCPServer):
+    """Servidor en memoria; ServidorRedisLocal(('127.0.0.1', 0)) elige un puerto libre"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 511  # tcp-backlog de Redis; con el valor por defecto (5) se rechazan conexiones simultáneas
+
+    def __init__(self, direccion=('127.0.0.1', 6379)):
+        super().__init__(direccion, _Manejador)
+        self.almacen = _Almacen()
+
+    def iniciar_en_segundo_plano(self):
+        hilo = threading.Thread(target=self.serve_forever, daemon=True)
+        hilo.start()
+        return self.server_address
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor local compatible con Redis (solo desarrollo)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=6379)
+    args = parser.parse_args()
+
+    with ServidorRedisLocal((args.host, args.puerto)) as servidor:
+        print(f" Servidor Redis local en {args.host}:{args.puerto}")
+        servidor.serve_forever()
@@ -0,0 +1,334 @@
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from config import Config
+from firmas import PNG_PREFIX, decodificar_firma, decodificar_vector
+from pdf import ALTO_CARTA, ANCHO_CARTA, Pagina, ensamblar, imagen_png, partir_texto, recortar_texto
+
+# Tickets en PDF renderizados en un pool de procesos y guardados en disco por hash de contenido
+
+VERSION_PLANTILLA = 1  # cambiarla invalida los PDF ya generados
+MARGEN = 50
+ANCHO_UTIL = ANCHO_CARTA - 2 * MARGEN
+FIRMAS_POR_CONSULTA = 500
+PODA_GRACIA = 300  # segundos: no se eliminan archivos recién usados o escritos
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_escrituras = 0
+
+def _procesos():
+    """PDF_PROCESOS o los núcleos repartidos entre los workers del host"""
+    return Config.PDF_PROCESOS or max(1, (os.cpu_count() or 1) // max(1, Config.WEB_CONCURRENCY))
+
+def _get_pool():
+    """Pool de procesos por worker; spawn evita heredar locks de los hilos de Flask"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(max_workers=_procesos(),
+                                            mp_context=multiprocessing.get_context('spawn'))
+                _pool_pid = os.getpid()
+    return _pool
+
+# DATOS
+
+def cargar_firmas(cursor, prestamos):
+    """Reemplaza las referencias de firma de los integrantes por su contenido (formato, bytes)"""
+    hashes = list({integrante['firma_hash'] for prestamo in prestamos
+                   for integrante in prestamo['integrantes'] if integrante.get('firma_hash')})
+    contenidos = {}
+    for i in range(0, len(hashes), FIRMAS_POR_CONSULTA):
+        lote = hashes[i:i + FIRMAS_POR_CONSULTA]
+        cursor.execute(f"SELECT hash, formato, contenido FROM firmas WHERE hash IN ({', '.join(['%s'] * len(lote))})",
+                       lote)
+        for fila in cursor.fetchall():
+            contenidos[fila['hash']] = (fila['formato'], bytes(fila['contenido']))
+
+    for prestamo in prestamos:
+        for integrante in prestamo['integrantes']:
+            firma = contenidos.get(integrante.pop('firma_hash', None))
+            data_url = integrante.pop('firma_data', None)
+            integrante.pop('firma_formato', None)
+            if firma is None and data_url and data_url.startswith(PNG_PREFIX):
+                # Firmas heredadas sin migrar
+                try:
+                    firma = ('png', decodificar_firma(data_url))
+                except ValueError:
+                    firma = None
+            integrante['firma'] = firma
+    return prestamos
+
+def huella(prestamo):
+    """SHA-256 de todo lo que aparece en el ticket; las firmas cuentan por su propio hash"""
+    datos = dict(prestamo)
+    datos['integrantes'] = [
+        {**integrante, 'firma': integrante['firma'] and hashlib.sha256(integrante['firma'][1]).hexdigest()}
+        for integrante in prestamo['integrantes']
+    ]
+    raw = json.dumps([VERSION_PLANTILLA, datos], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+# RENDERIZADO (se ejecuta en los procesos del pool)
+
+class _Lienzo:
+    """Páginas de un ticket con la posición vertical actual"""
+
+    def __init__(self, prestamo_id):
+        self.prestamo_id = prestamo_id
+        self.paginas = []
+        self.nueva_pagina()
+
+    def nueva_pagina(self):
+        self.pagina = Pagina()
+        self.paginas.append(self.pagina)
+        self.y = ALTO_CARTA - MARGEN
+        if len(self.paginas) > 1:
+            self.pagina.texto(MARGEN, self.y, f'Ticket de Préstamo #{self.prestamo_id} (continuación)', 9)
+            self.y -= 20
+
+    def reservar(self, alto):
+        if self.y - alto < MARGEN:
+            self.nueva_pagina()
+
+    def titulo(self, texto):
+        self.reservar(40)
+        self.y -= 8
+        self.pagina.texto(MARGEN, self.y, texto, 11, negrita=True)
+        self.y -= 16
+
+def _pares(lienzo, x, ancho, pares, y):
+    for etiqueta, valor in pares:
+        lienzo.pagina.texto(x, y, etiqueta, 9, negrita=True)
+        lienzo.pagina.texto(x + 75, y, recortar_texto(valor, ancho - 80, 9), 9)
+        y -= 14
+    return y
+
+def _firma(pagina, firma, x, y, ancho, alto):
+    """Dibuja la firma en la caja; False si no se pudo interpretar"""
+    formato, contenido = firma
+    try:
+        if formato == 'vector':
+            ancho_origen, alto_origen, trazos = decodificar_vector(contenido.decode('ascii'))
+            pagina.trazos(trazos, ancho_origen, alto_origen, x, y, ancho, alto)
+        else:
+            imagen = imagen_png(contenido)
+            escala = min(ancho / imagen.ancho, alto / imagen.alto)
+            pagina.imagen(imagen, x, y, imagen.ancho * escala, imagen.alto * escala)
+    except (ValueError, UnicodeDecodeError):
+        return False
+    return True
+
+def renderizar_paginas(prestamo):
+    """Páginas del ticket de un préstamo con los datos de cargar_firmas"""
+    lienzo = _Lienzo(prestamo['id'])
+    pagina = lienzo.pagina
+    centro = ANCHO_CARTA / 2
+
+    pagina.rectangulo(MARGEN, lienzo.y - 62, ANCHO_UTIL, 70, gris=0.92)
+    pagina.texto(centro, lienzo.y - 10, 'INSTITUTO TECNOLÓGICO DE PACHUCA', 13, negrita=True, alinear='centro')
+    pagina.texto(centro, lienzo.y - 25, 'DEPARTAMENTO DE INGENIERÍA ELÉCTRICA Y ELECTRÓNICA', 9, alinear='centro')
+    pagina.texto(centro, lienzo.y - 38, 'LABORATORIO DE ELÉCTRICA', 9, alinear='centro')
+    pagina.texto(centro, lienzo.y - 52, 'COMPROBANTE DE PRÉSTAMO DE MATERIAL', 8, alinear='centro')
+    lienzo.y -= 90
+    pagina.texto(MARGEN, lienzo.y, f"Ticket de Préstamo #{prestamo['id']}", 14, negrita=True)
+    lienzo.y -= 24
+
+    fecha = prestamo['fecha_hora'].strftime('%d/%m/%Y %H:%M')
+    mitad = ANCHO_UTIL / 2
+    fin_izquierda = _pares(lienzo, MARGEN, mitad, [
+        ('Fecha/Hora:', fecha),
+        ('Estado:', str(prestamo['estado']).title()),
+        ('Solicitante:', prestamo['solicitante'])
+    ], lienzo.y)
+    fin_derecha = _pares(lienzo, MARGEN + mitad, mitad, [
+        ('Carrera:', prestamo['carrera_nombre']),
+        ('Asignatura:', prestamo['asignatura_nombre']),
+        ('Docente:', prestamo['docente_nombre']),
+        ('Práctica:', f"#{prestamo['practica_numero']} - {prestamo['practica_nombre']}")
+    ], lienzo.y)
+    lienzo.y = min(fin_izquierda, fin_derecha) - 4
+
+    # Materiales
+    lienzo.titulo('Materiales Solicitados')
+    columna_cantidad = MARGEN + ANCHO_UTIL - 80
+    filas = prestamo['materiales'] or [{'nombre': 'No hay materiales registrados', 'cantidad': ''}]
+    for n, material in enumerate([{'nombre': 'Material', 'cantidad': 'Cantidad'}] + filas):
+        lienzo.reservar(16)
+        pagina = lienzo.pagina
+        pagina.rectangulo(MARGEN, lienzo.y - 4, ANCHO_UTIL, 16, gris=0.92 if n == 0 else None)
+        pagina.texto(MARGEN + 4, lienzo.y, recortar_texto(material['nombre'], columna_cantidad - MARGEN - 8, 9),
+                     9, negrita=n == 0)
+        pagina.texto(columna_cantidad + 4, lienzo.y, str(material['cantidad']), 9, negrita=n == 0)
+        lienzo.y -= 16
+
+    # Integrantes con su firma
+    lienzo.titulo('Integrantes del Equipo')
+    columnas = [MARGEN, MARGEN + 25, MARGEN + 230, MARGEN + 330]
+    ancho_firma = MARGEN + ANCHO_UTIL - columnas[3]
+    lienzo.reservar(16)
+    lienzo.pagina.rectangulo(MARGEN, lienzo.y - 4, ANCHO_UTIL, 16, gris=0.92)
+    for x, titulo in zip(columnas, ('#', 'Nombre', 'No. de control', 'Firma digital')):
+        lienzo.pagina.texto(x + 4, lienzo.y, titulo, 9, negrita=True)
+    lienzo.y -= 16
+    if not prestamo['integrantes']:
+        lienzo.pagina.texto(MARGEN + 4, lienzo.y, 'No hay integrantes registrados para este préstamo.', 9)
+        lienzo.y -= 16
+    for n, integrante in enumerate(prestamo['integrantes'], 1):
+        alto = 50
+        lienzo.reservar(alto)
+        pagina = lienzo.pagina
+        base = lienzo.y + 12 - alto
+        pagina.rectangulo(MARGEN, base, ANCHO_UTIL, alto)
+        pagina.texto(columnas[0] + 4, lienzo.y - 8, str(n), 9)
+        pagina.texto(columnas[1] + 4, lienzo.y - 8,
+                     recortar_texto(integrante['nombre'], columnas[2] - columnas[1] - 8, 9), 9)
+        pagina.texto(columnas[2] + 4, lienzo.y - 8, integrante['no_control'] or 'N/A', 9)
+        if not (integrante['firma'] and _firma(pagina, integrante['firma'], columnas[3] + 6, base + 4,
+                                               ancho_firma - 12, alto - 8)):
+            pagina.texto(columnas[3] + 4, lienzo.y - 8, 'Sin firma', 9)
+        lienzo.y -= alto
+
+    # Observaciones y lugar de uso
+    lienzo.titulo('Observaciones')
+    importancia = str(prestamo['importancia_observacion'] or 'normal').title()
+    lineas = [f'Importancia: {importancia}'] + partir_texto(prestamo['observaciones'] or 'No hay observaciones',
+                                                           ANCHO_UTIL, 9)
+    for linea in lineas:
+        lienzo.reservar(13)
+        lienzo.pagina.texto(MARGEN, lienzo.y, linea, 9)
+        lienzo.y -= 13
+    if prestamo['lugar_uso']:
+        lienzo.titulo('Lugar de Uso')
+        for linea in partir_texto(prestamo['lugar_uso'], ANCHO_UTIL, 9):
+            lienzo.reservar(13)
+            lienzo.pagina.texto(MARGEN, lienzo.y, linea, 9)
+            lienzo.y -= 13
+
+    # Firmas de entrega y recepción
+    lienzo.reservar(70)
+    lienzo.y -= 50
+    for centro_firma, etiqueta in ((MARGEN + ANCHO_UTIL / 4, 'Recibí'), (MARGEN + ANCHO_UTIL * 3 / 4, 'Entregó')):
+        lienzo.pagina.linea(centro_firma - 90, lienzo.y, centro_firma + 90, lienzo.y)
+        lienzo.pagina.texto(centro_firma, lienzo.y - 12, etiqueta, 9, alinear='centro')
+    return lienzo.paginas
+
+def _renderizar_lote(prestamos):
+    return [renderizar_paginas(prestamo) for prestamo in prestamos]
+
+def renderizar_en_pool(prestamos):
+    """Páginas de cada préstamo, repartidos en bloques entre los procesos del pool"""
+    if not prestamos:
+        return []
+    procesos = _procesos()
+    tamano = max(1, math.ceil(len(prestamos) / (procesos * 4)))
+    pool = _get_pool()
+    futuros = [pool.submit(_renderizar_lote, prestamos[i:i + tamano])
+               for i in range(0, len(prestamos), tamano)]
+    return [paginas for futuro in futuros for paginas in futuro.result(timeout=Config.PDF_TIMEOUT)]
+
+# CACHE EN DISCO
+
+def _ruta(clave, extension):
+    return os.path.join(Config.PDF_CACHE_DIR, clave[:2], f'{clave}.{extension}')
+
+def _tocar(ruta):
+    """Marca de uso para el desalojo; False si el archivo no existe"""
+    try:
+        os.utime(ruta)
+    except FileNotFoundError:
+        return False
+    return True
+
+def _abrir(ruta):
+    """Archivo abierto para enviarlo; abierto sigue legible aunque otro worker lo elimine al podar"""
+    try:
+        archivo = open(ruta, 'rb')
+    except FileNotFoundError:
+        return None
+    _tocar(ruta)
+    return archivo
+
+def _guardar(clave, extension, datos):
+    """Escritura atómica (archivo temporal + rename) para workers concurrentes"""
+    global _escrituras
+    ruta = _ruta(clave, extension)
+    os.makedirs(os.path.dirname(ruta), mode=0o700, exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporal, 'wb') as archivo:
+        archivo.write(datos)
+    os.replace(temporal, ruta)
+    _escrituras += 1
+    if _escrituras % 50 == 0:
+        _podar()
+    return ruta
+
+def _podar():
+    """Elimina los archivos usados hace más tiempo si se excede PDF_CACHE_MAX_MB"""
+    corte = time.time() - PODA_GRACIA
+    archivos = []
+    for raiz, _, nombres in os.walk(Config.PDF_CACHE_DIR):
+        for nombre in nombres:
+            ruta = os.path.join(raiz, nombre)
+            try:
+                estado = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            archivos.append((estado.st_mtime, estado.st_size, ruta))
+    total = sum(tamano for _, tamano, _ in archivos)
+    limite = Config.PDF_CACHE_MAX_MB * 1024 * 1024
+    for usado, tamano, ruta in sorted(archivos):
+        if total <= limite or usado > corte:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tamano
+
+# API
+
+def pdf_ticket(prestamo):
+    """Archivo abierto y hash del PDF de un ticket; solo se renderiza si su contenido cambió"""
+    clave = huella(prestamo)
+    archivo = _abrir(_ruta(clave, 'pdf'))
+    if archivo is None:
+        paginas = renderizar_en_pool([prestamo])[0]
+        archivo = open(_guardar(clave, 'pdf', ensamblar(paginas)), 'rb')
+    return archivo, clave
+
+def abrir_archivo(clave, extension):
+    """Archivo ya generado (p. ej. por un trabajo en segundo plano); None si se podó"""
+    return _abrir(_ruta(clave, extension))
+
+def pdf_lote(prestamos, formato='pdf'):
+    """Archivo abierto y hash de un PDF con todos los tickets o de un ZIP con un PDF por ticket"""
+    huellas = [huella(prestamo) for prestamo in prestamos]
+    clave = hashlib.sha256(f"{formato}|{','.join(huellas)}".encode('utf-8')).hexdigest()
+    archivo = _abrir(_ruta(clave, formato))
+    if archivo is not None:
+        return archivo, clave
+
+    if formato == 'zip':
+        # Los tickets ya generados se reutilizan (tocarlos los protege de la poda); solo se renderizan los que faltan
+        faltantes = [(prestamo, h) for prestamo, h in zip(prestamos, huellas) if not _tocar(_ruta(h, 'pdf'))]
+        for (prestamo, h), paginas in zip(faltantes, renderizar_en_pool([p for p, _ in faltantes])):
+            _guardar(h, 'pdf', ensamblar(paginas))
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archivo:
+            for prestamo, h in zip(prestamos, huellas):
+                archivo.write(_ruta(h, 'pdf'), f"ticket_{prestamo['id']}.pdf")
+        datos = buffer.getvalue()
+    else:
+        datos = ensamblar([pagina for paginas in renderizar_en_pool(prestamos) for pagina in paginas])
+    return open(_guardar(clave, formato, datos), 'rb'), clave
@@ -0,0 +1,438 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from config import Config
+from database.db_connection import get_db_connection
+from database.resumenes import rango_historico, reconstruir_resumenes, restar_prestamos, tramos
+
+# Operaciones administrativas largas en un pool de hilos del proceso. El estado y el avance viven
+# en la tabla trabajos (visibles desde cualquier worker); cada lote es una transacción corta
+# seguida de una pausa para no acaparar los bloqueos mientras el laboratorio registra préstamos.
+# Quien reclama un trabajo queda como propietario y renueva fecha_actualizacion con un latido;
+# solo los trabajos sin latido durante TRABAJOS_ABANDONO segundos se retoman en otro worker.
+
+ESTADOS_ACTIVOS = ('pendiente', 'en_proceso')
+
+# Columnas copiadas a las tablas *_archivo (una columna nueva se agrega a la tabla, a su archivo y aquí)
+ARCHIVO_COLUMNAS = {
+    'prestamos': ['id', 'fecha_hora', 'carrera_id', 'asignatura_id', 'docente_id', 'practica_id', 'lugar_uso',
+                  'observaciones', 'importancia_observacion', 'estado', 'usuario_id', 'fecha_creacion', 'activo'],
+    'detalles_prestamo': ['id', 'prestamo_id', 'material_id', 'cantidad', 'cantidad_devuelta'],
+    'integrantes': ['id', 'prestamo_id', 'nombre', 'no_control', 'firma_data', 'firma_hash'],
+    'devolucion_detalles': ['id', 'devolucion_id', 'detalle_id', 'material_id', 'cantidad']
+}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_en_cola = set()  # ids enviados al pool de este proceso que aún no empiezan
+_cola_lock = threading.Lock()
+_al_modificar = None
+
+class ParametrosInvalidos(ValueError):
+    """Tipo de trabajo desconocido o parámetros faltantes o mal formados"""
+
+class TrabajoCancelado(Exception):
+    """El trabajo se canceló; se detiene al terminar el lote en curso"""
+
+def _get_executor():
+    """Pool de hilos de trabajos (se recrea tras un fork de gunicorn) con su hilo vigía"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _en_cola.clear()
+                _executor = ThreadPoolExecutor(max_workers=Config.TRABAJOS_HILOS, thread_name_prefix='trabajos')
+                _executor_pid = os.getpid()
+                threading.Thread(target=_vigilar, args=(_executor,), name='trabajos-vigia', daemon=True).start()
+    return _executor
+
+def _vigilar(executor):
+    """Cada TRABAJOS_LATIDO segundos retoma los pendientes y los de latido vencido, mientras el pool siga vigente"""
+    while _executor is executor:
+        reanudar()
+        time.sleep(Config.TRABAJOS_LATIDO)
+
+def _enviar(trabajo_id):
+    """Envía el trabajo al pool salvo que ya espere en la cola de este proceso"""
+    with _cola_lock:
+        if trabajo_id in _en_cola:
+            return
+        _en_cola.add(trabajo_id)
+    _get_executor().submit(_ejecutar, trabajo_id)
+
+def init_app(app):
+    """Arranca el pool y su vigía en cada worker con su primera petición, aunque no toque los trabajos"""
+    @app.before_request
+    def _iniciar_trabajos():
+        _get_executor()
+
+def registrar_invalidacion(funcion):
+    """Función llamada con el tipo de trabajo después de cada lote confirmado (invalidar caches)"""
+    global _al_modificar
+    _al_modificar = funcion
+
+class Trabajo:
+    """Trabajo en ejecución: parámetros, conexión propia, propietario y registro de avance"""
+
+    def __init__(self, trabajo_id, tipo, parametros, conn, propietario):
+        self.id = trabajo_id
+        self.tipo = tipo
+        self.parametros = parametros
+        self.conn = conn
+        self.propietario = propietario
+        self.resultado = None  # Datos para el cliente (p. ej. el archivo a descargar), guardados al completar
+
+    def verificar(self, cursor):
+        """Bloquea la fila del trabajo en la transacción en curso; se detiene si se canceló o lo reclamó otro worker"""
+        cursor.execute('SELECT estado, propietario FROM trabajos WHERE id = %s FOR UPDATE', (self.id,))
+        fila = cursor.fetchone()
+        if fila is None or fila[0] != 'en_proceso' or fila[1] != self.propietario:
+            raise TrabajoCancelado()
+
+    def avance(self, procesados, total=None):
+        """Guarda el avance y detecta la cancelación"""
+        cursor = self.conn.cursor()
+        try:
+            self.verificar(cursor)
+            cursor.execute('''
+                UPDATE trabajos
+                SET progreso = %s, total = COALESCE(%s, total), fecha_actualizacion = NOW()
+                WHERE id = %s AND propietario = %s
+            ''', (procesados, total, self.id, self.propietario))
+            self.conn.commit()
+        except TrabajoCancelado:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def lote_terminado(self, procesados):
+        if _al_modificar:
+            _al_modificar(self.tipo)
+        self.avance(procesados)
+        time.sleep(Config.TRABAJOS_PAUSA_MS / 1000)
+
+class Latido:
+    """Hilo que renueva fecha_actualizacion cada TRABAJOS_LATIDO segundos mientras el trabajo corre"""
+
+    def __init__(self, trabajo_id, propietario):
+        self.trabajo_id = trabajo_id
+        self.propietario = propietario
+        self._fin = threading.Event()
+        self._hilo = threading.Thread(target=self._latir, name=f'latido-{trabajo_id}', daemon=True)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._fin.set()
+        self._hilo.join()
+
+    def _latir(self):
+        while not self._fin.wait(Config.TRABAJOS_LATIDO):
+            conn = get_db_connection(request_scoped=False)
+            if conn is None:
+                continue
+            cursor = conn.cursor()
+            try:
+                cursor.execute('''
+                    UPDATE trabajos SET fecha_actualizacion = NOW()
+                    WHERE id = %s AND propietario = %s AND estado = 'en_proceso'
+                ''', (self.trabajo_id, self.propietario))
+                conn.commit()
+            except Exception as e:
+                print(f"Error en el latido del trabajo {self.trabajo_id}: {e}")
+            finally:
+                cursor.close()
+                conn.close()
+
+# TAREAS
+
+def _por_lotes(trabajo, condicion, params, aplicar):
+    """Aplica `aplicar` a los préstamos que cumplen la condición, TRABAJOS_LOTE filas bloqueadas por transacción"""
+    conn = trabajo.conn
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'SELECT COUNT(*) FROM prestamos p WHERE {condicion}', params)
+        total = cursor.fetchone()[0]
+        conn.commit()
+        trabajo.avance(0, total)
+
+        procesados = 0
+        while True:
+            cursor.execute(f'''
+                SELECT p.id FROM prestamos p
+                WHERE {condicion}
+                ORDER BY p.fecha_hora, p.id
+                LIMIT %s
+                FOR UPDATE
+            ''', params + [Config.TRABAJOS_LOTE])
+            ids = [fila[0] for fila in cursor.fetchall()]
+            if not ids:
+                conn.commit()
+                return procesados
+            # Si otro worker retomó el trabajo, este lote no se confirma
+            trabajo.verificar(cursor)
+            aplicar(cursor, ids)
+            conn.commit()
+            procesados += len(ids)
+            trabajo.lote_terminado(procesados)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def _eliminar_lote(cursor, ids):
+    placeholders = ', '.join(['%s'] * len(ids))
+    restar_prestamos(cursor, ids)
+    cursor.execute(f'UPDATE prestamos SET activo = FALSE WHERE id IN ({placeholders})', ids)
+
+def eliminar_prestamos(trabajo):
+    """Eliminación lógica de los préstamos de un rango de fechas"""
+    parametros = trabajo.parametros
+    procesados = _por_lotes(trabajo, 'p.activo = TRUE AND p.fecha_hora >= %s AND p.fecha_hora < %s + INTERVAL 1 DAY',
+                            [parametros['fecha_inicio'], parametros['fecha_fin']], _eliminar_lote)
+    return f'{procesados} préstamos eliminados correctamente'
+
+def _archivar_lote(cursor, ids):
+    placeholders = ', '.join(['%s'] * len(ids))
+    for tabla, columna in (('prestamos', 'id'), ('detalles_prestamo', 'prestamo_id'), ('integrantes', 'prestamo_id')):
+        columnas = ', '.join(ARCHIVO_COLUMNAS[tabla])
+        cursor.execute(f'''
+            INSERT INTO {tabla}_archivo ({columnas})
+            SELECT {columnas} FROM {tabla} WHERE {columna} IN ({placeholders})
+        ''', ids)
+    columnas = ARCHIVO_COLUMNAS['devolucion_detalles']
+    cursor.execute(f'''
+        INSERT INTO devolucion_detalles_archivo ({', '.join(columnas)})
+        SELECT {', '.join('dd.' + columna for columna in columnas)} FROM devolucion_detalles dd
+        JOIN detalles_prestamo d ON dd.detalle_id = d.id
+        WHERE d.prestamo_id IN ({placeholders})
+    ''', ids)
+    # Detalles, integrantes y detalles de devolución se borran en cascada
+    cursor.execute(f'DELETE FROM prestamos WHERE id IN ({placeholders})', ids)
+
+def archivar_prestamos(trabajo):
+    """Mueve a las tablas *_archivo los préstamos eliminados anteriores a una fecha"""
+    procesados = _por_lotes(trabajo, 'p.activo = FALSE AND p.fecha_hora < %s',
+                            [trabajo.parametros['antes_de']], _archivar_lote)
+    return f'{procesados} préstamos archivados correctamente'
+
+def reconstruir(trabajo):
+    """Recalcula los rollups por tramos de TRABAJOS_DIAS_RESUMEN días"""
+    desde = trabajo.parametros.get('desde')
+    hasta = trabajo.parametros.get('hasta')
+    cursor = trabajo.conn.cursor()
+    try:
+        primero, ultimo = rango_historico(cursor)
+        trabajo.conn.commit()
+    finally:
+        cursor.close()
+    if primero is None:
+        return 'No hay préstamos registrados'
+    desde = date.fromisoformat(desde) if desde else primero
+    hasta = date.fromisoformat(hasta) if hasta else ultimo
+
+    trabajo.avance(0, len(list(tramos(desde, hasta, Config.TRABAJOS_DIAS_RESUMEN))))
+    hechos = 0
+
+    def al_avanzar(inicio, fin):
+        nonlocal hechos
+        hechos += 1
+        trabajo.lote_terminado(hechos)
+
+    reconstruir_resumenes(trabajo.conn, desde, hasta, dias=Config.TRABAJOS_DIAS_RESUMEN, al_avanzar=al_avanzar)
+    return f'Resúmenes del {desde} al {hasta} reconstruidos'
+
+def _fecha(parametros, nombre, requerida=True):
+    valor = parametros.get(nombre)
+    if not valor:
+        if requerida:
+            raise ParametrosInvalidos(f'Falta el parámetro {nombre}')
+        return None
+    try:
+        return date.fromisoformat(str(valor)).isoformat()
+    except ValueError:
+        raise ParametrosInvalidos(f'{nombre} debe tener el formato AAAA-MM-DD')
+
+def _validar_rango(parametros, inicio='fecha_inicio', fin='fecha_fin', requeridas=True):
+    desde = _fecha(parametros, inicio, requeridas)
+    hasta = _fecha(parametros, fin, requeridas)
+    if desde and hasta and desde > hasta:
+        raise ParametrosInvalidos('La fecha inicial es posterior a la final')
+    return {inicio: desde, fin: hasta}
+
+def _validar_tickets(parametros):
+    formato = parametros.get('formato')
+    if formato not in ('pdf', 'zip'):
+        raise ParametrosInvalidos('formato debe ser pdf o zip')
+    return dict(_validar_rango(parametros), formato=formato)
+
+# tipo -> validación de parámetros y función que ejecuta el trabajo (devuelve el mensaje final)
+TAREAS = {
+    'eliminar_prestamos': {
+        'validar': _validar_rango,
+        'ejecutar': eliminar_prestamos
+    },
+    'archivar_prestamos': {
+        'validar': lambda parametros: {'antes_de': _fecha(parametros, 'antes_de')},
+        'ejecutar': archivar_prestamos
+    },
+    'reconstruir_resumenes': {
+        'validar': lambda parametros: _validar_rango(parametros, 'desde', 'hasta', requeridas=False),
+        'ejecutar': reconstruir
+    },
+    # La ejecución depende de las consultas de app.py, que la registra con registrar_tarea
+    'tickets_lote': {
+        'validar': _validar_tickets,
+        'ejecutar': None
+    }
+}
+
+def registrar_tarea(tipo, ejecutar):
+    """Función que ejecuta un tipo de trabajo declarado en TAREAS sin ella"""
+    TAREAS[tipo]['ejecutar'] = ejecutar
+
+# EJECUCIÓN
+
+def _ejecutar(trabajo_id):
+    with _cola_lock:
+        _en_cola.discard(trabajo_id)
+    conn = get_db_connection(request_scoped=False)
+    if conn is None:
+        return  # Sigue pendiente; reanudar() lo retoma
+    propietario = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}'[-100:]
+    cursor = conn.cursor(dictionary=True)
+    try:
+        # Solo un worker lo reclama aunque varios lo hayan encolado
+        cursor.execute('''
+            UPDATE trabajos SET estado = 'en_proceso', propietario = %s, fecha_inicio = NOW(), fecha_actualizacion = NOW()
+            WHERE id = %s AND estado = 'pendiente'
+        ''', (propietario, trabajo_id))
+        reclamado = cursor.rowcount == 1
+        conn.commit()
+        if not reclamado:
+            return
+
+        cursor.execute('SELECT tipo, parametros FROM trabajos WHERE id = %s', (trabajo_id,))
+        fila = cursor.fetchone()
+        conn.commit()
+        trabajo = Trabajo(trabajo_id, fila['tipo'], json.loads(fila['parametros'] or '{}'), conn, propietario)
+        try:
+            ejecutar = TAREAS[trabajo.tipo]['ejecutar']
+            if ejecutar is None:
+                raise RuntimeError(f'Tarea {trabajo.tipo} sin registrar en este proceso')
+            with Latido(trabajo_id, trabajo.propietario):
+                mensaje = ejecutar(trabajo)
+            estado = 'completado'
+        except TrabajoCancelado:
+            return
+        except Exception as e:
+            conn.rollback()
+            estado, mensaje = 'error', f'Error: {str(e)}'
+
+        cursor.execute('''
+            UPDATE trabajos SET estado = %s, mensaje = %s, resultado = %s, fecha_fin = NOW(), fecha_actualizacion = NOW()
+            WHERE id = %s AND propietario = %s AND estado = 'en_proceso'
+        ''', (estado, mensaje, json.dumps(trabajo.resultado) if estado == 'completado' and trabajo.resultado else None,
+              trabajo_id, trabajo.propietario))
+        conn.commit()
+    except Exception as e:
+        print(f"Error en el trabajo {trabajo_id}: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+def reanudar():
+    """Encola los trabajos pendientes y los que perdieron el latido (worker reiniciado o caído)"""
+    conn = get_db_connection(request_scoped=False)
+    if conn is None:
+        return
+    cursor = conn.cursor()
+    try:
+        # Un trabajo vivo renueva fecha_actualizacion cada TRABAJOS_LATIDO segundos aunque el lote sea largo
+        cursor.execute('''
+            UPDATE trabajos SET estado = 'pendiente', propietario = NULL
+            WHERE estado = 'en_proceso' AND fecha_actualizacion < NOW() - INTERVAL %s SECOND
+        ''', (Config.TRABAJOS_ABANDONO,))
+        cursor.execute("SELECT id FROM trabajos WHERE estado = 'pendiente' ORDER BY id")
+        ids = [fila[0] for fila in cursor.fetchall()]
+        conn.commit()
+    except Exception as e:
+        print(f"Error al reanudar trabajos: {e}")
+        return
+    finally:
+        cursor.close()
+        conn.close()
+    for trabajo_id in ids:
+        _enviar(trabajo_id)
+
+def encolar(conn, tipo, parametros, usuario_id):
+    """Valida y registra un trabajo y lo envía al pool; devuelve su id"""
+    if tipo not in TAREAS:
+        raise ParametrosInvalidos(f'Tipo de trabajo desconocido: {tipo}')
+    parametros = TAREAS[tipo]['validar'](parametros or {})
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute('INSERT INTO trabajos (tipo, parametros, usuario_id) VALUES (%s, %s, %s)',
+                       (tipo, json.dumps(parametros), usuario_id))
+        trabajo_id = cursor.lastrowid
+        conn.commit()
+    finally:
+        cursor.close()
+
+    _enviar(trabajo_id)
+    return trabajo_id
+
+def cancelar(conn, trabajo_id):
+    """Cancela un trabajo pendiente o en proceso; True si seguía activo"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            UPDATE trabajos SET estado = 'cancelado', mensaje = 'Cancelado por el usuario',
+                                fecha_fin = NOW(), fecha_actualizacion = NOW()
+            WHERE id = %s AND estado IN ('pendiente', 'en_proceso')
+        ''', (trabajo_id,))
+        cancelado = cursor.rowcount == 1
+        conn.commit()
+        return cancelado
+    finally:
+        cursor.close()
+
+def _serializar(trabajo):
+    trabajo['parametros'] = json.loads(trabajo['parametros'] or '{}')
+    trabajo['resultado'] = json.loads(trabajo['resultado']) if trabajo['resultado'] else None
+    if trabajo['estado'] == 'completado':
+        trabajo['porcentaje'] = 100
+    elif trabajo['total']:
+        trabajo['porcentaje'] = min(100, trabajo['progreso'] * 100 // trabajo['total'])
+    else:
+        trabajo['porcentaje'] = 0
+    for campo in ('fecha_creacion', 'fecha_inicio', 'fecha_fin', 'fecha_actualizacion'):
+        if isinstance(trabajo[campo], datetime):
+            trabajo[campo] = trabajo[campo].isoformat()
+    return trabajo
+
+CAMPOS = '''id, tipo, parametros, estado, progreso, total, mensaje, resultado, usuario_id,
+            fecha_creacion, fecha_inicio, fecha_fin, fecha_actualizacion'''
+
+def obtener(cursor, trabajo_id):
+    """Estado de un trabajo (cursor con dictionary=True)"""
+    cursor.execute(f'SELECT {CAMPOS} FROM trabajos WHERE id = %s', (trabajo_id,))
+    trabajo = cursor.fetchone()
+    return _serializar(trabajo) if trabajo else None
+
+def listar(cursor, limite=20):
+    """Trabajos más recientes (cursor con dictionary=True)"""
+    cursor.execute(f'SELECT {CAMPOS} FROM trabajos ORDER BY id DESC LIMIT %s', (limite,))
+    return [_serializar(trabajo) for trabajo in cursor.fetchall()]
@@ -105,6 +105,7 @@ CREATE TABLE IF NOT EXISTS detalles_prestamo (
     prestamo_id INT NOT NULL,
     material_id INT NOT NULL,
     cantidad INT NOT NULL CHECK (cantidad > 0),
+    cantidad_devuelta INT NOT NULL DEFAULT 0,
     FOREIGN KEY (prestamo_id) REFERENCES prestamos(id) ON DELETE CASCADE,
     FOREIGN KEY (material_id) REFERENCES materiales(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -116,12 +117,113 @@ CREATE TABLE IF NOT EXISTS integrantes (
     nombre VARCHAR(100) NOT NULL,
     no_control VARCHAR(20),
     firma_data LONGTEXT,
+    firma_hash CHAR(64),
     FOREIGN KEY (prestamo_id) REFERENCES prestamos(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- firmas (PNG o trazos vectoriales direccionados por SHA-256, fuera de la fila de integrantes)
+CREATE TABLE IF NOT EXISTS firmas (
+    hash CHAR(64) PRIMARY KEY,
+    formato ENUM('png', 'vector') NOT NULL DEFAULT 'png',
+    contenido MEDIUMBLOB NOT NULL,
+    tamano INT NOT NULL,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- devoluciones (una por operación; la clave hace idempotentes los reintentos)
+CREATE TABLE IF NOT EXISTS devoluciones (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    usuario_id INT,
+    clave VARCHAR(64),
+    respuesta TEXT,
+    fecha_hora TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_devoluciones_clave (usuario_id, clave),
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- material repuesto en cada devolución (permite devoluciones parciales)
+CREATE TABLE IF NOT EXISTS devolucion_detalles (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    devolucion_id INT NOT NULL,
+    detalle_id INT NOT NULL,
+    material_id INT NOT NULL,
+    cantidad INT NOT NULL CHECK (cantidad > 0),
+    KEY idx_devolucion_detalles_devolucion (devolucion_id),
+    FOREIGN KEY (devolucion_id) REFERENCES devoluciones(id) ON DELETE CASCADE,
+    FOREIGN KEY (detalle_id) REFERENCES detalles_prestamo(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- contadores acumulados (total de préstamos para el dashboard)
+CREATE TABLE IF NOT EXISTS contadores (
+    nombre VARCHAR(50) PRIMARY KEY,
+    valor BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- resumen diario de préstamos activos (rollup para reportes avanzados)
+CREATE TABLE IF NOT EXISTS resumen_diario (
+    fecha DATE NOT NULL,
+    carrera_id INT NOT NULL,
+    asignatura_id INT NOT NULL,
+    num_prestamos INT NOT NULL DEFAULT 0,
+    num_integrantes INT NOT NULL DEFAULT 0,
+    num_devueltos INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, carrera_id, asignatura_id),
+    KEY idx_resumen_carrera_fecha (carrera_id, fecha)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- resumen diario de uso de materiales
+CREATE TABLE IF NOT EXISTS resumen_diario_materiales (
+    fecha DATE NOT NULL,
+    carrera_id INT NOT NULL,
+    asignatura_id INT NOT NULL,
+    material_id INT NOT NULL,
+    veces_utilizado INT NOT NULL DEFAULT 0,
+    total_unidades INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, carrera_id, asignatura_id, material_id),
+    KEY idx_resumen_mat_carrera_fecha (carrera_id, fecha)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- trabajos administrativos en segundo plano (estado y avance)
+CREATE TABLE IF NOT EXISTS trabajos (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    parametros TEXT,
+    estado ENUM('pendiente', 'en_proceso', 'completado', 'error', 'cancelado') NOT NULL DEFAULT 'pendiente',
+    propietario VARCHAR(100),
+    progreso INT NOT NULL DEFAULT 0,
+    total INT,
+    mensaje TEXT,
+    resultado TEXT,
+    usuario_id INT,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_inicio DATETIME,
+    fecha_fin DATETIME,
+    fecha_actualizacion DATETIME,
+    KEY idx_trabajos_estado (estado, fecha_actualizacion),
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- archivo de préstamos eliminados (mismas columnas, sin llaves foráneas)
+CREATE TABLE IF NOT EXISTS prestamos_archivo LIKE prestamos;
+CREATE TABLE IF NOT EXISTS detalles_prestamo_archivo LIKE detalles_prestamo;
+CREATE TABLE IF NOT EXISTS integrantes_archivo LIKE integrantes;
+CREATE TABLE IF NOT EXISTS devolucion_detalles_archivo LIKE devolucion_detalles;
+
 -- indices
 CREATE INDEX idx_prestamos_fecha ON prestamos(fecha_hora);
-CREATE INDEX idx_prestamos_estado ON prestamos(estado);
+CREATE INDEX idx_prestamos_activo_fecha ON prestamos(activo, fecha_hora);
+CREATE INDEX idx_prestamos_estado_fecha ON prestamos(estado, fecha_hora);
+CREATE INDEX idx_prestamos_carrera_fecha ON prestamos(carrera_id, fecha_hora);
+CREATE INDEX idx_prestamos_importancia_fecha ON prestamos(importancia_observacion, fecha_hora);
 CREATE INDEX idx_asignaturas_carrera ON asignaturas(carrera_id);
 CREATE INDEX idx_docentes_carrera ON docentes(carrera_id);
-CREATE INDEX idx_practicas_asignatura ON practicas(asignatura_id);
\ No newline at end of file
+CREATE INDEX idx_practicas_asignatura ON practicas(asignatura_id);
+CREATE INDEX idx_integrantes_no_control ON integrantes(no_control);
+CREATE INDEX idx_integrantes_nombre ON integrantes(nombre);
+
+-- búsqueda de texto
+CREATE FULLTEXT INDEX ft_docentes ON docentes(nombre);
+CREATE FULLTEXT INDEX ft_practicas ON practicas(nombre, descripcion);
+CREATE FULLTEXT INDEX ft_materiales ON materiales(nombre, descripcion, categoria);
+CREATE FULLTEXT INDEX ft_integrantes ON integrantes(nombre, no_control);
+CREATE FULLTEXT INDEX ft_prestamos_observaciones ON prestamos(observaciones);
\ No newline at end of file
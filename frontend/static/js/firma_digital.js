@@ -1,11 +1,18 @@
 class FirmaDigital {
-    constructor(canvas) {
+    // 'vector' envia trazos simplificados; 'png' envia el canvas completo
+    static MODO_POR_DEFECTO = 'vector';
+    static TOLERANCIA_SIMPLIFICACION = 1.0;
+
+    constructor(canvas, modo = FirmaDigital.MODO_POR_DEFECTO) {
         this.canvas = canvas;
         this.ctx = canvas.getContext('2d');
+        this.modo = canvas.dataset.modoFirma || modo;
         this.dibujando = false;
         this.ultimoX = 0;
         this.ultimoY = 0;
         this.firmaData = '';
+        this.trazos = [];
+        this.trazoActual = null;
         
         this.inicializarEventos();
         this.limpiarCanvas();
@@ -46,6 +53,7 @@ class FirmaDigital {
         const coords = this.getCoordenadas(e);
         this.ultimoX = coords.x;
         this.ultimoY = coords.y;
+        this.trazoActual = [coords];
     }
 
     iniciarDibujoTouch(e) {
@@ -54,6 +62,7 @@ class FirmaDigital {
         const coords = this.getCoordenadasTouch(e);
         this.ultimoX = coords.x;
         this.ultimoY = coords.y;
+        this.trazoActual = [coords];
     }
 
     dibujar(e) {
@@ -73,7 +82,7 @@ class FirmaDigital {
         this.ultimoX = coords.x;
         this.ultimoY = coords.y;
 
-        this.guardarFirma();
+        this.registrarPunto(coords);
     }
 
     dibujarTouch(e) {
@@ -94,11 +103,25 @@ class FirmaDigital {
         this.ultimoX = coords.x;
         this.ultimoY = coords.y;
 
-        this.guardarFirma();
+        this.registrarPunto(coords);
+    }
+
+    registrarPunto(coords) {
+        if (this.modo === 'vector') {
+            // El vector se serializa al terminar el trazo
+            this.trazoActual.push(coords);
+        } else {
+            this.guardarFirma();
+        }
     }
 
     terminarDibujo() {
+        if (!this.dibujando) return;
         this.dibujando = false;
+        if (this.trazoActual) {
+            this.trazos.push(this.trazoActual);
+            this.trazoActual = null;
+        }
         this.guardarFirma();
     }
 
@@ -108,14 +131,37 @@ class FirmaDigital {
         this.ctx.strokeStyle = '#000';
         this.ctx.lineWidth = 2;
         this.firmaData = '';
+        this.trazos = [];
+        this.trazoActual = null;
         this.actualizarInputFirma();
     }
 
     guardarFirma() {
-        this.firmaData = this.canvas.toDataURL('image/png');
+        this.firmaData = this.modo === 'vector'
+            ? this.serializarVector()
+            : this.canvas.toDataURL('image/png');
         this.actualizarInputFirma();
     }
 
+    // Formato: v1;<ancho>x<alto>;x,y,dx,dy,...;x,y,dx,dy,... (un bloque por trazo)
+    serializarVector() {
+        const bloques = this.trazos.map(trazo => {
+            const puntos = simplificarTrazo(trazo, FirmaDigital.TOLERANCIA_SIMPLIFICACION);
+            const valores = [];
+            let prevX = 0;
+            let prevY = 0;
+            puntos.forEach(punto => {
+                const x = Math.round(punto.x);
+                const y = Math.round(punto.y);
+                valores.push(x - prevX, y - prevY);
+                prevX = x;
+                prevY = y;
+            });
+            return valores.join(',');
+        });
+        return `v1;${this.canvas.width}x${this.canvas.height};${bloques.join(';')}`;
+    }
+
     actualizarInputFirma() {
         const inputFirma = this.canvas.closest('.firma-container').querySelector('.firma-data');
         if (inputFirma) {
@@ -124,6 +170,9 @@ class FirmaDigital {
     }
 
     tieneFirma() {
+        if (this.modo === 'vector') {
+            return this.trazos.length > 0;
+        }
         const imageData = this.ctx.getImageData(0, 0, this.canvas.width, this.canvas.height);
         const data = imageData.data;
         
@@ -136,6 +185,45 @@ class FirmaDigital {
     }
 }
 
+// Ramer-Douglas-Peucker: elimina puntos a menos de `tolerancia` px de la linea
+function simplificarTrazo(puntos, tolerancia) {
+    if (puntos.length < 3) return puntos;
+
+    const conservar = new Uint8Array(puntos.length);
+    conservar[0] = 1;
+    conservar[puntos.length - 1] = 1;
+    const pila = [[0, puntos.length - 1]];
+
+    while (pila.length) {
+        const [inicio, fin] = pila.pop();
+        const a = puntos[inicio];
+        const b = puntos[fin];
+        const dx = b.x - a.x;
+        const dy = b.y - a.y;
+        const longitud = Math.hypot(dx, dy);
+        let maxDist = 0;
+        let indice = -1;
+
+        for (let i = inicio + 1; i < fin; i++) {
+            const p = puntos[i];
+            const dist = longitud === 0
+                ? Math.hypot(p.x - a.x, p.y - a.y)
+                : Math.abs(dy * p.x - dx * p.y + b.x * a.y - b.y * a.x) / longitud;
+            if (dist > maxDist) {
+                maxDist = dist;
+                indice = i;
+            }
+        }
+
+        if (maxDist > tolerancia) {
+            conservar[indice] = 1;
+            pila.push([inicio, indice], [indice, fin]);
+        }
+    }
+
+    return puntos.filter((_, i) => conservar[i]);
+}
+
 // Inicializar sistema de firmas
 document.addEventListener('DOMContentLoaded', function() {
     window.firmas = new Map(); 
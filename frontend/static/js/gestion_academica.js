@@ -5,6 +5,7 @@ class GestionAcademica {
         this.docentes = [];
         this.practicas = [];
         this.materiales = [];
+        this.practicaMateriales = {};
         this.init();
     }
 
@@ -13,24 +14,25 @@ class GestionAcademica {
         this.configurarEventListeners();
         this.mostrarDatosIniciales();
     }
-    // carga datos iniciales (carreras, asignaturas, etc)
+    // carga datos iniciales (carreras, asignaturas, etc) en una sola peticion
     async cargarDatosIniciales() {
         try {
 
-            const carrerasResponse = await fetch('/api/carreras');
-            this.carreras = await carrerasResponse.json();
-            
-            const asignaturasResponse = await fetch('/api/asignaturas');
-            this.asignaturas = await asignaturasResponse.json();
-            
-            const docentesResponse = await fetch('/api/docentes');
-            this.docentes = await docentesResponse.json();
-            
-            const practicasResponse = await fetch('/api/practicas');
-            this.practicas = await practicasResponse.json();
+            const response = await fetch('/api/bootstrap');
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const datos = await response.json();
             
-            const materialesResponse = await fetch('/api/materiales');
-            this.materiales = await materialesResponse.json();
+            this.carreras = datos.carreras || [];
+            this.asignaturas = datos.asignaturas || [];
+            this.docentes = datos.docentes || [];
+            this.materiales = datos.materiales || [];
+            this.practicaMateriales = datos.practica_materiales || {};
+            this.practicas = (datos.practicas || []).map(practica => ({
+                ...practica,
+                materiales_count: (this.practicaMateriales[practica.id] || []).length
+            }));
             
         } catch (error) {
             console.error('Error cargando datos:', error);
@@ -42,11 +42,27 @@ class NuevoPrestamo {
         this.establecerFechaHoraActual();
     }
 
+    async cascada() {
+        // Resuelve en una sola petición todos los niveles seleccionados hasta ahora
+        const params = new URLSearchParams();
+        ['carrera', 'asignatura', 'practica'].forEach(campo => {
+            const valor = document.getElementById(campo).value;
+            if (valor) {
+                params.set(`${campo}_id`, valor);
+            }
+        });
+        const response = await fetch(`/api/cascada?${params}`);
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        return response.json();
+    }
+
     async cargarDatosIniciales() {
         try {
             // Cargar carreras
-            const carrerasResponse = await fetch('/api/carreras');
-            this.carreras = await carrerasResponse.json();
+            const datos = await this.cascada();
+            this.carreras = datos.carreras || [];
             this.actualizarSelectCarreras();
             
         } catch (error) {
@@ -116,13 +132,9 @@ class NuevoPrestamo {
 
         try {
             // Cargar asignaturas y docentes
-            const [asignaturasResponse, docentesResponse] = await Promise.all([
-                fetch(`/api/asignaturas?carrera_id=${carreraId}`),
-                fetch(`/api/docentes?carrera_id=${carreraId}`)
-            ]);
-
-            this.asignaturas = await asignaturasResponse.json();
-            this.docentes = await docentesResponse.json();
+            const datos = await this.cascada();
+            this.asignaturas = datos.asignaturas || [];
+            this.docentes = datos.docentes || [];
 
             selectAsignatura.innerHTML = '<option value="">Seleccionar asignatura...</option>';
             this.asignaturas.forEach(asignatura => {
@@ -161,8 +173,8 @@ class NuevoPrestamo {
         }
 
         try {
-            const response = await fetch(`/api/practicas?asignatura_id=${asignaturaId}`);
-            this.practicas = await response.json();
+            const datos = await this.cascada();
+            this.practicas = datos.practicas || [];
 
             selectPractica.innerHTML = '<option value="">Seleccionar práctica...</option>';
             this.practicas.forEach(practica => {
@@ -192,8 +204,8 @@ class NuevoPrestamo {
         }
 
         try {
-            const response = await fetch(`/api/practica/${practicaId}/materiales`);
-            this.materialesPractica = await response.json();
+            const datos = await this.cascada();
+            this.materialesPractica = datos.materiales || [];
 
             if (this.materialesPractica.length === 0) {
                 container.innerHTML = '<div class="alert alert-warning">No hay materiales definidos para esta práctica</div>';
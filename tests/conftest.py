@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del backend se importan como en app.py (backend/ en sys.path)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+@pytest.fixture(scope='session')
+def app_modulo():
+    """Módulo app.py importado; se omite si faltan las dependencias del backend"""
+    for modulo in ('flask', 'mysql.connector', 'dotenv'):
+        pytest.importorskip(modulo)
+    import app
+    return app
+
+@pytest.fixture(scope='session')
+def base_datos():
+    """Base de datos MYSQL_TEST_DB creada con init_db; se omite si no está configurada"""
+    for modulo in ('flask', 'mysql.connector', 'dotenv', 'werkzeug'):
+        pytest.importorskip(modulo)
+    nombre = os.getenv('MYSQL_TEST_DB')
+    if not nombre:
+        pytest.skip('Defina MYSQL_TEST_DB y las variables MYSQL_* para las pruebas con MySQL')
+    from config import Config
+    Config.MYSQL_DB = nombre
+    from database.init_db import init_database
+    if not init_database():
+        pytest.skip('No se pudo inicializar la base de datos de pruebas')
+    return Config
+
+@pytest.fixture
+def conexion(base_datos):
+    """Conexión del pool a la base de pruebas"""
+    from database.db_connection import get_db_connection
+    conn = get_db_connection(request_scoped=False)
+    if conn is None:
+        pytest.skip('Sin conexión a MySQL')
+    yield conn
+    conn.rollback()
+    conn.close()
@@ -0,0 +1,27 @@
+class ConexionFalsa:
+    def cursor(self, dictionary=False):
+        return self
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+def test_busqueda_sin_cache_y_no_store(app_modulo, monkeypatch):
+    monkeypatch.setattr(app_modulo, 'get_db_connection', lambda: ConexionFalsa())
+    monkeypatch.setattr(app_modulo, 'obtener_usuario', lambda usuario_id: {'id': usuario_id, 'tipo': 'estudiante'})
+    monkeypatch.setattr(app_modulo, 'buscar', lambda cursor, texto, tipos, limite: {'integrantes': [{'id': 1}]})
+    escrituras = []
+    monkeypatch.setattr(app_modulo.catalog_cache, 'set', lambda *args, **kwargs: escrituras.append(args))
+    cliente = app_modulo.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['loggedin'] = True
+        sesion['id'] = 1
+
+    respuesta = cliente.get('/api/buscar?q=garc&tipos=integrantes')
+    assert respuesta.status_code == 200
+    assert respuesta.get_json() == {'integrantes': [{'id': 1}]}
+    assert respuesta.headers['Cache-Control'] == 'private, no-store'
+    assert 'ETag' not in respuesta.headers
+    assert escrituras == []
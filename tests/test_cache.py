@@ -0,0 +1,151 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from cache import RedisCache, SQLiteCache, TableVersions, crear_cache
+from redis_local import ServidorRedisLocal
+
+@pytest.fixture(scope='module')
+def servidor_redis():
+    servidor = ServidorRedisLocal(('127.0.0.1', 0))
+    host, puerto = servidor.iniciar_en_segundo_plano()
+    yield f'redis://{host}:{puerto}/0'
+    servidor.shutdown()
+    servidor.server_close()
+
+@pytest.fixture(params=['redis', 'sqlite'])
+def crear(request, servidor_redis, tmp_path):
+    """Fábrica de instancias que comparten almacén, como los workers de gunicorn"""
+    prefijo = uuid.uuid4().hex[:8]
+    ruta = str(tmp_path / 'cache.sqlite3')
+
+    def crear(ttl=60):
+        if request.param == 'redis':
+            return RedisCache(servidor_redis, ttl=ttl, prefijo=prefijo)
+        return SQLiteCache(ruta, ttl=ttl)
+    return crear
+
+def test_get_set(crear):
+    cache = crear()
+    assert cache.get('carreras', None) is None
+    assert cache.get('carreras', None, default='x') == 'x'
+    cache.set('carreras', ('a', 1), [{'id': 1, 'nombre': 'Eléctrica'}])
+    assert cache.get('carreras', ('a', 1)) == [{'id': 1, 'nombre': 'Eléctrica'}]
+    assert cache.get('carreras', ('a', 2)) is None
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['errores']) == (1, 3, 0)
+
+def test_expiracion_por_ttl(crear):
+    cache = crear(ttl=0.2)
+    cache.set('carreras', None, 'corto')
+    cache.set('carreras', 'largo', 'largo', ttl=60)
+    assert cache.get('carreras', None) == 'corto'
+    time.sleep(0.3)
+    assert cache.get('carreras', None) is None
+    assert cache.get('carreras', 'largo') == 'largo'
+
+def test_invalidate_entre_instancias(crear):
+    worker_a, worker_b = crear(), crear()
+    worker_a.set('carreras', None, 'viejo')
+    worker_a.set('materiales', None, 'intacto')
+    assert worker_b.get('carreras', None) == 'viejo'
+
+    worker_b.invalidate('carreras')
+    assert worker_a.get('carreras', None) is None
+    assert worker_a.get('materiales', None) == 'intacto'
+
+    # Tras la invalidación se puede volver a escribir en el namespace
+    worker_a.set('carreras', None, 'nuevo')
+    assert worker_b.get('carreras', None) == 'nuevo'
+
+def test_delete(crear):
+    worker_a, worker_b = crear(), crear()
+    worker_a.set('sesion', 'sid1', {'id': 1})
+    worker_a.set('sesion', 'sid2', {'id': 2})
+    worker_b.delete('sesion', 'sid1')
+    assert worker_a.get('sesion', 'sid1') is None
+    assert worker_a.get('sesion', 'sid2') == {'id': 2}
+
+def test_contadores(crear):
+    cache = crear()
+    assert cache.get_counters(['a', 'b']) == [None, None]
+    assert cache.incr('a') == 1
+    assert cache.incr('a') == 2
+    cache.set_counter('b', 7)
+    assert crear().get_counters(['a', 'b']) == [2, 7]
+
+def test_ventana_atomica_entre_instancias(crear):
+    hilos, incrementos = 8, 25
+
+    def sumar():
+        worker = crear()
+        for _ in range(incrementos):
+            worker.incr_ventana('login_intentos', ('ip', '10.0.0.1'), 60)
+
+    trabajadores = [threading.Thread(target=sumar) for _ in range(hilos)]
+    for hilo in trabajadores:
+        hilo.start()
+    for hilo in trabajadores:
+        hilo.join()
+    assert crear().incr_ventana('login_intentos', ('ip', '10.0.0.1'), 60, 0) == hilos * incrementos
+
+def test_ventana_expira_y_se_elimina(crear):
+    cache = crear()
+    assert cache.incr_ventana('login_intentos', 'a', 0.2) == 1
+    assert cache.incr_ventana('login_intentos', 'a', 0.2) == 2
+    time.sleep(0.3)
+    assert cache.incr_ventana('login_intentos', 'a', 60) == 1
+    cache.delete_ventana('login_intentos', 'a')
+    assert cache.incr_ventana('login_intentos', 'a', 60, -1) == -1
+
+def test_table_versions_compartidas(crear):
+    worker_a, worker_b = TableVersions(crear()), TableVersions(crear())
+    assert worker_a.boot_id == worker_b.boot_id == 'compartido'
+
+    etag = worker_a.etag(('carreras',), 'carreras:None')
+    assert worker_b.etag(('carreras',), 'carreras:None') == etag
+    assert worker_a.etag(('carreras',), 'otra') != etag
+
+    otras = worker_a.etag(('materiales',), 'materiales:None')
+    worker_b.bump('carreras')
+    nuevo = worker_a.etag(('carreras',), 'carreras:None')
+    assert nuevo != etag
+    assert worker_b.etag(('carreras',), 'carreras:None') == nuevo
+    assert worker_a.etag(('materiales',), 'materiales:None') == otras
+    assert worker_a.last_modified(('carreras',)) == worker_b.last_modified(('carreras',))
+
+def test_redis_caido_falla_como_miss():
+    cache = RedisCache('redis://127.0.0.1:1/0', timeout=0.2)
+    cache.set('carreras', None, 'x')
+    assert cache.get('carreras', None) is None
+    assert cache.get_counters(['a']) is None
+    assert cache.get_stats()['errores'] >= 2
+    # Sin versiones el ETag es aleatorio: nunca se responde 304 con datos dudosos
+    versiones = TableVersions(cache)
+    assert versiones.etag(('carreras',)) != versiones.etag(('carreras',))
+
+def test_archivo_sqlite_privado(tmp_path):
+    ruta = tmp_path / 'datos' / 'sesiones.sqlite3'
+    SQLiteCache(str(ruta)).set('sesion', 'sid', {'id': 1})
+    assert ruta.stat().st_mode & 0o777 == 0o600
+    assert (tmp_path / 'datos').stat().st_mode & 0o777 == 0o700
+
+    # Un archivo previo legible por otros se restringe al abrirlo
+    abierto = tmp_path / 'abierto.sqlite3'
+    abierto.touch(mode=0o666)
+    abierto.chmod(0o666)
+    SQLiteCache(str(abierto))
+    assert abierto.stat().st_mode & 0o777 == 0o600
+
+def test_directorio_escribible_por_otros_se_rechaza(tmp_path):
+    compartido = tmp_path / 'compartido'
+    compartido.mkdir()
+    compartido.chmod(0o777)
+    with pytest.raises(PermissionError):
+        SQLiteCache(str(compartido / 'cache.sqlite3'))
+
+def test_sqlite_requiere_ruta():
+    with pytest.raises(ValueError):
+        crear_cache('sqlite')
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+pytest.importorskip('flask')
+mysql_connector = pytest.importorskip('mysql.connector')
+from database.db_connection import ConnectionPool, PooledConnection
+
+class ConexionFalsa:
+    """Conexión cruda cuyo ping puede quedarse esperando (servidor lento o caído)"""
+
+    def __init__(self, bloqueo=None):
+        self.bloqueo = bloqueo
+        self.en_ping = threading.Event()
+
+    def ping(self, reconnect=False):
+        self.en_ping.set()
+        if self.bloqueo is not None:
+            self.bloqueo.wait(5)
+
+    def rollback(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+def test_ping_lento_no_bloquea_el_pool(monkeypatch):
+    monkeypatch.setattr(mysql_connector, 'connect', lambda **kwargs: ConexionFalsa())
+    pool = ConnectionPool(size=3, timeout=1, max_age=0, ping_interval=0)
+    bloqueo = threading.Event()
+    lenta = PooledConnection(pool, ConexionFalsa(bloqueo))
+    libre = PooledConnection(pool, ConexionFalsa())
+    pool._idle = [libre, lenta]
+    pool._total = 2
+
+    primera = threading.Thread(target=pool.acquire)
+    primera.start()
+    assert lenta._raw.en_ping.wait(2)
+
+    # Mientras el ping sigue en curso, otra petición toma la conexión libre y devuelve otra
+    resultado = []
+    segunda = threading.Thread(target=lambda: resultado.append(pool.acquire()))
+    segunda.start()
+    segunda.join(2)
+    assert resultado == [libre]
+    liberar = threading.Thread(target=pool.release, args=(libre,))
+    liberar.start()
+    liberar.join(2)
+    assert not liberar.is_alive()
+    assert pool.get_stats()['en_uso'] == 1
+
+    bloqueo.set()
+    primera.join(2)
+    assert pool.get_stats()['checkouts'] == 2
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+class CursorContador:
+    """Cursor falso que cuenta las consultas y devuelve filas vacías"""
+
+    def __init__(self, filas_por_consulta=None):
+        self.consultas = []
+        self._filas_por_consulta = filas_por_consulta or (lambda sql, params: [])
+        self._filas = []
+
+    def execute(self, sql, params=None):
+        self.consultas.append(sql)
+        self._filas = self._filas_por_consulta(sql, list(params or []))
+
+    def fetchall(self):
+        return self._filas
+
+    def fetchone(self):
+        return self._filas[0] if self._filas else None
+
+def _prestamos(n):
+    inicio = datetime(2025, 1, 1, 8, 0)
+    return [{'id': i, 'fecha_hora': inicio + timedelta(minutes=i)} for i in range(1, n + 1)]
+
+@pytest.mark.parametrize('incluir_firmas', [False, True])
+def test_cargar_detalles_consultas_constantes(app_modulo, incluir_firmas):
+    consultas = {}
+    for n in (1, 50):
+        cursor = CursorContador()
+        app_modulo.cargar_detalles_prestamos(cursor, _prestamos(n), incluir_firmas=incluir_firmas)
+        consultas[n] = len(cursor.consultas)
+    assert consultas[1] == consultas[50] == 2
+
+def test_cargar_detalles_asigna_materiales_e_integrantes(app_modulo):
+    def filas(sql, params):
+        if 'detalles_prestamo' in sql:
+            return [{'prestamo_id': prestamo_id, 'nombre': 'Multímetro', 'cantidad': 1} for prestamo_id in params]
+        return [{'prestamo_id': prestamo_id, 'nombre': 'Ana', 'no_control': '20210001'} for prestamo_id in params]
+
+    prestamos = app_modulo.cargar_detalles_prestamos(CursorContador(filas), _prestamos(50))
+    assert all(len(p['materiales']) == 1 and len(p['integrantes']) == 1 for p in prestamos)
+
+def test_cargar_detalles_sin_prestamos_no_consulta(app_modulo):
+    cursor = CursorContador()
+    assert app_modulo.cargar_detalles_prestamos(cursor, []) == []
+    assert cursor.consultas == []
+
+def test_pagina_reportes_consultas_constantes(app_modulo):
+    def filas(sql, params):
+        if 'COUNT(*) as total' in sql:
+            return [{'total': 50}]
+        if 'num_materiales' in sql:
+            return []
+        return _prestamos(params[-1] - 1)
+
+    consultas = {}
+    for n in (1, 50):
+        cursor = CursorContador(filas)
+        pagina = app_modulo.fetch_reportes_page(cursor, {}, None, n)
+        assert len(pagina['prestamos']) == n
+        consultas[n] = len(cursor.consultas)
+    assert consultas[1] == consultas[50] == 3
@@ -0,0 +1,17 @@
+import csv
+import io
+
+from exportar import generar_csv
+
+def test_csv_neutraliza_formulas():
+    fila = {'id': 7, 'lugar_uso': '=HYPERLINK("http://x","y")', 'solicitante': '+52 771',
+            'observaciones': '-1+1', 'integrantes': '@SUM(A1)', 'materiales': 'Multímetro x2'}
+    texto = ''.join(generar_csv([fila])).lstrip('\ufeff')
+    encabezado, valores = list(csv.reader(io.StringIO(texto)))
+    celdas = dict(zip(encabezado, valores))
+    assert celdas['ID'] == '7'
+    assert celdas['Lugar de uso'] == '\'=HYPERLINK("http://x","y")'
+    assert celdas['Solicitante'] == "'+52 771"
+    assert celdas['Observaciones'] == "'-1+1"
+    assert celdas['Integrantes'] == "'@SUM(A1)"
+    assert celdas['Materiales'] == 'Multímetro x2'
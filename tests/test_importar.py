@@ -0,0 +1,63 @@
+import pytest
+
+from importar import importar
+
+class ResultadoVacio:
+    with_rows = True
+
+    def fetchall(self):
+        return []
+
+class ErrorBD(Exception):
+    pass
+
+class CursorFalso:
+    """Catálogos vacíos; el INSERT número `falla_en` lanza un error de base de datos"""
+
+    def __init__(self, falla_en=None):
+        self.falla_en = falla_en
+        self.inserts = 0
+
+    def execute(self, sql, params=None, multi=False):
+        return iter([ResultadoVacio() for _ in range(5)]) if multi else None
+
+    def executemany(self, sql, filas):
+        self.inserts += 1
+        if self.inserts == self.falla_en:
+            raise ErrorBD('conexión perdida')
+
+    def close(self):
+        pass
+
+class ConexionFalsa:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+FILAS = [{'nombre': f'Carrera {i}', 'abreviatura': f'C{i}'} for i in range(25)]
+
+def test_importacion_completa_en_una_transaccion():
+    cursor = CursorFalso()
+    conn = ConexionFalsa(cursor)
+    importadas, errores = importar(conn, 'carrera', FILAS, lote=10)
+    assert (importadas, errores) == (25, [])
+    assert cursor.inserts == 3
+    assert conn.commits == 1
+
+@pytest.mark.parametrize('parcial', [False, True])
+def test_error_en_un_lote_revierte_los_anteriores(parcial):
+    conn = ConexionFalsa(CursorFalso(falla_en=3))
+    with pytest.raises(ErrorBD):
+        importar(conn, 'carrera', FILAS, parcial=parcial, lote=10)
+    assert conn.commits == 0
+    assert conn.rollbacks == 1
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('mysql.connector')
+from database.init_db import INDEXES
+
+PRESTAMOS_MINIMOS = 5000
+INDICES_PRESTAMOS = {index for table, index, columns in INDEXES if table == 'prestamos'}
+
+class CursorGrabador:
+    """Envuelve un cursor real y guarda cada consulta con sus parámetros"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.consultas = []
+
+    def execute(self, sql, params=None, multi=False):
+        self.consultas.append((sql, list(params or [])))
+        return self._cursor.execute(sql, params, multi=multi)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+@pytest.fixture(scope='module')
+def prestamos_masivos(base_datos):
+    """Suficientes préstamos (uno por hora hacia atrás) para que el optimizador use índices"""
+    from database.db_connection import get_db_connection
+    conn = get_db_connection(request_scoped=False)
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT COUNT(*) FROM prestamos')
+        faltantes = PRESTAMOS_MINIMOS - cursor.fetchone()[0]
+        if faltantes > 0:
+            cursor.execute('''
+                SELECT a.carrera_id, a.id, d.id, pr.id, (SELECT MIN(id) FROM usuarios)
+                FROM practicas pr
+                JOIN asignaturas a ON pr.asignatura_id = a.id
+                JOIN docentes d ON d.carrera_id = a.carrera_id
+                LIMIT 1
+            ''')
+            carrera_id, asignatura_id, docente_id, practica_id, usuario_id = cursor.fetchone()
+            ahora = datetime.now().replace(minute=0, second=0, microsecond=0)
+            filas = [(ahora - timedelta(hours=i), carrera_id, asignatura_id, docente_id, practica_id,
+                      'Laboratorio', 'urgente' if i % 10 == 0 else 'normal',
+                      'activo' if i % 3 == 0 else 'devuelto', usuario_id)
+                     for i in range(faltantes)]
+            cursor.executemany('''
+                INSERT INTO prestamos (fecha_hora, carrera_id, asignatura_id, docente_id, practica_id,
+                                       lugar_uso, importancia_observacion, estado, usuario_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ''', filas)
+            conn.commit()
+        cursor.execute('ANALYZE TABLE prestamos')
+        cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+def _planes_prestamos(conn, consultas):
+    """Filas de EXPLAIN que leen la tabla prestamos, por cada sentencia grabada"""
+    cursor = conn.cursor(dictionary=True)
+    planes = []
+    try:
+        for sql, params in consultas:
+            for sentencia in filter(str.strip, sql.split(';')):
+                if 'prestamos' not in sentencia:
+                    continue
+                n = sentencia.count('%s')
+                cursor.execute('EXPLAIN ' + sentencia, params[:n])
+                params = params[n:]
+                planes.extend(fila for fila in cursor.fetchall() if fila['table'] in ('p', 'prestamos'))
+    finally:
+        cursor.close()
+    return planes
+
+def _sin_recorrido_completo(planes):
+    assert planes
+    for fila in planes:
+        assert fila['type'] != 'ALL', fila
+        assert fila['key'] in INDICES_PRESTAMOS, fila
+
+@pytest.mark.parametrize('filtros', [
+    {'fecha_inicio': 'hace7', 'fecha_fin': 'hoy'},
+    {'fecha_inicio': 'hace7', 'fecha_fin': 'hoy', 'estado': 'activo'},
+    {'fecha_inicio': 'hace7', 'fecha_fin': 'hoy', 'carrera_id': 'primera'}
+])
+def test_reportes_usan_indices(app_modulo, prestamos_masivos, conexion, filtros):
+    hoy = datetime.now().date()
+    valores = {'hace7': (hoy - timedelta(days=7)).isoformat(), 'hoy': hoy.isoformat()}
+    cursor = conexion.cursor(dictionary=True)
+    cursor.execute('SELECT MIN(carrera_id) as id FROM prestamos')
+    valores['primera'] = str(cursor.fetchone()['id'])
+    filtros = {campo: valores.get(valor, valor) for campo, valor in filtros.items()}
+
+    grabador = CursorGrabador(cursor)
+    app_modulo.fetch_reportes_page(grabador, filtros)
+    cursor.close()
+
+    # Conteo acotado y página; el conteo de materiales no lee prestamos
+    _sin_recorrido_completo(_planes_prestamos(conexion, grabador.consultas))
+
+def test_dashboard_usa_indices(app_modulo, prestamos_masivos, conexion):
+    cursor = conexion.cursor(dictionary=True)
+    grabador = CursorGrabador(cursor)
+    datos = app_modulo.load_dashboard(grabador)
+    cursor.close()
+    assert len(datos['ultimos_prestamos']) == 5
+
+    _sin_recorrido_completo(_planes_prestamos(conexion, grabador.consultas))
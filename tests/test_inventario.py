@@ -0,0 +1,95 @@
+import random
+import threading
+import uuid
+
+import pytest
+
+mysql_connector = pytest.importorskip('mysql.connector')
+from inventario import StockInsuficiente, reservar_materiales
+
+HILOS = 12
+INTENTOS_POR_HILO = 25
+STOCK_INICIAL = {'a': 40, 'b': 25}
+
+def _conectar(config):
+    return mysql_connector.connect(host=config.MYSQL_HOST, user=config.MYSQL_USER,
+                                   password=config.MYSQL_PASSWORD, database=config.MYSQL_DB,
+                                   port=config.MYSQL_PORT)
+
+@pytest.fixture
+def materiales(base_datos):
+    """Dos materiales nuevos con stock conocido; se eliminan al terminar"""
+    conn = _conectar(base_datos)
+    cursor = conn.cursor()
+    ids = {}
+    for clave, stock in STOCK_INICIAL.items():
+        cursor.execute('INSERT INTO materiales (nombre, cantidad_disponible, categoria) VALUES (%s, %s, %s)',
+                       (f'Prueba concurrencia {uuid.uuid4().hex[:12]}', stock, 'Pruebas'))
+        ids[clave] = cursor.lastrowid
+    conn.commit()
+    yield ids
+    cursor.execute(f"DELETE FROM materiales WHERE id IN ({', '.join(['%s'] * len(ids))})", list(ids.values()))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+def test_reservas_concurrentes_no_dejan_stock_negativo(base_datos, materiales):
+    reservado = {material_id: 0 for material_id in materiales.values()}
+    rechazos = []
+    errores = []
+    lock = threading.Lock()
+    inicio = threading.Barrier(HILOS)
+
+    def reservar(semilla):
+        azar = random.Random(semilla)
+        conn = _conectar(base_datos)
+        cursor = conn.cursor()
+        try:
+            inicio.wait()
+            for _ in range(INTENTOS_POR_HILO):
+                # El mismo material puede repetirse en la solicitud; se agrupa al reservar
+                solicitud = [{'material_id': materiales['a'], 'cantidad': azar.randint(1, 3)},
+                             {'material_id': materiales['b'], 'cantidad': azar.randint(1, 2)}]
+                if azar.random() < 0.3:
+                    solicitud.append({'material_id': materiales['a'], 'cantidad': 1})
+                azar.shuffle(solicitud)
+                try:
+                    cantidades = reservar_materiales(cursor, solicitud)
+                    conn.commit()
+                except (StockInsuficiente, ValueError):
+                    conn.rollback()
+                    with lock:
+                        rechazos.append(solicitud)
+                    continue
+                with lock:
+                    for material_id, cantidad in cantidades.items():
+                        reservado[material_id] += cantidad
+        except Exception as e:
+            conn.rollback()
+            with lock:
+                errores.append(e)
+        finally:
+            cursor.close()
+            conn.close()
+
+    hilos = [threading.Thread(target=reservar, args=(i,)) for i in range(HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert errores == []
+    # La demanda supera al stock: debe haber reservas rechazadas por falta de existencias
+    assert rechazos
+
+    conn = _conectar(base_datos)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id, cantidad_disponible FROM materiales WHERE id IN ({', '.join(['%s'] * len(materiales))})",
+                   list(materiales.values()))
+    final = dict(cursor.fetchall())
+    cursor.close()
+    conn.close()
+
+    for clave, material_id in materiales.items():
+        assert final[material_id] >= 0
+        assert STOCK_INICIAL[clave] - final[material_id] == reservado[material_id]
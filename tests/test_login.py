@@ -0,0 +1,83 @@
+import threading
+from concurrent.futures import TimeoutError as FuturoTimeout
+
+import pytest
+
+pytest.importorskip('flask')
+from auth import LimitadorIntentos
+from cache import SQLiteCache, TTLCache
+
+HILOS = 8
+INTENTOS_POR_HILO = 10
+
+class CursorUsuario:
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchone(self):
+        return {'id': 1, 'nombre': 'Admin', 'tipo': 'administrador', 'email': 'a@b.mx', 'password_hash': 'x'}
+
+    def close(self):
+        pass
+
+class ConexionUsuario:
+    def cursor(self, dictionary=False):
+        return CursorUsuario()
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+def test_login_responde_503_si_el_hash_tarda(app_modulo, monkeypatch):
+    def lento(password, password_hash):
+        raise FuturoTimeout()
+    monkeypatch.setattr(app_modulo, 'get_db_connection', lambda: ConexionUsuario())
+    monkeypatch.setattr(app_modulo, 'verificar_password', lento)
+    respuesta = app_modulo.app.test_client().post('/login', data={
+        'email': 'a@b.mx', 'password': 'x', 'tipo_usuario': 'administrador'})
+    assert respuesta.status_code == 503
+
+def test_limite_por_ip_mayor_que_por_cuenta():
+    limitador = LimitadorIntentos(TTLCache(), 2, 60, max_intentos_ip=5)
+    for i in range(3):
+        assert limitador.intentar('10.0.0.1', f'usuario{i}@b.mx')
+    # La IP compartida (NAT) sigue permitida; la tercera cuenta con la misma cuenta no
+    assert limitador.intentar('10.0.0.1', 'usuario0@b.mx')
+    assert not limitador.intentar('10.0.0.1', 'usuario0@b.mx')
+
+def test_exito_y_errores_no_cuentan_como_fallos():
+    limitador = LimitadorIntentos(TTLCache(), 2, 60, max_intentos_ip=2)
+    for _ in range(5):
+        assert limitador.intentar('10.0.0.1', 'a@b.mx')
+        limitador.exito('10.0.0.1', 'a@b.mx')
+    for _ in range(5):
+        assert limitador.intentar('10.0.0.2', 'b@b.mx')
+        limitador.descontar('10.0.0.2', 'b@b.mx')
+
+@pytest.mark.parametrize('backend', ['memoria', 'sqlite'])
+def test_fallos_concurrentes_no_superan_el_limite(backend, tmp_path):
+    """Varios workers (instancias sobre el mismo archivo) probando contraseñas a la vez"""
+    ruta = str(tmp_path / 'sesiones.sqlite3')
+    compartido = TTLCache()
+    maximo = 10
+    permitidos = []
+    lock = threading.Lock()
+    inicio = threading.Barrier(HILOS)
+
+    def atacar():
+        store = compartido if backend == 'memoria' else SQLiteCache(ruta)
+        limitador = LimitadorIntentos(store, maximo, 60, max_intentos_ip=1000)
+        inicio.wait()
+        for _ in range(INTENTOS_POR_HILO):
+            if limitador.intentar('10.0.0.1', 'admin@itpachuca.edu.mx'):
+                with lock:
+                    permitidos.append(1)
+
+    hilos = [threading.Thread(target=atacar) for _ in range(HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert len(permitidos) == maximo
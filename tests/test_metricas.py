@@ -0,0 +1,31 @@
+def test_metrics_oculto_sin_token(app_modulo, monkeypatch):
+    monkeypatch.setattr(app_modulo.Config, 'METRICS_TOKEN', None)
+    respuesta = app_modulo.app.test_client().get('/metrics')
+    assert respuesta.status_code == 404
+
+def test_metrics_exige_token(app_modulo, monkeypatch):
+    monkeypatch.setattr(app_modulo.Config, 'METRICS_TOKEN', 'secreto')
+    cliente = app_modulo.app.test_client()
+    assert cliente.get('/metrics').status_code == 401
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer otro'}).status_code == 401
+
+def test_metrics_separa_caches_y_declara_contadores(app_modulo, monkeypatch):
+    monkeypatch.setattr(app_modulo.Config, 'METRICS_TOKEN', 'secreto')
+    monkeypatch.setattr(app_modulo, 'get_pool_stats', lambda: {'checkouts': 7, 'en_uso': 1})
+    monkeypatch.setattr(app_modulo.catalog_cache, 'get_stats', lambda: {
+        'entradas': 3, 'errores': 0, 'namespaces': {'carreras': {'hits': 5, 'misses': 1}}})
+    monkeypatch.setattr(app_modulo.ticket_cache, 'get_stats', lambda: {
+        'entradas': 2, 'errores': 1, 'namespaces': {'tickets': {'hits': 4, 'misses': 2}}})
+    texto = app_modulo.app.test_client().get('/metrics', headers={'Authorization': 'Bearer secreto'}).get_data(as_text=True)
+    lineas = texto.splitlines()
+
+    assert 'cache_hits_total{cache="catalogo",namespace="carreras"} 5' in lineas
+    assert 'cache_hits_total{cache="tickets",namespace="tickets"} 4' in lineas
+    assert 'cache_entradas{cache="tickets"} 2' in lineas
+    assert '# TYPE cache_hits_total counter' in lineas
+    assert '# TYPE cache_errores_total counter' in lineas
+    assert '# TYPE db_pool_checkouts_total counter' in lineas
+    assert '# TYPE db_pool_en_uso gauge' in lineas
+    # Cada métrica se declara una sola vez
+    declaraciones = [linea for linea in lineas if linea.startswith('# TYPE')]
+    assert len(declaraciones) == len(set(declaraciones))
@@ -0,0 +1,45 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip('dotenv')
+import tickets_pdf
+from config import Config
+
+def _escribir(directorio, nombre, kb, antiguedad):
+    ruta = os.path.join(directorio, nombre)
+    with open(ruta, 'wb') as archivo:
+        archivo.write(b'x' * kb * 1024)
+    marca = time.time() - antiguedad
+    os.utime(ruta, (marca, marca))
+    return ruta
+
+def test_procesos_repartidos_entre_workers(monkeypatch):
+    monkeypatch.setattr(Config, 'PDF_PROCESOS', 0)
+    monkeypatch.setattr(Config, 'WEB_CONCURRENCY', 4)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 8)
+    assert tickets_pdf._procesos() == 2
+    monkeypatch.setattr(Config, 'WEB_CONCURRENCY', 16)
+    assert tickets_pdf._procesos() == 1
+    monkeypatch.setattr(Config, 'PDF_PROCESOS', 3)
+    assert tickets_pdf._procesos() == 3
+
+def test_poda_respeta_archivos_recientes(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'PDF_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'PDF_CACHE_MAX_MB', 0)
+    viejo = _escribir(tmp_path, 'viejo.pdf', 4, 3600)
+    reciente = _escribir(tmp_path, 'reciente.pdf', 4, 10)
+    tickets_pdf._podar()
+    assert not os.path.exists(viejo)
+    assert os.path.exists(reciente)
+
+def test_archivo_abierto_sobrevive_a_la_poda(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'PDF_CACHE_DIR', str(tmp_path))
+    ruta = _escribir(tmp_path, 'ticket.pdf', 1, 3600)
+    archivo = tickets_pdf._abrir(ruta)
+    os.remove(ruta)
+    with archivo:
+        assert len(archivo.read()) == 1024
+    assert tickets_pdf._abrir(ruta) is None
+    assert not tickets_pdf._tocar(ruta)
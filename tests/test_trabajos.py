@@ -0,0 +1,153 @@
+import time
+
+import pytest
+
+pytest.importorskip('mysql.connector')
+import trabajos
+
+class EjecutorFalso:
+    def __init__(self):
+        self.enviados = []
+
+    def submit(self, funcion, *args):
+        self.enviados.append((funcion, args))
+
+@pytest.fixture
+def crear_trabajo(conexion):
+    """Inserta trabajos en proceso con un propietario y un latido de hace `segundos`"""
+    ids = []
+
+    def crear(propietario, segundos):
+        cursor = conexion.cursor()
+        cursor.execute('''
+            INSERT INTO trabajos (tipo, parametros, estado, propietario, fecha_inicio, fecha_actualizacion)
+            VALUES ('reconstruir_resumenes', '{}', 'en_proceso', %s, NOW(), NOW() - INTERVAL %s SECOND)
+        ''', (propietario, segundos))
+        ids.append(cursor.lastrowid)
+        conexion.commit()
+        cursor.close()
+        return ids[-1]
+    yield crear
+    cursor = conexion.cursor()
+    cursor.execute(f"DELETE FROM trabajos WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+    conexion.commit()
+    cursor.close()
+
+def _estado(conexion, trabajo_id):
+    cursor = conexion.cursor()
+    cursor.execute('SELECT estado, propietario FROM trabajos WHERE id = %s', (trabajo_id,))
+    fila = cursor.fetchone()
+    conexion.commit()
+    cursor.close()
+    return fila
+
+def test_reanudar_solo_retoma_trabajos_sin_latido(base_datos, conexion, crear_trabajo, monkeypatch):
+    ejecutor = EjecutorFalso()
+    monkeypatch.setattr(trabajos, '_get_executor', lambda: ejecutor)
+    vivo = crear_trabajo('host:1:vivo', 5)
+    abandonado = crear_trabajo('host:2:caido', base_datos.TRABAJOS_ABANDONO + 60)
+
+    trabajos.reanudar()
+
+    assert _estado(conexion, vivo) == ('en_proceso', 'host:1:vivo')
+    assert _estado(conexion, abandonado) == ('pendiente', None)
+    enviados = [args[0] for funcion, args in ejecutor.enviados]
+    assert abandonado in enviados and vivo not in enviados
+
+@pytest.fixture
+def pool_nuevo(monkeypatch):
+    """Pool de trabajos propio de la prueba con latido corto; el vigía termina al restaurar _executor"""
+    monkeypatch.setattr(trabajos.Config, 'TRABAJOS_LATIDO', 0.05)
+    monkeypatch.setattr(trabajos, '_executor', None)
+    monkeypatch.setattr(trabajos, '_executor_pid', None)
+    monkeypatch.setattr(trabajos, '_en_cola', set())
+    ejecutores = []
+
+    def crear():
+        ejecutores.append(trabajos._get_executor())
+        return ejecutores[-1]
+    yield crear
+    for ejecutor in ejecutores:
+        ejecutor.shutdown(wait=False)
+
+def _esperar(condicion, segundos=3):
+    limite = time.monotonic() + segundos
+    while not condicion() and time.monotonic() < limite:
+        time.sleep(0.05)
+    return condicion()
+
+def test_vigia_revisa_periodicamente(pool_nuevo, monkeypatch):
+    revisiones = []
+    monkeypatch.setattr(trabajos, 'reanudar', lambda: revisiones.append(time.monotonic()))
+    pool_nuevo()
+    assert _esperar(lambda: len(revisiones) >= 3)
+
+def test_retoma_lease_vencido_despues_de_crear_el_pool(base_datos, conexion, crear_trabajo, pool_nuevo, monkeypatch):
+    ejecutados = []
+    monkeypatch.setattr(trabajos, '_ejecutar', ejecutados.append)
+    trabajo_id = crear_trabajo('host:2:caido', 0)
+    pool_nuevo()
+    time.sleep(0.3)
+    assert _estado(conexion, trabajo_id) == ('en_proceso', 'host:2:caido')
+    assert trabajo_id not in ejecutados
+
+    # El worker murió: ya no hay latido y la concesión vence con el pool ya creado
+    cursor = conexion.cursor()
+    cursor.execute('UPDATE trabajos SET fecha_actualizacion = NOW() - INTERVAL %s SECOND WHERE id = %s',
+                   (base_datos.TRABAJOS_ABANDONO + 60, trabajo_id))
+    conexion.commit()
+    cursor.close()
+
+    assert _esperar(lambda: trabajo_id in ejecutados)
+    assert _estado(conexion, trabajo_id) == ('pendiente', None)
+
+def test_avance_se_detiene_si_otro_worker_lo_reclamo(conexion, crear_trabajo):
+    trabajo_id = crear_trabajo('host:2:nuevo', 0)
+    trabajo = trabajos.Trabajo(trabajo_id, 'reconstruir_resumenes', {}, conexion, 'host:1:viejo')
+    with pytest.raises(trabajos.TrabajoCancelado):
+        trabajo.avance(10)
+    assert _estado(conexion, trabajo_id) == ('en_proceso', 'host:2:nuevo')
+
+def test_validar_tickets_lote():
+    validar = trabajos.TAREAS['tickets_lote']['validar']
+    assert validar({'fecha_inicio': '2024-01-01', 'fecha_fin': '2024-01-31', 'formato': 'zip'}) == {
+        'fecha_inicio': '2024-01-01', 'fecha_fin': '2024-01-31', 'formato': 'zip'}
+    with pytest.raises(trabajos.ParametrosInvalidos):
+        validar({'fecha_inicio': '2024-01-01', 'fecha_fin': '2024-01-31', 'formato': 'docx'})
+    with pytest.raises(trabajos.ParametrosInvalidos):
+        validar({'fecha_inicio': '2024-02-01', 'fecha_fin': '2024-01-31', 'formato': 'pdf'})
+
+def test_resultado_se_guarda_al_completar(base_datos, conexion, monkeypatch):
+    monkeypatch.setattr(trabajos, '_get_executor', EjecutorFalso)
+
+    def generar(trabajo):
+        trabajo.resultado = {'clave': 'ab' * 32, 'formato': trabajo.parametros['formato'], 'nombre': 'tickets.pdf'}
+        return 'listo'
+    monkeypatch.setitem(trabajos.TAREAS, 'tickets_lote', dict(trabajos.TAREAS['tickets_lote'], ejecutar=generar))
+    trabajo_id = trabajos.encolar(conexion, 'tickets_lote',
+                                  {'fecha_inicio': '2024-01-01', 'fecha_fin': '2024-01-31', 'formato': 'pdf'}, None)
+    try:
+        trabajos._ejecutar(trabajo_id)
+        cursor = conexion.cursor(dictionary=True)
+        trabajo = trabajos.obtener(cursor, trabajo_id)
+        conexion.commit()
+        cursor.close()
+        assert trabajo['estado'] == 'completado' and trabajo['mensaje'] == 'listo'
+        assert trabajo['resultado'] == {'clave': 'ab' * 32, 'formato': 'pdf', 'nombre': 'tickets.pdf'}
+    finally:
+        cursor = conexion.cursor()
+        cursor.execute('DELETE FROM trabajos WHERE id = %s', (trabajo_id,))
+        conexion.commit()
+        cursor.close()
+
+def test_columnas_de_archivo_existen(conexion):
+    cursor = conexion.cursor()
+    for tabla, columnas in trabajos.ARCHIVO_COLUMNAS.items():
+        for nombre in (tabla, f'{tabla}_archivo'):
+            cursor.execute('''
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = DATABASE() AND table_name = %s
+            ''', (nombre,))
+            existentes = {fila[0] for fila in cursor.fetchall()}
+            assert set(columnas) <= existentes, nombre
+    cursor.close()